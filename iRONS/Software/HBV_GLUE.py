@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains a Monte Carlo calibration of the HBV model with the
+Generalised Likelihood Uncertainty Estimation (GLUE) method (Beven and
+Binley, 1992): random parameter sets (and initial storages) are sampled
+within the bounds of HBV_calibration and simulated, the parameter sets whose
+performance is above a threshold are behavioural, and the uncertainty bands
+of the simulated flows are the quantiles of the behavioural simulations,
+weighted by their performance.
+
+The samples are generated and simulated in chunks (HBV_sim_batch), and only
+the best parameter sets and a histogram of the behavioural flows of each
+time step are kept, so the memory does not depend on the number of samples
+(e.g. 10^6 samples without storing 10^6 hydrographs).
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import numpy as np
+from numba import njit, prange
+
+## Tools from the iRONs toolbox
+from irons.Software.HBV_sim import HBV_sim_batch
+from irons.Software.HBV_calibration import HBV_bounds
+from irons.Software.flow_metrics import flow_metrics, maximise
+
+def HBV_GLUE(P,E,Case,area,Q_obs,n_samples,metric = 'nse',threshold = 0.5,top_k = 100,
+             quantiles = (0.05,0.5,0.95),chunk_size = 1000,n_bins = 500,seed = None):
+    """This function calibrates the initial storages and the parameters of the
+    HBV model (see HBV_calibration) with the GLUE method.
+
+     n_samples  = number of parameter sets sampled (Latin hypercube sampling
+                  of each chunk of samples)
+     metric     = performance metric of the simulated flows with respect to
+                  Q_obs (see flow_metrics)
+     threshold  = behavioural threshold of the metric: minimum value of the
+                  efficiencies ('nse', 'kge'), maximum absolute value of the
+                  bias or maximum value of the errors
+     top_k      = number of best parameter sets kept
+     quantiles  = quantiles of the behavioural simulated flows
+     chunk_size = number of parameter sets simulated at once (the memory
+                  used is proportional to chunk_size x number of time steps)
+     n_bins     = number of bins (logarithmic) of the histograms of the
+                  behavioural flows of each time step
+     seed       = seed of the random number generator
+
+    The weight of each behavioural simulation is the distance of its
+    performance to the threshold (zero for the least behavioural simulation).
+
+    outputs = (top_vars,top_values,Q_quantiles,n_behavioural)
+
+      top_vars  = best parameter sets [SSM0,SUZ0,SLZ0,BETA,LP,FC,PERC,K0,K1,K2,
+                  UZL,MAXBAS], from best to worst             - matrix (top_k,12)
+      top_values = metric of the best parameter sets          - vector (top_k,)
+     Q_quantiles = quantiles of the behavioural simulated flows
+                   (NaN if there are no behavioural simulations) - matrix (T,n_quantiles)
+   n_behavioural = number of behavioural parameter sets        - scalar
+    """
+    metrics = flow_metrics(Q_obs,metric)
+    if metric in maximise:
+        threshold_loss = 1 - threshold
+    else:
+        threshold_loss = abs(threshold)
+    lower,upper = np.array(HBV_bounds).T
+    rng = np.random.RandomState(seed)
+    T = len(metrics.Q_obs)
+
+    # Logarithmic bins of the flows, from 0.1% of the mean observed flow to
+    # 10 times the maximum observed flow (flows out of these bounds are counted
+    # in the first and last bins)
+    edges = np.geomspace(1e-3*metrics.mean_obs,10*metrics.Q_obs.max(),n_bins+1)
+    histogram = np.zeros((T,n_bins))
+
+    top_vars = np.zeros((0,12))
+    top_losses = np.zeros(0)
+    n_behavioural = 0
+    for start in range(0,n_samples,chunk_size):
+        X = latin_hypercube(min(chunk_size,n_samples - start),lower,upper,rng)
+        Q_sim = HBV_sim_batch(P,E,X[:,3:12],X[:,0:3],Case,area)
+        losses = metrics.loss(Q_sim)[:,0]
+
+        # Best parameter sets
+        top_vars = np.vstack([top_vars,X])
+        top_losses = np.concatenate([top_losses,losses])
+        if len(top_losses) > top_k:
+            best = np.argpartition(top_losses,top_k-1)[:top_k]
+            top_vars,top_losses = top_vars[best],top_losses[best]
+
+        # Histograms of the behavioural flows
+        behavioural = np.flatnonzero(losses <= threshold_loss)
+        n_behavioural += len(behavioural)
+        if len(behavioural):
+            histogram_update(histogram,Q_sim,behavioural,threshold_loss - losses,
+                             np.log(edges[0]),np.log(edges[1]/edges[0]))
+
+    order = np.argsort(top_losses,kind = 'mergesort')
+    top_vars,top_losses = top_vars[order],top_losses[order]
+    if metric in maximise:
+        top_values = 1 - top_losses
+    else:
+        top_values = top_losses # absolute value of the bias
+
+    Q_quantiles = histogram_quantiles(histogram,edges,quantiles)
+
+    return top_vars,top_values,Q_quantiles,n_behavioural
+
+def latin_hypercube(n,lower,upper,rng = np.random):
+    """This function returns n Latin hypercube samples - matrix (n,d) -
+    within the lower and upper bounds - vectors (d,) -: the range of each
+    variable is divided into n intervals of equal probability and each
+    interval is sampled once"""
+    d = len(lower)
+    u = (np.argsort(rng.random_sample((n,d)),axis = 0) + rng.random_sample((n,d)))/n
+    return lower + u*(np.asarray(upper) - lower)
+
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
+def histogram_update(histogram,Q_sim,columns,weights,log_edge0,log_width):
+    T,n_bins = histogram.shape
+    for t in prange(T):
+        for k in columns:
+            q = Q_sim[t,k]
+            b = int((np.log(q) - log_edge0)/log_width) if q > 0 else 0
+            b = min(max(b,0),n_bins - 1)
+            histogram[t,b] += weights[k]
+
+def histogram_quantiles(histogram,edges,quantiles):
+    """Weighted quantiles of each row of the histograms (flows of each time
+    step), interpolated (logarithmically) within the bins"""
+    T,n_bins = histogram.shape
+    cumulative = np.cumsum(histogram,axis = 1)
+    total = cumulative[:,-1]
+    Q_quantiles = np.full((T,len(quantiles)),np.nan)
+    rows = np.flatnonzero(total > 0)
+    log_edges = np.log(edges)
+    for i,p in enumerate(quantiles):
+        target = p*total[rows]
+        # First bin where the cumulative weight reaches the target
+        b = np.minimum((cumulative[rows] < target[:,np.newaxis]).sum(axis = 1),n_bins - 1)
+        below = np.where(b > 0,cumulative[rows,np.maximum(b - 1,0)],0)
+        weight = histogram[rows,b]
+        fraction = np.clip(np.divide(target - below,weight,out = np.zeros_like(weight),
+                                     where = weight > 0),0,1)
+        Q_quantiles[rows,i] = np.exp(log_edges[b] + fraction*(log_edges[b + 1] - log_edges[b]))
+    return Q_quantiles
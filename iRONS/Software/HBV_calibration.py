@@ -7,106 +7,303 @@ Bristol University (2020).
 
 Licence: MIT
 """
+import multiprocessing
+import numbers
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import numpy as np
-from platypus import NSGAII, Problem, Real
+import numba
+from platypus import NSGAII, Problem, Real, MapEvaluator
+from platypus.evaluator import Evaluator, SubmitEvaluator
 
 if __name__ == '__main__': # If you are running this function (the source file) as the main program
     import sys
     sys.path.append('../../Functions') # Adds higher directory to python modules path.
 
 ## Tools from the iRONs toolbox
-from irons.Software.HBV_sim import HBV_sim
+from irons.Software.HBV_sim import HBV_sim, HBV_sim_batch
+from irons.Software.HBV_state import data_fingerprint
+from irons.Software.sim_cache import sim_cache
+from irons.Software.flow_metrics import flow_metrics, metric_names
+from irons.Software.optimisation_checkpoint import run_checkpointed
+from irons.Software.optimisation_islands import run_islands
+from irons.Software.optimisation_surrogate import SurrogateNSGAII
 
-def HBV_calibration(P,E,Case,area, Q_obs, objective, iterations,population_size = 1):
+# Decision variables of the calibration (initial storages and parameters)
+# and their bounds
+HBV_variables = ['SSM0','SUZ0','SLZ0','BETA','LP','FC','PERC','K0','K1','K2','UZL','MAXBAS']
+HBV_bounds = [(0, 400), (0, 100), (0, 100), (0, 7), (0.3, 1), (1, 2000), (0, 100),
+              (0.05, 2), (0.01, 1), (0, 0.1), (0, 100), (1, 6)]
 
-    if objective == 'all': # the objective is to minimize RMSE considering all the hydrograph 
-        num_objectives = 1
-        pass
-    elif objective == 'low':# the objective is to minimize RMSE considering only low flows 
-        num_objectives = 1
-        low_flow_indexes = [Q_obs < np.percentile(Q_obs,50)]
-        Q_obs_low = Q_obs[tuple(low_flow_indexes)]
-    elif objective == 'high': # the objective is to minimize RMSE considering only high flows 
-        num_objectives = 1
-        high_flow_indexes = [Q_obs > np.percentile(Q_obs,50)]
-        Q_obs_high = Q_obs[tuple(high_flow_indexes)]
-    elif objective == 'double': # two objectives (RMSE of low and high flows)
-        num_objectives = 2
-        low_flow_indexes = [Q_obs < np.percentile(Q_obs,50)]
-        Q_obs_low = Q_obs[tuple(low_flow_indexes)]
-        high_flow_indexes = [Q_obs > np.percentile(Q_obs,50)]
-        Q_obs_high = Q_obs[tuple(high_flow_indexes)]
+def HBV_calibration(P,E,Case,area, Q_obs, objective, iterations,population_size = 1,
+                    n_workers = None, evaluator = 'batch', seed = None,
+                    cache_size = 10000, checkpoint_file = None, checkpoint_frequency = None,
+                    islands = 1, migration_interval = None, migration_size = 1,
+                    surrogate = None):
+    """This function calibrates the initial storages and the parameters of the
+    HBV model (see HBV_sim) with the NSGAII algorithm (platypus), minimising
+    the RMSE of the simulated flows with respect to Q_obs.
     
-    def auto_calibration(vars):
-            
-        SSM0   = vars[0]
-        SUZ0   = vars[1]
-        SLZ0   = vars[2]
-        
-        BETA   = vars[3]
-        LP     = vars[4]
-        FC     = vars[5]
-        PERC   = vars[6]
-        K0     = vars[7]
-        K1     = vars[8]
-        K2     = vars[9]
-        UZL    = vars[10]
-        MAXBAS = vars[11]
-        
-        ini    = [SSM0,SUZ0,SLZ0]
-        param  = [BETA, LP, FC, PERC, K0, K1, K2, UZL, MAXBAS]
-        
-        Q_sim,[SM,UZ,LZ],[EA,R,RL,Q0,Q1] = HBV_sim(P,E,param,Case,ini,area)
-        
-        if objective == 'all':
-            # Consider the entire hydrograph
-            value = np.sqrt(((Q_sim - Q_obs) ** 2).mean())
-            return [value]
-        elif objective == 'low':
-            Q_sim_low = Q_sim[tuple(low_flow_indexes)]
-            value = np.sqrt(((Q_sim_low - Q_obs_low) ** 2).mean())
-            return [value]
-        elif objective == 'high':
-            Q_sim_high = Q_sim[tuple(high_flow_indexes)]
-            value = np.sqrt(((Q_sim_high - Q_obs_high) ** 2).mean())
-            return [value]
-        elif objective == 'double':
-            Q_sim_low = Q_sim[tuple(low_flow_indexes)]
-            Q_sim_high = Q_sim[tuple(high_flow_indexes)]
-            value = [np.sqrt(((Q_sim_low - Q_obs_low) ** 2).mean()),np.sqrt(((Q_sim_high - Q_obs_high) ** 2).mean())]
-            return value
+     objective = 'all', 'low', 'high', 'double' or metrics of flow_metrics 
+                 (see HBV_objective). With a list of metrics, results is a 
+                 matrix with one column per objective.
+    iterations = maximum number of function evaluations or a termination 
+                 condition, e.g. EarlyStopping (see optimisation_termination)
+                 to stop the calibration when it has converged or reached a 
+                 target RMSE. The condition then reports why the calibration
+                 stopped (reason) and the function evaluations used (nfe).
+     evaluator = 'batch' (default) to evaluate all the solutions of each 
+                 generation at once with HBV_sim_batch, 'process' to evaluate 
+                 them one by one in a pool of processes or 'thread' in a pool
+                 of threads (HBV_kernel releases the GIL). A platypus 
+                 Evaluator can also be provided.
+     n_workers = number of Numba threads ('batch'), processes ('process') or
+                 threads ('thread') that evaluate the solutions in parallel. 
+                 By default (None) the number of CPUs. If n_workers = 1 the 
+                 solutions are evaluated serially.
+     seed      = seed of the random number generators. For a given seed the 
+                 results are the same whatever the number of workers.
+    cache_size = maximum number of solutions whose objective values are kept
+                 in a cache (see sim_cache), so that repeated solutions and 
+                 the final RMSE are not simulated again. 0 disables the cache.
+    checkpoint_file = optional, JSON file where the progress of the 
+                 calibration is saved every checkpoint_frequency function 
+                 evaluations (by default after every generation). If the file
+                 exists, the calibration is resumed from it (see 
+                 optimisation_checkpoint).
+     islands   = number of independent populations (islands) of 
+                 population_size solutions that evolve in parallel processes
+                 (n_workers, each island evaluates its solutions serially), 
+                 exchanging their migration_size best solutions every 
+                 migration_interval function evaluations (see 
+                 optimisation_islands). iterations is then the number of 
+                 function evaluations of each island and the results are the
+                 best solutions of the merged islands.
+     surrogate = optional, oversampling factor of the surrogate-assisted 
+                 NSGAII (see optimisation_surrogate): in each generation 
+                 surrogate times more offspring are generated and only the 
+                 most promising ones, according to a surrogate model of the 
+                 objectives, are simulated with HBV_sim (e.g. surrogate = 5).
+    """
+    if seed is not None:
+        random.seed(seed) # platypus uses the random module
+        np.random.seed(seed)
+    
+    auto_calibration = HBV_objective(P,E,Case,area,Q_obs,objective,
+                                     sim_cache(cache_size) if cache_size else None)
+    num_objectives = auto_calibration.num_objectives
         
-
     problem = Problem(12,num_objectives)
-    real0 = Real(0, 400)
-    real1 = Real(0, 100)
-    real2 = Real(0, 100)
-    real3 = Real(0, 7)
-    real4 = Real(0.3, 1)
-    real5 = Real(1, 2000)
-    real6 = Real(0, 100)
-    real7 = Real(0.05, 2)
-    real8 = Real(0.01, 1)
-    real9 = Real(0, 0.1)
-    real10 = Real(0, 100)
-    real11 = Real(1, 6)
-    problem.types[:] = [real0] + [real1] + [real2] + [real3] + [real4] + [real5] + [real6] + [real7] + [real8] + [real9]  + [real10] + [real11]
+    problem.types[:] = [Real(lower,upper) for lower,upper in HBV_bounds]
     problem.function = auto_calibration
     
-    algorithm = NSGAII(problem,population_size)
-    algorithm.run(iterations) # Number of iterations
+    if islands > 1:
+        if checkpoint_file is not None or not isinstance(iterations,numbers.Integral) or surrogate is not None:
+            raise ValueError('islands can only be used with a number of iterations, '+
+                             'without checkpoints and without surrogate')
+        if isinstance(evaluator,str):
+            evaluator = BatchEvaluator(1) if evaluator == 'batch' else None
+        result = run_islands(problem,population_size,iterations,islands,migration_interval,
+                             migration_size,n_workers,evaluator)
+    else:
+        if isinstance(evaluator,str):
+            pool_evaluator = calibration_evaluator(n_workers,evaluator)
+        else:
+            pool_evaluator = evaluator
+        try:
+            if surrogate is None:
+                algorithm = NSGAII(problem,population_size,evaluator = pool_evaluator)
+            else:
+                algorithm = SurrogateNSGAII(problem,population_size,oversampling = surrogate,
+                                            evaluator = pool_evaluator)
+            if checkpoint_file is None:
+                algorithm.run(iterations) # Number of iterations or termination condition
+            else:
+                # The checkpoint is only resumed with the same algorithm
+                fingerprint = auto_calibration.fingerprint+str(population_size)
+                if surrogate is not None:
+                    fingerprint += 'surrogate'+str(surrogate)
+                run_checkpointed(algorithm,iterations,checkpoint_file,checkpoint_frequency,
+                                 fingerprint)
+        finally:
+            if pool_evaluator is not evaluator:
+                pool_evaluator.close()
+        result = algorithm.result
     
     if objective == 'double':
-        results_low = np.array([algorithm.result[i].objectives[0] for i in range(population_size)])
-        results_high = np.array([algorithm.result[i].objectives[1] for i in range(population_size)])
-    else:
-        results = np.array([algorithm.result[i].objectives[0] for i in range(population_size)])
+        results_low = np.array([s.objectives[0] for s in result])
+        results_high = np.array([s.objectives[1] for s in result])
+    elif num_objectives == 1:
+        results = np.array([s.objectives[0] for s in result])
+    else: # list of metrics: one column per objective
+        results = np.array([s.objectives[:] for s in result])
         
-    solution = [algorithm.result[i].variables[0:12] for i in range(population_size)]
+    solution = [s.variables[0:12] for s in result]
     
-    RMSE = [np.sqrt(((HBV_sim(P,E,solution[i][3:12],Case,solution[i][0:3],area)[0] - Q_obs) ** 2).mean()) for i in range(population_size)]
+    RMSE = list(auto_calibration.RMSE(solution)) # RMSE considering all the hydrograph
     
     if objective == 'double':
         return results_low, results_high, solution, RMSE
     else:
-        return results, solution, RMSE
\ No newline at end of file
+        return results, solution, RMSE
+
+class HBV_objective:
+    """Objective function of the calibration: it simulates the HBV model for 
+    a vector of 12 decision variables (initial storages SSM0, SUZ0, SLZ0 and
+    parameters BETA, LP, FC, PERC, K0, K1, K2, UZL, MAXBAS) and returns the 
+    RMSE of the simulated flows with respect to Q_obs:
+        'all'    = RMSE considering all the hydrograph
+        'low'    = RMSE considering only low flows (below the median)
+        'high'   = RMSE considering only high flows (above the median)
+        'double' = two objectives (RMSE of low and high flows)
+    or any metric, or list of metrics (one objective each), of flow_metrics
+    (e.g. ['nse','log_rmse','bias']). The metrics are computed as values to
+    minimise (see flow_metrics.loss: 1 - NSE, 1 - KGE, absolute bias).
+    It is defined as a class (and not as a nested function) so that it can be
+    sent to other processes.
+    
+    If a cache (see sim_cache) is provided, the objective values and the RMSE
+    of all the hydrograph of each solution are stored, so that repeated
+    solutions are not simulated again.
+    """
+    def __init__(self,P,E,Case,area,Q_obs,objective,cache = None):
+        if isinstance(objective,str):
+            metrics = objective_metrics.get(objective,[objective])
+        else:
+            metrics = list(objective)
+        if not all(metric in metric_names for metric in metrics):
+            raise ValueError("objective must be equal to 'all', 'low', 'high', 'double' "+
+                             "or metrics of flow_metrics")
+        self.P,self.E,self.Case,self.area = P,E,Case,area
+        self.Q_obs = np.asarray(Q_obs)
+        self.objective = objective
+        self.num_objectives = len(metrics)
+        # Objectives and RMSE of all the hydrograph (last value), computed in
+        # a single pass over the simulated flows
+        self.metrics = flow_metrics(self.Q_obs,list(metrics) + ['rmse'])
+        self.cache = cache
+        # Fingerprint of the inputs, to index the results in the cache
+        self.fingerprint = data_fingerprint(P,E,Q_obs,[Case,area]) + ','.join(metrics)
+    
+    def __call__(self,vars):
+        if self.cache is None:
+            values = self.simulate(vars)
+        else:
+            values = self.cache.lookup(vars,self.simulate,self.fingerprint)
+        return list(values[:self.num_objectives])
+    
+    def batch(self,X):
+        """Objective values - matrix (K,num_objectives) - of the K vectors 
+        of decision variables in the rows of X - matrix (K,12) -, which are 
+        simulated in a single call of HBV_sim_batch. The values are equal to
+        those of calling the objective function for each row of X."""
+        return self.values(X)[:,:self.num_objectives]
+    
+    def RMSE(self,X):
+        """RMSE considering all the hydrograph of each row of X"""
+        return self.values(X)[:,-1]
+    
+    def values(self,X):
+        """Objective values and RMSE of all the hydrograph (last column) of
+        each row of X, taken from the cache or simulated in a single batch"""
+        X = np.array(X, dtype = float, ndmin = 2)
+        if self.cache is None:
+            return self.simulate_batch(X)
+        keys = [self.cache.key(x,self.fingerprint) for x in X]
+        values = [self.cache.get(key) for key in keys]
+        missing = [k for k in range(len(keys)) if values[k] is None]
+        if missing:
+            values_missing = self.simulate_batch(X[missing])
+            for k,value in zip(missing,values_missing):
+                self.cache.put(keys[k],value)
+                values[k] = value
+        return np.array(values).reshape(len(keys),self.num_objectives+1)
+    
+    def simulate(self,vars):
+        """Objective values and RMSE of all the hydrograph of a solution"""
+        
+        ini    = vars[0:3] # [SSM0,SUZ0,SLZ0]
+        param  = vars[3:12] # [BETA,LP,FC,PERC,K0,K1,K2,UZL,MAXBAS]
+        
+        Q_sim = HBV_sim(self.P,self.E,param,self.Case,ini,self.area,outputs = 'flow')
+        
+        return self.metrics.loss(Q_sim)
+    
+    def simulate_batch(self,X):
+        """Objective values and RMSE of all the hydrograph of the rows of X,
+        simulated in a single call of HBV_sim_batch"""
+        Q_sim = HBV_sim_batch(self.P,self.E,X[:,3:12],X[:,0:3],self.Case,self.area)
+        
+        return self.metrics.loss(Q_sim)
+
+# Metrics of flow_metrics of the objectives of the calibration
+objective_metrics = {'all'   : ['rmse'],
+                     'low'   : ['rmse_low'],
+                     'high'  : ['rmse_high'],
+                     'double': ['rmse_low','rmse_high']}
+
+class BatchEvaluator(Evaluator):
+    """Platypus evaluator that evaluates all the solutions of a generation 
+    at once: the decision variables of the solutions are stacked in a matrix
+    and evaluated by the batch method of the problem function (e.g. 
+    HBV_objective.batch), which removes the Python overhead of evaluating 
+    the solutions one by one. n_threads is the number of Numba threads 
+    (None = all)"""
+    def __init__(self,n_threads = None):
+        super().__init__()
+        self.n_threads = n_threads
+        
+    def evaluate_all(self,jobs,**kwargs):
+        if len(jobs) == 0:
+            return jobs
+        solutions = [job.solution for job in jobs]
+        X = np.array([solution.variables[:] for solution in solutions], dtype = float)
+        n_threads = numba.get_num_threads()
+        if self.n_threads is not None:
+            numba.set_num_threads(min(self.n_threads,numba.config.NUMBA_NUM_THREADS))
+        try:
+            F = solutions[0].problem.function.batch(X)
+        finally:
+            numba.set_num_threads(n_threads)
+        # Same attributes as platypus Solution.evaluate (no constraints)
+        for solution,f in zip(solutions,F):
+            solution.objectives[:] = list(f)
+            solution.constraint_violation = 0.0
+            solution.feasible = True
+            solution.evaluated = True
+        return jobs
+
+class ExecutorEvaluator(SubmitEvaluator):
+    """Platypus evaluator that submits the evaluation of the solutions to a
+    concurrent.futures executor (pool of processes or threads) and shuts it 
+    down when it is closed. The results are returned in the order of the 
+    solutions, so they do not depend on the number of workers."""
+    def __init__(self,executor):
+        self.executor = executor
+        super().__init__(executor.submit)
+        
+    def close(self):
+        self.executor.shutdown()
+
+def calibration_evaluator(n_workers = None,evaluator = 'batch'):
+    """This function returns the platypus evaluator of the calibration: 
+    'batch' evaluates each generation at once with n_workers Numba threads, 
+    'process' and 'thread' evaluate the solutions one by one, serially if 
+    n_workers = 1 and otherwise in a pool of n_workers processes or threads.
+    n_workers = None uses the number of CPUs."""
+    if evaluator == 'batch':
+        return BatchEvaluator(n_workers)
+    if n_workers == 1:
+        return MapEvaluator()
+    if evaluator == 'process':
+        # Each process runs a single Numba thread, the solutions are the 
+        # parallel tasks
+        return ExecutorEvaluator(ProcessPoolExecutor(max_workers = n_workers,
+                                                     mp_context = multiprocessing.get_context('spawn'),
+                                                     initializer = numba.set_num_threads,
+                                                     initargs = (1,)))
+    elif evaluator == 'thread':
+        return ExecutorEvaluator(ThreadPoolExecutor(max_workers = n_workers))
+    else:
+        raise ValueError("evaluator must be equal to 'batch', 'process' or 'thread'")
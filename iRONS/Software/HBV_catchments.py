@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+This module simulates the HBV rainfall-runoff model (see HBV_sim.py) for
+several catchments concurrently, e.g. the catchments of the reservoirs of a
+water resource system. Each catchment has its own area, parameters and
+forcing data, and the catchments are distributed among a pool of processes.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import numba
+import pandas as pd
+
+## Tools from the iRONs toolbox
+from irons.Software.HBV_sim import HBV_sim
+from irons.Software.read_data import read_csv_data
+
+def HBV_sim_catchments(catchments,n_workers = None):
+    """This function simulates the HBV model for a list (or table) of
+    catchments and returns the simulated flows of all of them.
+
+     inputs = (catchments,n_workers)
+     outputs = results
+
+     catchments = list of dictionaries or pandas DataFrame (one row per
+                  catchment) with the following keys/columns:
+                  'name'  = name of the catchment
+                  'param' = vector of model parameters (see HBV_sim)
+                  'Case'  = flag for preferred path in the Upper Zone dynamics
+                  'ini'   = initial storages [SSM0,SUZ0,SLZ0]
+                  'area'  = catchment area [km2]
+                  and the forcing data, either as time series:
+                  'P', 'ept' = precipitation and potential evapotranspiration
+                  'dates'    = optional, dates of the time series
+                  or as a CSV file (see read_data.read_csv_data):
+                  'folder_path', 'file_name' = path and name of the file
+                  'P_column', 'ept_column'   = optional, columns of the file
+                                               (by default 'Rain' and 'PET')
+      n_workers = number of processes. By default, the number of CPUs. If
+                  n_workers = 1 the catchments are simulated in this process.
+
+        results = dictionary {name: (dates,Q_sim)} where Q_sim is the
+                  simulated flow (in ML) of each catchment and dates are the
+                  dates of the forcing data (None if not provided)
+    """
+    if isinstance(catchments,pd.DataFrame):
+        catchments = catchments.to_dict('records')
+    names = [catchment['name'] for catchment in catchments]
+    if len(set(names)) < len(names):
+        raise ValueError('the names of the catchments must be different')
+
+    if n_workers == 1:
+        results = [HBV_sim_catchment(catchment) for catchment in catchments]
+    else:
+        # Each process runs a single thread, the catchments are the parallel tasks
+        with ProcessPoolExecutor(max_workers = n_workers,
+                                 mp_context = multiprocessing.get_context('spawn'),
+                                 initializer = numba.set_num_threads,
+                                 initargs = (1,)) as executor:
+            results = list(executor.map(HBV_sim_catchment,catchments))
+
+    return dict(zip(names,results))
+
+def HBV_sim_catchment(catchment):
+    """This function simulates the HBV model for one catchment (see
+    HBV_sim_catchments) and returns (dates,Q_sim)"""
+    if 'file_name' in catchment:
+        # Both forcing time series are read from the file at once
+        dates,forcing = read_csv_data(catchment['folder_path'],catchment['file_name'],
+                                      [catchment.get('P_column','Rain'),
+                                       catchment.get('ept_column','PET')])
+        P,ept = forcing[:,0],forcing[:,1]
+    else:
+        dates = catchment.get('dates')
+        P,ept = np.asarray(catchment['P']),np.asarray(catchment['ept'])
+
+    Q_sim = HBV_sim(P,ept,catchment['param'],catchment['Case'],
+                    catchment['ini'],catchment['area'],outputs = 'flow')
+
+    return dates,Q_sim
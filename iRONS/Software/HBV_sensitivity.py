@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the global sensitivity analysis of the performance of
+the HBV model with respect to its initial storages and parameters (the
+decision variables of HBV_calibration), to identify the variables that can
+be fixed before the calibration. The methods are Python versions of those of
+the SAFE Toolbox by F. Pianosi, F. Sarrazin and T. Wagener at Bristol
+University (2015):
+    EET  = Elementary Effects Test (Morris method), with radial design
+           (Campolongo et al., 2011). Indices: mean of the absolute
+           elementary effects (mi) and their standard deviation (sigma)
+    VBSA = Variance-Based Sensitivity Analysis (Sobol), with the sampling
+           of Saltelli et al. (2010). Indices: first-order (Si) and total
+           (STi) indices
+
+The samples are simulated in chunks with HBV_sim_batch and only the metric
+of each simulation is kept. The confidence intervals of the indices are
+computed by bootstrapping these stored outputs (no more simulations).
+
+Example:
+    mi, sigma, mi_ci, sigma_ci = HBV_EET(P,E,1,area,Q_obs,r = 100)
+    Si, STi, Si_ci, STi_ci = HBV_VBSA(P,E,1,area,Q_obs,N = 2000)
+    # e.g. the variables with STi_ci[1] < 0.05 can be fixed
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import numpy as np
+
+## Tools from the iRONs toolbox
+from irons.Software.HBV_sim import HBV_sim_batch
+from irons.Software.HBV_calibration import HBV_bounds
+from irons.Software.HBV_GLUE import latin_hypercube
+from irons.Software.flow_metrics import flow_metrics
+
+def HBV_EET(P,E,Case,area,Q_obs,r,metric = 'rmse',n_boot = 1000,alpha = 0.05,
+            chunk_size = 1000,seed = None):
+    """This function computes the Elementary Effects Test of the metric (see
+    flow_metrics) of the HBV simulations with respect to Q_obs, with r
+    elementary effects per variable (r x 13 simulations).
+
+    outputs = (mi,sigma,mi_ci,sigma_ci)
+
+          mi = mean of the absolute elementary effects      - vector (12,)
+       sigma = standard deviation of the elementary effects - vector (12,)
+       mi_ci, sigma_ci = lower and upper bounds of the (1-alpha) bootstrap
+                         confidence intervals (n_boot resamples) - matrix (2,12)
+    The variables are in the order of HBV_calibration.HBV_variables.
+    """
+    rng = np.random.RandomState(seed)
+    lower,upper = np.array(HBV_bounds).T
+    X = EET_sampling(r,lower,upper,rng)
+    Y = HBV_metric(P,E,Case,area,Q_obs,X,metric,chunk_size)
+    return EET_indices(r,lower,upper,X,Y,n_boot,alpha,rng)
+
+def HBV_VBSA(P,E,Case,area,Q_obs,N,metric = 'rmse',n_boot = 1000,alpha = 0.05,
+             chunk_size = 1000,seed = None):
+    """This function computes the Variance-Based Sensitivity Analysis of the
+    metric (see flow_metrics) of the HBV simulations with respect to Q_obs,
+    with N base samples (N x 14 simulations).
+
+    outputs = (Si,STi,Si_ci,STi_ci)
+
+          Si = first-order (main effect) indices             - vector (12,)
+         STi = total-order indices                           - vector (12,)
+       Si_ci, STi_ci = lower and upper bounds of the (1-alpha) bootstrap
+                       confidence intervals (n_boot resamples) - matrix (2,12)
+    The variables are in the order of HBV_calibration.HBV_variables.
+    """
+    rng = np.random.RandomState(seed)
+    lower,upper = np.array(HBV_bounds).T
+    X = VBSA_sampling(N,lower,upper,rng)
+    Y = HBV_metric(P,E,Case,area,Q_obs,X,metric,chunk_size)
+    return VBSA_indices(N,Y,n_boot,alpha,rng)
+
+def HBV_metric(P,E,Case,area,Q_obs,X,metric = 'rmse',chunk_size = 1000):
+    """This function returns the metric (see flow_metrics) of the HBV
+    simulations of the rows of X - matrix (n,12) -, which are simulated in
+    chunks of chunk_size rows"""
+    metrics = flow_metrics(Q_obs,metric)
+    Y = np.empty(len(X))
+    for start in range(0,len(X),chunk_size):
+        X_chunk = X[start:start+chunk_size]
+        Q_sim = HBV_sim_batch(P,E,X_chunk[:,3:12],X_chunk[:,0:3],Case,area)
+        Y[start:start+chunk_size] = metrics(Q_sim)[:,0]
+    return Y
+
+def EET_sampling(r,lower,upper,rng = np.random):
+    """This function returns the samples - matrix (r*(d+1),d) - of the
+    Elementary Effects Test with radial design: r base points (Latin
+    hypercube) each followed by d points that change one variable to the
+    value of an auxiliary point"""
+    d = len(lower)
+    A = latin_hypercube(r,lower,upper,rng)
+    B = latin_hypercube(r,lower,upper,rng)
+    X = np.repeat(A,d+1,axis = 0).reshape(r,d+1,d)
+    i = np.arange(d)
+    X[:,i+1,i] = B
+    return X.reshape(r*(d+1),d)
+
+def EET_indices(r,lower,upper,X,Y,n_boot = 1000,alpha = 0.05,rng = np.random):
+    """This function returns the Elementary Effects Test indices (mi,sigma)
+    and their bootstrap confidence intervals (mi_ci,sigma_ci) from the samples
+    X of EET_sampling and their outputs Y. The elementary effects are
+    normalised by the range of each variable."""
+    d = len(lower)
+    X = X.reshape(r,d+1,d)
+    Y = np.asarray(Y).reshape(r,d+1)
+    i = np.arange(d)
+    delta = (X[:,i+1,i] - X[:,0,:])/(np.asarray(upper) - lower)
+    EE = (Y[:,1:] - Y[:,[0]])/delta # matrix (r,d)
+
+    mi = np.abs(EE).mean(axis = 0)
+    sigma = EE.std(axis = 0, ddof = 1)
+    # Bootstrap (resampling of the base points)
+    mi_boot = np.empty((n_boot,d))
+    sigma_boot = np.empty((n_boot,d))
+    for b in range(n_boot):
+        EE_b = EE[rng.randint(0,r,r)]
+        mi_boot[b] = np.abs(EE_b).mean(axis = 0)
+        sigma_boot[b] = EE_b.std(axis = 0, ddof = 1)
+    return mi, sigma, confidence_interval(mi_boot,alpha), confidence_interval(sigma_boot,alpha)
+
+def VBSA_sampling(N,lower,upper,rng = np.random):
+    """This function returns the samples - matrix (N*(d+2),d) - of the
+    Variance-Based Sensitivity Analysis: two independent sets of N samples
+    A and B (Latin hypercube) and the d sets AB_i, equal to A except the
+    i-th variable, which is taken from B"""
+    d = len(lower)
+    A = latin_hypercube(N,lower,upper,rng)
+    B = latin_hypercube(N,lower,upper,rng)
+    AB = np.repeat(A[np.newaxis],d,axis = 0)
+    i = np.arange(d)
+    AB[i,:,i] = B.T
+    return np.vstack([A,B,AB.reshape(d*N,d)])
+
+def VBSA_indices(N,Y,n_boot = 1000,alpha = 0.05,rng = np.random):
+    """This function returns the first-order and total indices (Si,STi) and
+    their bootstrap confidence intervals (Si_ci,STi_ci) from the outputs Y of
+    the samples of VBSA_sampling (estimators of Saltelli et al., 2010 and
+    Jansen, 1999)"""
+    Y = np.asarray(Y)
+    YA,YB = Y[:N],Y[N:2*N]
+    YAB = Y[2*N:].reshape(-1,N).T # matrix (N,d)
+
+    def indices(YA,YB,YAB):
+        V = np.var(np.concatenate([YA,YB]))
+        Si = np.mean(YB[:,np.newaxis]*(YAB - YA[:,np.newaxis]),axis = 0)/V
+        STi = 0.5*np.mean((YA[:,np.newaxis] - YAB)**2,axis = 0)/V
+        return Si,STi
+
+    Si,STi = indices(YA,YB,YAB)
+    # Bootstrap (resampling of the base samples)
+    Si_boot = np.empty((n_boot,len(Si)))
+    STi_boot = np.empty((n_boot,len(Si)))
+    for b in range(n_boot):
+        k = rng.randint(0,N,N)
+        Si_boot[b],STi_boot[b] = indices(YA[k],YB[k],YAB[k])
+    return Si, STi, confidence_interval(Si_boot,alpha), confidence_interval(STi_boot,alpha)
+
+def confidence_interval(boot,alpha):
+    """Lower and upper bounds (percentiles) of the (1-alpha) confidence
+    interval of the bootstrap estimates - matrix (n_boot,d) -"""
+    return np.percentile(boot,[100*alpha/2,100*(1-alpha/2)],axis = 0)
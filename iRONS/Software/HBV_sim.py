@@ -12,15 +12,23 @@ Licence: MIT
 """
 
 import numpy as np
+from functools import lru_cache
+from numba import njit,prange
 
-def HBV_sim(P,ept,param,Case,ini,area):
+## Tools from the iRONs toolbox
+from irons.Software.jit_cache import serial_kernel
+
+def HBV_sim(P,ept,param,Case,ini,area,outputs = 'all',Q_buffer = None,
+            dtype = np.float64):
     """This function simulates the HBV rainfall-runoff model (Seibert, 1997).
      
-     inputs = (P,ept,param,Case)
+     inputs = (P,ept,param,Case,ini,area,outputs,Q_buffer,dtype)
      outputs = (Q_sim,STATES,FLUXES)
     
          P = time series of precipitation                      - vector (T,1)
+             or ensemble of time series (one column per member)- matrix (T,M)
        ept = time series of potential evapotranspiration       - vector (T,1)
+             or ensemble of time series (one column per member)- matrix (T,M)
      param = vector of model parameters                        - vector (1,9)
                 1. BETA  = Exponential parameter in soil routine [-]
                 2. LP    = evapotranspiration limit [-]
@@ -34,6 +42,24 @@ def HBV_sim(P,ept,param,Case,ini,area):
      Case = flag for preferred path in the Upper Zone dynamics - scalar
             flag=1 -> Preferred path is runoff 
             flag=2 -> Preferred path is percolation
+      ini = initial storages [SSM0,SUZ0,SLZ0], shared by all   - vector (1,3)
+            the ensemble members
+     area = catchment area [km2]                               - scalar
+  outputs = optional, selection of the outputs to return      - string
+            'all'    -> (Q_sim,STATES,FLUXES) (default)
+            'states' -> (Q_sim,STATES)
+            'flow'   -> Q_sim
+            The time series that are not returned are not stored, which 
+            reduces memory use, e.g. when only Q_sim is needed for calibration
+ Q_buffer = optional, total outflow (in mm) before routing of the      - vector
+            time steps preceding the simulation period (up to MAXBAS-1 
+            values, see HBV_state), to continue the flow routing of a 
+            previous simulation
+    dtype = optional, floating point type of the simulation, np.float64 
+            (default) or np.float32. With np.float32 the time series are 
+            stored (and the flows are routed) in single precision, which 
+            halves memory use for long or large ensemble simulations
+            (relative differences with np.float64 are below 1e-5)
     
       Q_sim = time series of simulated flow (in mm)            - vector (T,1)
      STATES = time series of simulated storages (all in mm)    - matrix (T,3)
@@ -54,7 +80,15 @@ def HBV_sim(P,ept,param,Case,ini,area):
      Seibert, J.(1997), Estimation of Parameter Uncertainty in the HBV Model,
      Nordic Hydrology, 28(4/5), 247-262.
     
+     If P or ept are matrices (T,M), e.g. an ensemble of weather forecasts, the 
+     M members are simulated in parallel and Q_sim and each element of STATES
+     and FLUXES are matrices with one column per member, i.e. (T,M) or 
+     (T+1,M) for the storages.
+    
      Comments:
+     * To speed-up the computation the time loop is run by HBV_kernel, which
+     applies the just-in-time compiler Numba (http://numba.pydata.org/) and
+     releases the GIL, so that several simulations can run in threads
      * The Capillary flux (from upper tank to soil moisture accounting module)
      is not considered
      * The recharge from the soil to the upper zone is considered to be a
@@ -67,102 +101,186 @@ def HBV_sim(P,ept,param,Case,ini,area):
     # ----------------------
     # Read model parameters:
     # ----------------------
-    BETA = param[0] # Exponential parameter in soil routine [-]
-    LP = param[1] # evapotranspiration limit [-]
-    FC = max(np.finfo(float).eps,param[2]) # field capacity [mm] cannot be zero
-     
-    PERC  = param[3] # maximum flux from Upper to Lower Zone [mm/Dt]
-    K0    = param[4] # Near surface flow coefficient (ratio) [1/Dt]  
-    K1    = param[5] # Upper Zone outflow coefficient (ratio) [1/Dt]  
-    K2    = param[6] # Lower Zone outflow coefficient (ratio) [1/Dt]  
-    UZL   = param[7] # Near surface flow threshold [mm]
+    BETA,LP,FC,PERC,K0,K1,K2,UZL,MAXBAS = HBV_param(param)
     
-    MAXBAS = max(1,round(param[8])) # Flow routing coefficient [Dt]
+    if Case not in (1,2):
+        raise ValueError('Case must equal to 1 or 2 ')
+    if outputs not in ('all','states','flow'):
+        raise ValueError("outputs must be equal to 'all', 'states' or 'flow'")
+    keep_states = outputs in ('all','states')
+    keep_fluxes = outputs == 'all'
     
+    P = np.asarray(P, dtype = dtype)
+    ept = np.asarray(ept, dtype = dtype)
+    ensemble = P.ndim == 2 or ept.ndim == 2 # ensemble of forcing time series
     N = len(ept) # number of time samples
+    M = max(P.reshape(N,-1).shape[1],ept.reshape(N,-1).shape[1]) # number of ensemble members
+    P = np.ascontiguousarray(np.broadcast_to(P.reshape(N,-1),(N,M)))
+    ept = np.ascontiguousarray(np.broadcast_to(ept.reshape(N,-1),(N,M)))
     
-    # ----------------------
-    # Soil moisture routine:
-    # ----------------------
+    # ---------------------------------------------------
+    # Soil moisture, Upper Zone and Lower Zone dynamics:
+    # ---------------------------------------------------
     [SSM0,SUZ0,SLZ0] = ini
-    EA = np.zeros([N,]) # Actual Evapotranspiration [mm/Dt]
-    SM = np.zeros([N+1,]) # Soil Moisture [mm]
-    SM[0] = SSM0
-    R  = np.zeros([N,]) # Recharge (water flow from Soil to Upper Zone) [mm/Dt]
-    UZ = np.zeros([N+1,]) # Upper Zone moisture [mm]
-    UZ[0] = SUZ0
-    LZ = np.zeros([N+1,]) # Lower Zone moisture [mm]
-    LZ[0] = SLZ0
-    RL = np.zeros([N,]) # Recharge to the lower zone [mm]
-    Q0 = np.zeros([N,]) # Outflow from Upper Zone [mm/Dt]
-    Q1 = np.zeros([N,]) # Outflow from Lower Zone [mm/Dt]
-    
-    for t in range(N):
-        
-        # --------------------------
-        #    Soil Moisture Dynamics:
-        # --------------------------
-    
-        R[t]= P[t]*(SM[t]/FC)**BETA  # Compute the value of the recharge to the 
-        # upper zone (we assumed that this process is faster than evaporation)
-        SM_dummy = max(min(SM[t]+P[t]-R[t],FC),0) # Compute the water balance 
-        # with the value of the recharge  
-        R[t]=R[t]+ max(SM[t]+P[t]- R[t]-FC,0)+min(SM[t]+P[t]-R[t],0) #adjust R 
-        # by an amount equal to the possible negative SM amount or to the 
-        # possible SM amount above FC
-        
-        EA[t]=ept[t]*min(SM_dummy/(FC*LP),1) # Compute the evaporation
-        SM[t+1] = max(min(SM_dummy-EA[t],FC),0) # Compute the water balance 
-        
-        EA[t]=EA[t]+ max(SM_dummy-EA[t]-FC,0)+min(SM_dummy-EA[t],0) # adjust EA
-        # by an amount equal to the possible negative SM amount or to the 
-        # possible SM amount above FC
-        
-        # --------------------
-        # Upper Zone dynamics:
-        # --------------------
-
-        if Case==1:
-            # Case 1: Preferred path = runoff from the upper zone 
-            Q0[t] = max(min(K1*UZ[t]+K0*max(UZ[t]-UZL,0),UZ[t]),0)              	 
-            RL[t] = max(min(UZ[t]-Q0[t],PERC),0)
-    
-        elif Case==2:
-            # Case 2: Preferred path = percolation
-            RL[t]= max(min(PERC,UZ[t]),0)
-            Q0[t] = max(min(K1*UZ[t]+K0*max(UZ[t]-UZL,0),UZ[t]-RL[t]),0)
-        else:
-            raise ValueError('Case must equal to 1 or 2 ')
-            
-        UZ[t+1] = UZ[t]+R[t]-Q0[t]-RL[t]   
-        
-        # --------------------
-        # Lower Zone dynamics: 
-        # --------------------
-
-        Q1[t] = max(min(K2*LZ[t],LZ[t]),0)
-        LZ[t+1] = LZ[t]+RL[t]-Q1[t]
-        
-    Q = Q0 + Q1 ; # total outflow (mm/Dt)
+    to_dtype = np.dtype(dtype).type
+    area = to_dtype(area)
+    kernel = HBV_kernel if M > 1 else HBV_kernel_serial
+    Q,SM,UZ,LZ,EA,R,RL,Q0,Q1,S_end = kernel(P,ept,
+                                            to_dtype(BETA),to_dtype(LP),
+                                            to_dtype(FC),to_dtype(PERC),
+                                            to_dtype(K0),to_dtype(K1),
+                                            to_dtype(K2),to_dtype(UZL),
+                                            int(Case),
+                                            to_dtype(SSM0),to_dtype(SUZ0),
+                                            to_dtype(SLZ0),
+                                            keep_states,keep_fluxes)
+    # Q = total outflow (mm/Dt)
 
     # --------------------
     # FLOW ROUTING ROUTINE
     # --------------------
+    Q_sim = HBV_routing(Q,MAXBAS,Q_buffer)
     
-    #c = trimf(1:MAXBAS,[0 (MAXBAS+1)/2 MAXBAS+1])  # (Seibert,1997)
-    c = mytrimf(np.arange(1,MAXBAS+1,1),[0, (MAXBAS+1)/2, MAXBAS+1]) # (Seibert,1997)
+    if not ensemble:
+        Q_sim = Q_sim[:,0]
+        SM,UZ,LZ,EA,R,RL,Q0,Q1 = [x[:,0] for x in [SM,UZ,LZ,EA,R,RL,Q0,Q1]]
     
+    if outputs == 'flow':
+        return Q_sim*area
     
-    c = c/np.sum(c) # vector of normalized coefficients - (1,MAXBAS)
-    Q_sim = Q
-    for t in np.arange(MAXBAS,N+1,1):
-        Q_sim[t-1] = c.dot(Q[t-MAXBAS:t]) # (Seibert,1997)
-        
     STATES=[SM,UZ,LZ]
+    if outputs == 'states':
+        return Q_sim*area,STATES
+    
     FLUXES=[EA,R,RL,Q0*area,Q1*area] # flows Q in mm * area (km2) = ML
     
     return Q_sim*area,STATES,FLUXES
     
+def HBV_param(param):
+    """This function reads the vector of model parameters (see HBV_sim) and
+    returns them as floats, with the field capacity (FC) bounded to be 
+    greater than zero and the flow routing coefficient (MAXBAS) rounded to 
+    an integer greater or equal to one.
+    """
+    BETA = float(param[0]) # Exponential parameter in soil routine [-]
+    LP = float(param[1]) # evapotranspiration limit [-]
+    FC = float(max(np.finfo(float).eps,param[2])) # field capacity [mm] cannot be zero
+     
+    PERC  = float(param[3]) # maximum flux from Upper to Lower Zone [mm/Dt]
+    K0    = float(param[4]) # Near surface flow coefficient (ratio) [1/Dt]  
+    K1    = float(param[5]) # Upper Zone outflow coefficient (ratio) [1/Dt]  
+    K2    = float(param[6]) # Lower Zone outflow coefficient (ratio) [1/Dt]  
+    UZL   = float(param[7]) # Near surface flow threshold [mm]
+    
+    MAXBAS = int(max(1,round(param[8]))) # Flow routing coefficient [Dt]
+    
+    return BETA,LP,FC,PERC,K0,K1,K2,UZL,MAXBAS
+
+def HBV_sim_batch(P,ept,params,ini,Case,area,dtype = np.float64):
+    """This function simulates the HBV rainfall-runoff model (Seibert, 1997)
+    for K parameter sets (and initial conditions) against the same forcing in 
+    a single call. The K simulations run in parallel (Numba prange) and only 
+    the simulated flows are stored.
+     
+     inputs = (P,ept,params,ini,Case,area,dtype)
+     outputs = Q_sim
+    
+          P = time series of precipitation                   - vector (T,1)
+        ept = time series of potential evapotranspiration    - vector (T,1)
+     params = model parameters, one row per parameter set    - matrix (K,9)
+              (same order as param in HBV_sim)
+        ini = initial storages [SSM0,SUZ0,SLZ0], one row per - matrix (K,3)
+              parameter set
+       Case = flag for preferred path in the Upper Zone dynamics - scalar
+       area = catchment area [km2]                               - scalar
+    
+      Q_sim = time series of simulated flow (in ML) for each  - matrix (T,K)
+              parameter set. Column k is equal to the Q_sim 
+              output of HBV_sim(P,ept,params[k],Case,ini[k],area)
+    """
+    if Case not in (1,2):
+        raise ValueError('Case must equal to 1 or 2 ')
+        
+    P = np.asarray(P, dtype = dtype)
+    ept = np.asarray(ept, dtype = dtype)
+    params = np.array(params, dtype = dtype, ndmin = 2)
+    ini = np.array(ini, dtype = dtype, ndmin = 2)
+    if ini.shape[0] != params.shape[0]:
+        raise ValueError('params and ini must have the same number of rows')
+    
+    params[:,2] = np.maximum(np.finfo(dtype).eps,params[:,2]) # field capacity [mm] cannot be zero
+    MAXBAS = np.maximum(1,np.round(params[:,8])).astype(int) # Flow routing coefficient [Dt]
+    
+    # ---------------------------------------------------
+    # Soil moisture, Upper Zone and Lower Zone dynamics:
+    # ---------------------------------------------------
+    Q = HBV_batch_kernel(P,ept,params,ini,int(Case)) # total outflow (mm/Dt)
+    
+    # --------------------
+    # FLOW ROUTING ROUTINE
+    # --------------------
+    Q_sim = np.zeros_like(Q) # same (column) order as Q
+    for MAXBAS_k in np.unique(MAXBAS): # parameter sets with the same MAXBAS are routed together
+        idx = MAXBAS == MAXBAS_k
+        Q_sim[:,idx] = HBV_routing(Q[:,idx],int(MAXBAS_k))
+    
+    return Q_sim*np.dtype(dtype).type(area)
+
+def HBV_routing(Q,MAXBAS,Q_buffer = None):
+    """This function routes the total outflow Q (in mm) with the triangular 
+    weighting function of MAXBAS time steps (Seibert, 1997), i.e. a finite 
+    impulse response (FIR) filter applied along the time axis:
+        
+        Q_sim(t) = c(1)*Q(t-MAXBAS+1) + ... + c(MAXBAS)*Q(t)
+    
+    The filter is computed with one array operation per coefficient. The 
+    first MAXBAS-1 time steps, which do not have a complete window of 
+    previous flows, are not routed unless the previous flows are provided 
+    in Q_buffer.
+    
+     inputs = (Q,MAXBAS,Q_buffer)
+     outputs = Q_sim
+    
+            Q = time series of total outflow (in mm) - vector (T,1) or matrix (T,M)
+       MAXBAS = Flow routing coefficient [Dt]        - integer
+     Q_buffer = optional, total outflow (in mm) of   - vector (L,1)
+                the L time steps preceding Q (only 
+                the last MAXBAS-1 values are used)
+    """
+    Q = np.asarray(Q)
+    if not np.issubdtype(Q.dtype,np.floating):
+        Q = Q.astype(np.float64)
+    
+    if Q_buffer is not None and len(Q_buffer) > 0:
+        Q_buffer = np.asarray(Q_buffer, dtype = Q.dtype)[-(MAXBAS-1):] if MAXBAS > 1 else []
+        L = len(Q_buffer)
+        Q_buffer = np.broadcast_to(np.reshape(Q_buffer,(L,)+(1,)*(Q.ndim-1)),(L,)+Q.shape[1:])
+        return HBV_routing(np.concatenate([Q_buffer,Q]),MAXBAS)[L:]
+    
+    c = routing_weights(MAXBAS).astype(Q.dtype) # vector of normalized coefficients - (1,MAXBAS)
+    N = Q.shape[0] # number of time samples
+    
+    Q_sim = np.array(Q) # copy, so that the unrouted flows are not overwritten
+    if N >= MAXBAS:
+        Q_sim[MAXBAS-1:] = c[0]*Q[0:N-MAXBAS+1]
+        for i in range(1,MAXBAS):
+            Q_sim[MAXBAS-1:] += c[i]*Q[i:N-MAXBAS+1+i] # (Seibert,1997)
+        
+    return Q_sim
+
+@lru_cache(maxsize = None)
+def routing_weights(MAXBAS):
+    """This function returns the normalized coefficients of the triangular 
+    weighting function used in the flow routing routine (Seibert, 1997). The 
+    coefficients are computed once for each (integer) value of MAXBAS.
+    """
+    #c = trimf(1:MAXBAS,[0 (MAXBAS+1)/2 MAXBAS+1])  # (Seibert,1997)
+    c = mytrimf(np.arange(1,MAXBAS+1,1),[0, (MAXBAS+1)/2, MAXBAS+1]) # (Seibert,1997)
+    c = c/np.sum(c)
+    c.flags.writeable = False # the cached coefficients cannot be modified
+    
+    return c
+
 def mytrimf(x,param):
     # implements triangular-shaped membership function
     # (available in Matlab Fuzzy Logic Toolbox as 'trimf')
@@ -173,4 +291,134 @@ def mytrimf(x,param):
     idx = (x>param[1]) & (x<=param[2])
     f[idx] = (param[2]-x[idx])/(param[2]-param[1])
     
-    return f
\ No newline at end of file
+    return f
+
+@njit(cache = True) # Numba decorator to speed-up the function below
+def HBV_step(P_t,ept_t,SM_t,UZ_t,LZ_t,
+             BETA,LP,FC,PERC,K0,K1,K2,UZL,Case):
+    """This function computes one time step of the soil moisture, Upper Zone 
+    and Lower Zone dynamics of the HBV model. 
+    
+    inputs = (P_t,ept_t,SM_t,UZ_t,LZ_t,BETA,LP,FC,PERC,K0,K1,K2,UZL,Case)
+    outputs = (SM_t1,UZ_t1,LZ_t1,EA_t,R_t,RL_t,Q0_t,Q1_t)
+    
+    where the suffix _t refers to the value at (or during) time step t and the 
+    suffix _t1 to the value at the beginning of the next time step (t+1). 
+    Parameters and fluxes are defined as in HBV_sim.
+    """
+    # --------------------------
+    #    Soil Moisture Dynamics:
+    # --------------------------
+    
+    R_t = P_t*(SM_t/FC)**BETA  # Compute the value of the recharge to the 
+    # upper zone (we assumed that this process is faster than evaporation)
+    SM_dummy = max(min(SM_t+P_t-R_t,FC),0) # Compute the water balance 
+    # with the value of the recharge  
+    R_t = R_t + max(SM_t+P_t-R_t-FC,0)+min(SM_t+P_t-R_t,0) #adjust R 
+    # by an amount equal to the possible negative SM amount or to the 
+    # possible SM amount above FC
+    
+    EA_t = ept_t*min(SM_dummy/(FC*LP),1) # Compute the evaporation
+    SM_t1 = max(min(SM_dummy-EA_t,FC),0) # Compute the water balance 
+    
+    EA_t = EA_t + max(SM_dummy-EA_t-FC,0)+min(SM_dummy-EA_t,0) # adjust EA
+    # by an amount equal to the possible negative SM amount or to the 
+    # possible SM amount above FC
+    
+    # --------------------
+    # Upper Zone dynamics:
+    # --------------------
+    
+    if Case==1:
+        # Case 1: Preferred path = runoff from the upper zone 
+        Q0_t = max(min(K1*UZ_t+K0*max(UZ_t-UZL,0),UZ_t),0)
+        RL_t = max(min(UZ_t-Q0_t,PERC),0)
+    else:
+        # Case 2: Preferred path = percolation
+        RL_t = max(min(PERC,UZ_t),0)
+        Q0_t = max(min(K1*UZ_t+K0*max(UZ_t-UZL,0),UZ_t-RL_t),0)
+        
+    UZ_t1 = UZ_t+R_t-Q0_t-RL_t
+    
+    # --------------------
+    # Lower Zone dynamics: 
+    # --------------------
+    
+    Q1_t = max(min(K2*LZ_t,LZ_t),0)
+    LZ_t1 = LZ_t+RL_t-Q1_t
+    
+    return SM_t1,UZ_t1,LZ_t1,EA_t,R_t,RL_t,Q0_t,Q1_t
+
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
+def HBV_kernel(P,ept,BETA,LP,FC,PERC,K0,K1,K2,UZL,Case,SSM0,SUZ0,SLZ0,
+               keep_states = True,keep_fluxes = True):
+    """This function runs the time loop of the HBV model (see HBV_step) for 
+    each column (ensemble member) of P and ept - matrices (T,M) - and 
+    returns the total outflow (Q=Q0+Q1) and the time series of storages 
+    (SM,UZ,LZ) and fluxes (EA,R,RL,Q0,Q1), all in mm or mm/Dt, for each 
+    member. If keep_states (keep_fluxes) is False the storages (fluxes) are 
+    only kept as running scalars and empty arrays are returned instead. The 
+    storages at the end of the simulation are returned in S_end - matrix (M,3)
+    """
+    N = P.shape[0] # number of time samples
+    M = P.shape[1] # number of ensemble members
+    N_states = N+1 if keep_states else 0
+    N_fluxes = N if keep_fluxes else 0
+    
+    Q  = np.zeros((N,M),P.dtype) # Total outflow [mm/Dt]
+    EA = np.zeros((N_fluxes,M),P.dtype) # Actual Evapotranspiration [mm/Dt]
+    SM = np.zeros((N_states,M),P.dtype) # Soil Moisture [mm]
+    R  = np.zeros((N_fluxes,M),P.dtype) # Recharge (water flow from Soil to Upper Zone) [mm/Dt]
+    UZ = np.zeros((N_states,M),P.dtype) # Upper Zone moisture [mm]
+    LZ = np.zeros((N_states,M),P.dtype) # Lower Zone moisture [mm]
+    RL = np.zeros((N_fluxes,M),P.dtype) # Recharge to the lower zone [mm]
+    Q0 = np.zeros((N_fluxes,M),P.dtype) # Outflow from Upper Zone [mm/Dt]
+    Q1 = np.zeros((N_fluxes,M),P.dtype) # Outflow from Lower Zone [mm/Dt]
+    S_end = np.zeros((M,3),P.dtype) # Storages at the end of the simulation [mm]
+    
+    for m in prange(M):
+        SM_t,UZ_t,LZ_t = SSM0,SUZ0,SLZ0
+        if keep_states:
+            SM[0,m],UZ[0,m],LZ[0,m] = SM_t,UZ_t,LZ_t
+        for t in range(N):
+            SM_t,UZ_t,LZ_t,EA_t,R_t,RL_t,Q0_t,Q1_t = HBV_step(
+                    P[t,m],ept[t,m],SM_t,UZ_t,LZ_t,
+                    BETA,LP,FC,PERC,K0,K1,K2,UZL,Case)
+            Q[t,m] = Q0_t + Q1_t
+            if keep_states:
+                SM[t+1,m],UZ[t+1,m],LZ[t+1,m] = SM_t,UZ_t,LZ_t
+            if keep_fluxes:
+                EA[t,m],R[t,m],RL[t,m],Q0[t,m],Q1[t,m] = EA_t,R_t,RL_t,Q0_t,Q1_t
+        S_end[m,0],S_end[m,1],S_end[m,2] = SM_t,UZ_t,LZ_t
+        
+    return Q,SM,UZ,LZ,EA,R,RL,Q0,Q1,S_end
+
+# Serial version of HBV_kernel for a single ensemble member: it avoids the
+# parallel launch overhead and can run concurrently in several threads
+HBV_kernel_serial = serial_kernel(HBV_kernel)
+
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
+def HBV_batch_kernel(P,ept,params,ini,Case):
+    """This function runs the time loop of the HBV model (see HBV_step) for
+    each row of params and ini and returns the total outflow (Q0+Q1, in 
+    mm/Dt) of each parameter set - matrix (T,K). The states and the other 
+    fluxes are kept as running scalars.
+    """
+    N = len(ept) # number of time samples
+    K = params.shape[0] # number of parameter sets
+    
+    # Total outflow [mm/Dt], stored by columns (each simulation is contiguous)
+    Q = np.zeros((K,N),P.dtype).T
+    
+    for k in prange(K):
+        BETA,LP,FC,PERC,K0,K1,K2,UZL = (params[k,0],params[k,1],params[k,2],
+                                        params[k,3],params[k,4],params[k,5],
+                                        params[k,6],params[k,7])
+        SM_t,UZ_t,LZ_t = ini[k,0],ini[k,1],ini[k,2]
+        for t in range(N):
+            SM_t,UZ_t,LZ_t,EA_t,R_t,RL_t,Q0_t,Q1_t = HBV_step(
+                    P[t],ept[t],SM_t,UZ_t,LZ_t,
+                    BETA,LP,FC,PERC,K0,K1,K2,UZL,Case)
+            Q[t,k] = Q0_t + Q1_t
+            
+    return Q
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains tools to save and resume the state of the HBV
+rainfall-runoff model (see HBV_sim.py), so that a simulation can be continued
+from a given date without re-simulating the previous period.
+The tools included are:
+    HBV_state      : state of the model (storages and routing buffer)
+    HBV_sim_state  : simulation from a given state
+    HBV_checkpoints: cache of states at regular dates (checkpoints)
+    HBV_stream     : stateful model that simulates the forcing data in chunks
+
+For instance, before every forecast the model must be run over the historical
+record (warm-up period) to obtain the initial conditions of the forecast.
+With HBV_checkpoints the warm-up of a new forecast issue date resumes from the
+nearest previous checkpoint. With HBV_stream the forcing data can be
+simulated as it is received, e.g. one day at a time, without re-running the
+entire time series or storing it in memory.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+## Tools from the iRONs toolbox
+from irons.Software.HBV_sim import HBV_param, HBV_kernel_serial, HBV_routing
+
+class HBV_state:
+    """This class defines the state of the HBV model at a given date, i.e. at
+    the beginning of the time step that corresponds to that date.
+
+     SM       = water content of soil (soil moisture) [mm]
+     UZ       = water content of upper reservoir of flow routing routine [mm]
+     LZ       = water content of lower reservoir of flow routing routine [mm]
+     Q_buffer = total outflow (Q0+Q1, in mm) before routing of the previous
+                time steps (up to MAXBAS-1 values), required to continue the
+                flow routing routine
+     date     = date of the state (optional)
+
+    The state can be serialised as a dictionary (to_dict) and restored
+    (from_dict).
+    """
+    def __init__(self,SM,UZ,LZ,Q_buffer = [],date = None):
+        self.SM = float(SM)
+        self.UZ = float(UZ)
+        self.LZ = float(LZ)
+        self.Q_buffer = np.array(Q_buffer, dtype = np.float64).ravel()
+        self.date = None if date is None else pd.Timestamp(date)
+
+    @property
+    def ini(self):
+        """Storages as the ini input of HBV_sim: [SSM0,SUZ0,SLZ0]"""
+        return [self.SM,self.UZ,self.LZ]
+
+    def to_dict(self):
+        return {'SM'       : self.SM,
+                'UZ'       : self.UZ,
+                'LZ'       : self.LZ,
+                'Q_buffer' : self.Q_buffer.tolist(),
+                'date'     : None if self.date is None else self.date.isoformat()}
+
+    @classmethod
+    def from_dict(cls,state_dict):
+        return cls(state_dict['SM'],state_dict['UZ'],state_dict['LZ'],
+                   state_dict['Q_buffer'],state_dict['date'])
+
+    def __repr__(self):
+        return 'HBV_state(SM=%s, UZ=%s, LZ=%s, Q_buffer=%s, date=%s)' % (
+                self.SM,self.UZ,self.LZ,self.Q_buffer.tolist(),self.date)
+
+def HBV_sim_state(P,ept,param,Case,state,area,date = None):
+    """This function simulates the HBV model from a given state and returns
+    the simulated flow and the state at the end of the simulation period.
+    Simulating a period in several consecutive calls gives the same results
+    as simulating the entire period in one call of HBV_sim.
+
+     inputs = (P,ept,param,Case,state,area,date)
+     outputs = (Q_sim,state_end)
+
+             P = time series of precipitation                 - vector (T,1)
+           ept = time series of potential evapotranspiration  - vector (T,1)
+         param = vector of model parameters (see HBV_sim)     - vector (1,9)
+          Case = flag for preferred path in the Upper Zone dynamics - scalar
+         state = initial state of the model                   - HBV_state
+          area = catchment area [km2]                         - scalar
+          date = optional, date of the end of the simulation period, i.e.
+                 date of state_end
+
+         Q_sim = time series of simulated flow (in ML)        - vector (T,1)
+     state_end = state of the model at the end of the period  - HBV_state
+    """
+    if Case not in (1,2):
+        raise ValueError('Case must equal to 1 or 2 ')
+    BETA,LP,FC,PERC,K0,K1,K2,UZL,MAXBAS = HBV_param(param)
+
+    P = np.asarray(P, dtype = np.float64).reshape(-1,1)
+    ept = np.asarray(ept, dtype = np.float64).reshape(-1,1)
+
+    # Single member: serial kernel (without the overhead of the threads)
+    Q,SM,UZ,LZ,EA,R,RL,Q0,Q1,S_end = HBV_kernel_serial(P,ept,
+                                                       BETA,LP,FC,PERC,K0,K1,K2,UZL,
+                                                       int(Case),
+                                                       state.SM,state.UZ,state.LZ,
+                                                       False,False)
+    Q = Q[:,0] # total outflow (mm/Dt)
+    Q_sim = HBV_routing(Q,MAXBAS,state.Q_buffer)
+
+    # Total outflow of the last MAXBAS-1 time steps
+    Q_buffer = np.concatenate([state.Q_buffer,Q])
+    Q_buffer = Q_buffer[max(0,len(Q_buffer)-(MAXBAS-1)):]
+    state_end = HBV_state(S_end[0,0],S_end[0,1],S_end[0,2],Q_buffer,date)
+
+    return Q_sim*area,state_end
+
+def data_fingerprint(*data):
+    """This function returns a fingerprint (hash) of the data provided, e.g.
+    the dates and forcing time series of a simulation"""
+    fingerprint = hashlib.sha1()
+    for x in data:
+        x = np.ascontiguousarray(x)
+        fingerprint.update(str(x.dtype).encode())
+        fingerprint.update(str(x.shape).encode())
+        fingerprint.update(x.tobytes())
+
+    return fingerprint.hexdigest()
+
+def file_fingerprint(folder_path,file_name):
+    """This function returns a fingerprint (hash) of the content of a file,
+    e.g. the CSV file of the historical forcing data"""
+    fingerprint = hashlib.sha1()
+    with open(folder_path+"/"+file_name,'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            fingerprint.update(chunk)
+
+    return fingerprint.hexdigest()
+
+class HBV_checkpoints:
+    """This class stores states of the HBV model (checkpoints) at regular
+    dates, keyed on the model parameters, the initial conditions and a
+    fingerprint of the forcing data. The checkpoints are kept in memory and, if
+    folder_path is provided, saved as JSON files so that they can be used in
+    later sessions.
+
+     folder_path = optional, folder where the checkpoints are saved
+     freq        = frequency of the checkpoints (pandas offset alias), by
+                   default at the start of every month ('MS')
+
+    Example (warm-up before a forecast issued on dates_fore[0]):
+        checkpoints = HBV_checkpoints('Results/checkpoints')
+        state = checkpoints.warmup(dates_hist,Rain_hist,e_hist,param,case,ini0,
+                                   catchment_area,dates_fore[0])
+        I_fore = HBV_sim(Rain_fore,e_fore,param,case,state.ini,catchment_area,
+                         outputs = 'flow',Q_buffer = state.Q_buffer)
+    """
+    def __init__(self,folder_path = None,freq = 'MS'):
+        self.folder_path = folder_path
+        self.freq = freq
+        self.checkpoints = {} # {key: {date: state_dict}}
+
+    def key(self,param,Case,ini,fingerprint):
+        return data_fingerprint(np.asarray(param, dtype = np.float64),
+                                np.asarray(ini, dtype = np.float64),
+                                np.asarray(Case),
+                                np.frombuffer(fingerprint.encode(), dtype = np.uint8))
+
+    def file_path(self,key):
+        return os.path.join(self.folder_path,'HBV_checkpoints_'+key+'.json')
+
+    def load(self,key):
+        if key not in self.checkpoints:
+            self.checkpoints[key] = {}
+            if self.folder_path is not None and os.path.exists(self.file_path(key)):
+                with open(self.file_path(key)) as f:
+                    self.checkpoints[key] = json.load(f)
+
+        return self.checkpoints[key]
+
+    def save(self,key):
+        if self.folder_path is not None:
+            os.makedirs(self.folder_path, exist_ok = True)
+            file_path = self.file_path(key)
+            with open(file_path+'.tmp','w') as f:
+                json.dump(self.checkpoints[key],f)
+            os.replace(file_path+'.tmp',file_path)
+
+    def warmup(self,dates,P,ept,param,Case,ini,area,date,fingerprint = None):
+        """This function returns the state of the model (HBV_state) at the
+        beginning of date, i.e. after simulating the time steps of dates
+        before date, starting from the nearest previous checkpoint and saving
+        new checkpoints along the way.
+
+             dates = dates of the forcing data       - vector (T,1)
+                 P = time series of precipitation    - vector (T,1)
+               ept = time series of potential evapotranspiration - vector (T,1)
+             param = vector of model parameters (see HBV_sim)    - vector (1,9)
+              Case = flag for preferred path in the Upper Zone dynamics - scalar
+               ini = initial storages at dates[0] [SSM0,SUZ0,SLZ0] - vector (1,3)
+              area = catchment area [km2]            - scalar
+              date = date of the state, from dates[0] to the end of the
+                     last time step (dates[-1] plus one time step)
+       fingerprint = optional, fingerprint of the forcing data, e.g.
+                     file_fingerprint of the forcing file. By default it is
+                     computed from dates, P and ept.
+        """
+        dates = pd.DatetimeIndex(dates)
+        date = pd.Timestamp(date)
+        # The state can only be simulated within the period of the forcing data
+        Dt = dates[-1] - dates[-2] if len(dates) > 1 else pd.Timedelta(days = 1) # time step
+        if not dates[0] <= date <= dates[-1] + Dt:
+            raise ValueError('date must be within the period of the forcing data, from '+
+                             str(dates[0])+' to '+str(dates[-1] + Dt))
+        if fingerprint is None:
+            fingerprint = data_fingerprint(dates.asi8,
+                                           np.asarray(P, dtype = np.float64),
+                                           np.asarray(ept, dtype = np.float64))
+        key = self.key(param,Case,ini,fingerprint)
+        checkpoints = self.load(key)
+
+        # Nearest previous checkpoint (or initial conditions)
+        previous = [d for d in checkpoints if pd.Timestamp(d) <= date]
+        if previous:
+            state = HBV_state.from_dict(checkpoints[max(previous, key = pd.Timestamp)])
+        else:
+            state = HBV_state(ini[0],ini[1],ini[2],[],dates[0])
+
+        # Simulation from the checkpoint to date, with new checkpoints at
+        # regular dates
+        dates_checkpoints = pd.date_range(state.date,date,freq = self.freq)
+        dates_checkpoints = [d for d in dates_checkpoints if state.date < d < date] + [date]
+        for d in dates_checkpoints:
+            i0 = dates.searchsorted(state.date) # first time step of the period
+            i1 = dates.searchsorted(d) # first time step after the period
+            if i1 > i0:
+                Q_sim,state = HBV_sim_state(P[i0:i1],ept[i0:i1],param,Case,state,area,d)
+            else:
+                state = HBV_state(state.SM,state.UZ,state.LZ,state.Q_buffer,d)
+            checkpoints[d.isoformat()] = state.to_dict()
+        self.save(key)
+
+        return state
+
+class HBV_stream:
+    """This class simulates the HBV model in chunks of forcing data (for
+    instance, one day at a time as new observations are received). The
+    storages and the routing buffer are carried between calls, so that
+    simulating the forcing data in several chunks gives the same flows as
+    simulating it at once with HBV_sim.
+
+     param = vector of model parameters (see HBV_sim)         - vector (1,9)
+      Case = flag for preferred path in the Upper Zone dynamics - scalar
+       ini = initial storages [SSM0,SUZ0,SLZ0] or HBV_state
+      area = catchment area [km2]                             - scalar
+      date = optional, date of the first time step
+        Dt = time step (pandas offset alias), by default one day ('D')
+
+    Example:
+        model = HBV_stream(param,case,ini,catchment_area,dates_hist[0])
+        Q_day = model.step(Rain_day,e_day) # one chunk
+        for Q_chunk in model.run(zip(Rain_chunks,e_chunks)): # generator
+            ...
+        model.state # current state (HBV_state)
+    """
+    def __init__(self,param,Case,ini,area,date = None,Dt = 'D'):
+        if Case not in (1,2):
+            raise ValueError('Case must equal to 1 or 2 ')
+        self.param = param
+        self.Case = Case
+        self.area = area
+        self.Dt = pd.tseries.frequencies.to_offset(Dt)
+        if isinstance(ini,HBV_state):
+            self.state = ini
+        else:
+            self.state = HBV_state(ini[0],ini[1],ini[2],[],date)
+
+    def step(self,P_chunk,ept_chunk):
+        """This function simulates a chunk of forcing data (one or more time
+        steps) and returns the simulated flow (in ML) - vector (T,1)"""
+        N = np.size(ept_chunk) # number of time samples
+        date_end = None if self.state.date is None else self.state.date + N*self.Dt
+        Q_sim,self.state = HBV_sim_state(P_chunk,ept_chunk,self.param,self.Case,
+                                         self.state,self.area,date_end)
+        return Q_sim
+
+    def run(self,forcing):
+        """This generator simulates the chunks of forcing data provided by an
+        iterable of (P_chunk,ept_chunk) and yields the simulated flow of each
+        chunk"""
+        for P_chunk,ept_chunk in forcing:
+            yield self.step(P_chunk,ept_chunk)
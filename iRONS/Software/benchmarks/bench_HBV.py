@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the HBV rainfall-runoff model (HBV_sim) and its calibration
+(HBV_calibration).
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import random
+
+import numpy as np
+
+## Tools from the iRONs toolbox
+from irons.Software.HBV_sim import HBV_sim, HBV_sim_batch
+from irons.Software.HBV_calibration import HBV_calibration
+from irons.Software.benchmarks import synthetic_data as sd
+
+# Largest simulation (time-steps x members) of the benchmarks
+max_size = 10**7
+
+class HBVSim:
+    """HBV simulation of T days (7 months, 10 and 50 years) for ensembles of M
+    members"""
+    params = ([215, 3652, 18262], [1, 51, 1000, 5000])
+    param_names = ['T', 'M']
+
+    def setup(self, T, M):
+        if T*M > max_size:
+            raise NotImplementedError # not benchmarked
+        self.P, self.ept = sd.forcing(T, M)
+
+    def time_HBV_sim(self, T, M):
+        HBV_sim(self.P, self.ept, sd.HBV_param, 1, sd.HBV_ini, sd.HBV_area,
+                outputs = 'flow')
+
+    def peakmem_HBV_sim(self, T, M):
+        HBV_sim(self.P, self.ept, sd.HBV_param, 1, sd.HBV_ini, sd.HBV_area,
+                outputs = 'flow')
+
+class HBVSimOutputs:
+    """HBV simulation of 50 years with each of the outputs options"""
+    params = ['flow', 'states', 'all']
+    param_names = ['outputs']
+
+    def setup(self, outputs):
+        self.P, self.ept = sd.forcing(18262)
+
+    def time_HBV_sim(self, outputs):
+        HBV_sim(self.P, self.ept, sd.HBV_param, 1, sd.HBV_ini, sd.HBV_area,
+                outputs = outputs)
+
+    def peakmem_HBV_sim(self, outputs):
+        HBV_sim(self.P, self.ept, sd.HBV_param, 1, sd.HBV_ini, sd.HBV_area,
+                outputs = outputs)
+
+class HBVSimBatch:
+    """HBV simulation of 10 years for K parameter sets"""
+    params = [10, 100, 1000]
+    param_names = ['K']
+
+    def setup(self, K):
+        self.P, self.ept = sd.forcing(3652)
+        rng = np.random.RandomState(0)
+        self.params = np.array(sd.HBV_param)*rng.uniform(0.5, 1.5, (K, 9))
+        self.ini = np.array(sd.HBV_ini) + np.zeros((K, 3))
+
+    def time_HBV_sim_batch(self, K):
+        HBV_sim_batch(self.P, self.ept, self.params, self.ini, 1, sd.HBV_area)
+
+    def peakmem_HBV_sim_batch(self, K):
+        HBV_sim_batch(self.P, self.ept, self.params, self.ini, 1, sd.HBV_area)
+
+class HBVCalibration:
+    """Short calibration runs (5 generations) of the HBV model against 10
+    years of synthetic observed flows"""
+    params = ([10, 40, 100, 200], ['all', 'double'])
+    param_names = ['population_size', 'objective']
+    timeout = 300
+
+    def setup(self, population_size, objective):
+        self.P, self.ept, self.Q_obs = sd.observed_flows(3652)
+        # Platypus uses the random module
+        random.seed(0)
+        np.random.seed(0)
+
+    def time_HBV_calibration(self, population_size, objective):
+        HBV_calibration(self.P, self.ept, 1, sd.HBV_area, self.Q_obs,
+                        objective, 5*population_size, population_size)
+
+    def peakmem_HBV_calibration(self, population_size, objective):
+        HBV_calibration(self.P, self.ept, 1, sd.HBV_area, self.Q_obs,
+                        objective, 5*population_size, population_size)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the data processing functions: day2week, cum2inst and the
+linear scaling bias correction (linear_scaling) of forecast NetCDF files.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+## Tools from the iRONs toolbox
+from irons.Software.day2week2month import day2week
+from irons.Software.cum2inst import cum2inst
+from irons.Software.bias_correction import linear_scaling
+from irons.Software.benchmarks import synthetic_data as sd
+
+class Day2Week:
+    """Weekly aggregation of T days (1, 10 and 50 years) for ensembles of M
+    members"""
+    params = ([364, 3652, 18262], [1, 51])
+    param_names = ['T', 'M']
+    timeout = 300
+
+    def setup(self, T, M):
+        self.dates = sd.daily_dates(T)
+        self.P = sd.forcing(T, M)[0]
+
+    def time_day2week(self, T, M):
+        day2week(self.dates, self.P)
+
+    def peakmem_day2week(self, T, M):
+        day2week(self.dates, self.P)
+
+class Cum2Inst:
+    """Cumulative to instantaneous transformation of T days (7 months, 10 and
+    50 years) for ensembles of M members"""
+    params = ([215, 3652, 18262], [1, 51, 5000])
+    param_names = ['T', 'M']
+
+    def setup(self, T, M):
+        if T*M > 10**7:
+            raise NotImplementedError # not benchmarked
+        P = sd.forcing(T, M)[0]
+        self.cum_P = np.cumsum(P.reshape(T, M), axis = 0)
+
+    def time_cum2inst(self, T, M):
+        cum2inst(self.cum_P)
+
+    def peakmem_cum2inst(self, T, M):
+        cum2inst(self.cum_P)
+
+class LinearScaling:
+    """Bias correction of a forecast of n_months months using a climatology
+    of n_years years of forecast files"""
+    params = ([5, 20], [1, 7], ['Rain', 'e', 'Temp'])
+    param_names = ['n_years', 'n_months', 'weather_variable']
+    timeout = 300
+
+    file_name_end = '_1d_7m_synthetic_Temp_Evap_Rain.nc'
+
+    def setup(self, n_years, n_months, weather_variable):
+        fore_year = 2000
+        clim_years = np.arange(fore_year - n_years, fore_year)
+        self.folder_path = tempfile.mkdtemp()
+        sd.forecast_netcdf_files(self.folder_path, self.file_name_end,
+                                 clim_years)
+        # The climatology starts the year after the first observation year
+        self.dates_obs, data_obs = sd.observed_weather(
+            np.arange(clim_years[0] - 1, fore_year + 1))
+        self.data_obs = data_obs[weather_variable]
+        self.dates_fore = pd.date_range(
+            start = str(fore_year)+'-01-01',
+            end = pd.Timestamp(str(fore_year)+'-01-01') +
+                  pd.DateOffset(months = n_months, days = -1), freq = 'D')
+        self.data_fore = np.ones(self.dates_fore.size)
+
+    def teardown(self, n_years, n_months, weather_variable):
+        shutil.rmtree(self.folder_path, ignore_errors = True)
+
+    def time_linear_scaling(self, n_years, n_months, weather_variable):
+        linear_scaling(self.folder_path, self.file_name_end,
+                       self.dates_fore, self.data_fore,
+                       self.dates_obs, self.data_obs, weather_variable)
+
+    def peakmem_linear_scaling(self, n_years, n_months, weather_variable):
+        linear_scaling(self.folder_path, self.file_name_end,
+                       self.dates_fore, self.data_fore,
+                       self.dates_obs, self.data_obs, weather_variable)
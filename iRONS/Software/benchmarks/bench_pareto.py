@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the Pareto-efficient solutions search (compute_efficient_sol)
+used to analyse the optimisation results in the Notebooks.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import os
+import sys
+
+# compute_efficient_sol is a module of the Knowledge transfer Notebooks
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'Notebooks', 'A - Knowledge transfer',
+                             'Modules'))
+from Pareto_front import compute_efficient_sol
+
+## Tools from the iRONs toolbox
+from irons.Software.benchmarks import synthetic_data as sd
+
+class ComputeEfficientSol:
+    """Pareto-efficient solutions among n candidate solutions with q
+    objectives"""
+    params = ([100, 500, 2000], [2, 3])
+    param_names = ['n', 'q']
+
+    def setup(self, n, q):
+        self.Y = sd.objective_values(n, q)
+        self.e = [0]*q
+
+    def time_compute_efficient_sol(self, n, q):
+        compute_efficient_sol(self.Y, self.e)
+
+    def peakmem_compute_efficient_sol(self, n, q):
+        compute_efficient_sol(self.Y, self.e)
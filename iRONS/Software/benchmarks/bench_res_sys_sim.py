@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the reservoir system simulation model (res_sys_sim) under each
+type of regulated flows (Qreg), and of the batch simulation of candidate
+release schedulings (res_sys_sim_batch) and of their objectives
+(res_sys_obj_batch).
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import numpy as np
+
+## Tools from the iRONs toolbox
+from irons.Software.res_sys_sim import res_sys_sim, res_sys_sim_batch, res_sys_obj_batch
+from irons.Software.benchmarks import synthetic_data as sd
+
+# Largest simulation (time-steps x members) of the benchmarks
+max_size = 3*10**6
+
+class ResSysSim:
+    """Reservoir simulation of T weeks (1, 10 and 50 years) for ensembles of
+    M members"""
+    params = (sd.Qreg_types, [52, 522, 2609], [1, 100, 5000])
+    param_names = ['Qreg', 'T', 'M']
+
+    def setup(self, Qreg_type, T, M):
+        if T*M > max_size:
+            raise NotImplementedError # not benchmarked
+        self.I, self.e, self.d = sd.reservoir_inputs(T, M)
+        self.Qreg = sd.Qreg_input(Qreg_type, T, M)
+
+    def time_res_sys_sim(self, Qreg_type, T, M):
+        res_sys_sim(self.I, self.e, sd.s_ini, sd.s_min, sd.s_max, sd.env_min,
+                    self.d, self.Qreg)
+
+    def peakmem_res_sys_sim(self, Qreg_type, T, M):
+        res_sys_sim(self.I, self.e, sd.s_ini, sd.s_min, sd.s_max, sd.env_min,
+                    self.d, self.Qreg)
+
+class ReservoirBatch:
+    """Reservoir simulation of 10 years for an ensemble of 10 members and P
+    candidate release schedulings (e.g. a generation of the optimisation),
+    one by one (loop), at once (batch) or only their objectives (objectives)"""
+    params = ([10, 40, 200], ['loop', 'batch', 'objectives'])
+    param_names = ['P', 'method']
+
+    def setup(self, P, method):
+        T = 522
+        self.I, self.e, self.d = sd.reservoir_inputs(T, 10)
+        rng = np.random.RandomState(0)
+        self.schedules = sd.demand*rng.uniform(0.5, 1.5, (P, T))
+
+    def simulate(self, method):
+        Qreg = {'releases' : {'type'  : 'scheduling',
+                              'input' : self.schedules},
+                'inflows'  : [],
+                'rel_inf'  : []}
+        if method == 'batch':
+            res_sys_sim_batch(self.I, self.e, sd.s_ini, sd.s_min, sd.s_max,
+                              sd.env_min, self.d, Qreg)
+        elif method == 'objectives':
+            res_sys_obj_batch(self.I, self.e, sd.s_ini, sd.s_min, sd.s_max,
+                              sd.env_min, self.d, Qreg, ['MSD', 'MRD'])
+        else:
+            for schedule in self.schedules:
+                Qreg = {'releases' : {'type'  : 'scheduling',
+                                      'input' : schedule[:, np.newaxis]},
+                        'inflows'  : [],
+                        'rel_inf'  : []}
+                res_sys_sim(self.I, self.e, sd.s_ini, sd.s_min, sd.s_max,
+                            sd.env_min, self.d, Qreg)
+
+    def time_res_sys_sim_batch(self, P, method):
+        self.simulate(method)
+
+    def peakmem_res_sys_sim_batch(self, P, method):
+        self.simulate(method)
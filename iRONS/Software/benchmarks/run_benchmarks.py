@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Offline runner of the iRONS benchmarks. It follows the conventions of airspeed
+velocity (asv, https://asv.readthedocs.io), so the same benchmark modules can
+be run with asv (see asv.conf.json) or with this runner, which does not need
+to build environments or access the git history:
+
+    python -m irons.Software.benchmarks.run_benchmarks [-b REGEX] [--quick]
+           [--repeat N] [--output FILE.json] [--compare FILE.json]
+
+Each benchmark module (bench_*.py) contains classes with the parameters of
+the cases (params, param_names), optional setup and teardown methods (a setup
+raising NotImplementedError skips the case) and the benchmarks:
+    time_*    = the runner reports the minimum time (s) of N repetitions
+    peakmem_* = the runner reports the peak memory (bytes) allocated during
+                the call by Python, numpy and Numba (traced with tracemalloc,
+                while asv reports the peak resident memory of the process)
+Each case is run once before the measurements, so that the compilation time
+of the Numba functions is not included.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import argparse
+import importlib
+import itertools
+import json
+import os
+import pkgutil
+import platform
+import re
+import time
+import timeit
+import tracemalloc
+
+import irons.Software.benchmarks as benchmarks
+
+def find_benchmarks(pattern = None):
+    """This function finds the benchmarks of the bench_* modules whose name
+    (module.class.method) matches the regular expression pattern, and returns
+    a list of (name,class,method_name)"""
+    found = []
+    for module_info in pkgutil.iter_modules(benchmarks.__path__):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module(benchmarks.__name__+'.'+module_info.name)
+        for class_name, cls in sorted(vars(module).items()):
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for method_name in sorted(vars(cls)):
+                if not method_name.startswith(('time_', 'peakmem_')):
+                    continue
+                name = '.'.join([module_info.name, class_name, method_name])
+                if pattern is None or re.search(pattern, name):
+                    found.append((name, cls, method_name))
+    return found
+
+def param_cases(cls):
+    """This function returns the list of cases (tuples of parameters) of a
+    benchmark class"""
+    params = getattr(cls, 'params', [])
+    if len(params) == 0:
+        return [()]
+    if len(getattr(cls, 'param_names', [])) <= 1:
+        params = [params]
+    return list(itertools.product(*params))
+
+def time_call(func, repeat):
+    """Minimum time (s) of repeat calls of func"""
+    return min(timeit.repeat(func, repeat = repeat, number = 1))
+
+def peakmem_call(func):
+    """Peak memory (bytes) allocated during the call of func"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_benchmarks(pattern = None, repeat = 5, quick = False, verbose = True):
+    """This function runs the benchmarks whose name matches pattern and
+    returns a dictionary {name: {case: value}} with the times (s) and peak
+    memory (bytes) of each case. If quick is True, only the first case of
+    each benchmark is run, once."""
+    results = {}
+    for name, cls, method_name in find_benchmarks(pattern):
+        results[name] = {}
+        cases = param_cases(cls)
+        if quick:
+            cases, repeat = cases[:1], 1
+        for case in cases:
+            label = ', '.join(str(p) for p in case)
+            instance = cls()
+            try:
+                if hasattr(instance, 'setup'):
+                    instance.setup(*case)
+            except NotImplementedError:
+                continue
+            try:
+                func = lambda: getattr(instance, method_name)(*case)
+                func() # warm-up (compilation)
+                if method_name.startswith('time_'):
+                    value = time_call(func, repeat)
+                else:
+                    value = peakmem_call(func)
+            finally:
+                if hasattr(instance, 'teardown'):
+                    instance.teardown(*case)
+            results[name][label] = value
+            if verbose:
+                print('%-60s %-40s %s' % (name, label,
+                                          format_value(method_name, value)))
+    return results
+
+def format_value(name, value):
+    """Time in ms or memory in MB"""
+    if name.rsplit('.', 1)[-1].startswith('time_'):
+        return '%10.3f ms' % (value*1e3)
+    return '%10.1f MB' % (value/2**20)
+
+def compare_results(results_ref, results, threshold = 0.1):
+    """This function prints the ratio between the results and the reference
+    results (e.g. before an optimisation) of the cases in both of them, and
+    flags the ratios that differ from 1 more than the threshold"""
+    for name in sorted(results):
+        for label, value in results[name].items():
+            value_ref = results_ref.get(name, {}).get(label)
+            if value_ref is None:
+                continue
+            ratio = value/value_ref if value_ref > 0 else float('nan')
+            flag = ''
+            if ratio < 1 - threshold:
+                flag = 'better'
+            elif ratio > 1 + threshold:
+                flag = 'worse'
+            print('%-60s %-40s %s -> %s %6.2fx %s' % (
+                name, label, format_value(name, value_ref),
+                format_value(name, value), ratio, flag))
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Run the iRONS benchmarks')
+    parser.add_argument('-b', '--bench', default = None,
+                        help = 'regular expression of the benchmarks to run')
+    parser.add_argument('--repeat', type = int, default = 5,
+                        help = 'number of repetitions of the time benchmarks')
+    parser.add_argument('--quick', action = 'store_true',
+                        help = 'run only the first case of each benchmark once')
+    parser.add_argument('--output', default = None,
+                        help = 'JSON file to save the results')
+    parser.add_argument('--compare', default = None,
+                        help = 'JSON file with reference results to compare with')
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(args.bench, args.repeat, args.quick)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'machine'  : platform.node(),
+                       'python'   : platform.python_version(),
+                       'cpu_count': os.cpu_count(),
+                       'date'     : time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'results'  : results}, f, indent = 1)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare_results(json.load(f)['results'], results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic data generators for the iRONS benchmarks. They produce forcing data,
+observed flows, reservoir inputs, operating policies, forecast NetCDF files
+and objective values of any size, so that the benchmarks can run offline and
+scale the number of time-steps (T), ensemble members (M) and candidate
+solutions independently of the data available in the Notebooks folder.
+
+All the generators are deterministic for a given seed.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from netCDF4 import Dataset
+
+## Tools from the iRONs toolbox
+from irons.Software.HBV_sim import HBV_sim
+from irons.Software.operating_policy import op_piecewiselin_1res
+
+# HBV parameters [BETA, LP, FC, PERC, K0, K1, K2, UZL, MAXBAS] and initial
+# storages [SSM0, SUZ0, SLZ0] used to generate the synthetic observed flows
+HBV_param = [2.0, 0.7, 300.0, 2.0, 0.3, 0.1, 0.02, 20.0, 3]
+HBV_ini = [100.0, 10.0, 20.0]
+HBV_area = 86.0 # km2
+
+# Reservoir characteristics
+s_ini = 600.0 # ML
+s_min = 10.0 # ML
+s_max = 1000.0 # ML
+env_min = 10.0 # ML/week
+demand = 70.0 # ML/week
+
+# Qreg types benchmarked in res_sys_sim
+Qreg_types = ['demand', 'scheduling', 'operating policy',
+              'variable operating policy', 'rel_inf operating policy']
+
+def daily_dates(T, start = '1970-01-01'):
+    """Dates of T consecutive days"""
+    return pd.date_range(start = start, periods = T, freq = 'D')
+
+def forcing(T, M = 1, seed = 0):
+    """Daily precipitation (P) and potential evapotranspiration (ept), in mm,
+    with an annual cycle. If M > 1 the outputs are (T,M) ensembles."""
+    rng = np.random.RandomState(seed)
+    shape = (T,) if M == 1 else (T,M)
+    doy = np.arange(T) % 365
+    if M > 1:
+        doy = doy[:,np.newaxis]
+    season = np.cos(2*np.pi*doy/365)
+    wet = rng.random_sample(shape) < 0.45 + 0.15*season
+    P = wet*rng.gamma(0.8, 6.0 + 2.0*season, shape)
+    ept = np.maximum(1.8 - 1.5*season + 0.3*rng.standard_normal(shape), 0)
+    return P, ept
+
+def observed_flows(T, seed = 0):
+    """Forcing data and 'observed' flows (in ML) generated with the HBV model
+    (HBV_param) and a 10% multiplicative noise"""
+    P, ept = forcing(T, seed = seed)
+    Q = HBV_sim(P, ept, HBV_param, 1, HBV_ini, HBV_area, outputs = 'flow')
+    rng = np.random.RandomState(seed)
+    Q_obs = Q*(1 + 0.1*rng.standard_normal(T))
+    return P, ept, np.maximum(Q_obs, 0)
+
+def reservoir_inputs(T, M = 1, seed = 0):
+    """Weekly reservoir inflows (I), evaporation (e) and demand (d) in ML, as
+    (T,M) arrays"""
+    rng = np.random.RandomState(seed)
+    woy = (np.arange(T) % 52)[:,np.newaxis]
+    season = np.cos(2*np.pi*woy/52)
+    I = np.maximum(60 + 40*season + 25*rng.standard_normal((T,M)), 0)
+    e = np.maximum(3 - 2*season + 0.5*rng.standard_normal((T,M)), 0)
+    d = demand*(1 - 0.2*season) + np.zeros((T,M))
+    return I, e, d
+
+def Qreg_input(Qreg_type, T, M = 1):
+    """Regulated flows dictionary (see res_sys_sim) for each of the Qreg
+    types"""
+    Qreg = {'releases' : [],
+            'inflows'  : [],
+            'rel_inf'  : []}
+    policy = op_piecewiselin_1res([[0, 40], [0.4, 60], [1, 90]])
+    # Weekly policies: the releases are scaled along the year
+    policy_week = policy*(1 + 0.2*np.cos(2*np.pi*np.arange(52)/52))
+    index = np.arange(T) % 52
+    if Qreg_type == 'demand':
+        pass
+    elif Qreg_type == 'scheduling':
+        Qreg['releases'] = {'type'  : 'scheduling',
+                            'input' : demand + np.zeros((T,M))}
+    elif Qreg_type == 'operating policy':
+        Qreg['releases'] = {'type'  : 'operating policy',
+                            'input' : policy}
+    elif Qreg_type == 'variable operating policy':
+        Qreg['releases'] = {'type'  : 'variable operating policy',
+                            'input' : policy_week,
+                            'index' : index}
+    elif Qreg_type == 'rel_inf operating policy':
+        Qreg['rel_inf'] = {'type'  : 'operating policy',
+                           'input' : policy}
+    else:
+        raise ValueError('unknown Qreg type: '+str(Qreg_type))
+    return Qreg
+
+def forecast_netcdf_files(folder_path, file_name_end, years, month = 1,
+                          n_days = 215, n_members = 25, seed = 0):
+    """Writes one forecast file per year with the structure of the ECMWF
+    seasonal forecasts (see download_forecast): daily cumulative rainfall
+    ('tp') and evaporation ('e') in m and temperature ('t2m') in K, with
+    dimensions (time, number, latitude, longitude). The file names are
+    YYYYMM01 + file_name_end."""
+    rng = np.random.RandomState(seed)
+    for year in years:
+        date_ini = pd.Timestamp(year = year, month = month, day = 1)
+        file_name = date_ini.strftime('%Y%m%d') + file_name_end
+        shape = (n_days, n_members, 2, 3)
+        # read_netcdf_data substracts 24h to the time of the files
+        hours = ((date_ini - pd.Timestamp('1900-01-01')).days +
+                 np.arange(1, n_days+1))*24
+        data = Dataset(os.path.join(folder_path, file_name), 'w',
+                       format = 'NETCDF3_64BIT_OFFSET')
+        data.createDimension('longitude', 3)
+        data.createDimension('latitude', 2)
+        data.createDimension('number', n_members)
+        data.createDimension('time', None)
+        data.createVariable('longitude', 'f4', ('longitude',))[:] = [-2.5, -2, -1.5]
+        data.createVariable('latitude', 'f4', ('latitude',))[:] = [51, 50.5]
+        data.createVariable('number', 'i4', ('number',))[:] = np.arange(n_members)
+        time = data.createVariable('time', 'i4', ('time',))
+        time.units = 'hours since 1900-01-01 00:00:0.0'
+        time.calendar = 'gregorian'
+        time[:] = hours
+        dims = ('time', 'number', 'latitude', 'longitude')
+        data.createVariable('tp', 'f4', dims)[:] = np.cumsum(
+            rng.gamma(0.8, 3e-3, shape), axis = 0)
+        data.createVariable('e', 'f4', dims)[:] = -np.cumsum(
+            rng.uniform(0, 3e-3, shape), axis = 0)
+        data.createVariable('t2m', 'f4', dims)[:] = 283 + 5*rng.standard_normal(shape)
+        data.close()
+
+def observed_weather(years, seed = 0):
+    """Daily observed rainfall, evaporation (in mm) and temperature (in degC)
+    for the years provided"""
+    dates = pd.date_range(start = str(years[0])+'-01-01',
+                          end = str(years[-1])+'-12-31', freq = 'D')
+    rng = np.random.RandomState(seed)
+    data = {'Rain' : rng.gamma(0.8, 3.0, dates.size),
+            'e'    : rng.uniform(0, 3, dates.size),
+            'Temp' : 10 + 5*rng.standard_normal(dates.size)}
+    return dates, data
+
+def objective_values(n, q, seed = 0):
+    """Objective values (n,q) of n candidate solutions of a problem with q
+    objectives, with a trade-off between them"""
+    rng = np.random.RandomState(seed)
+    Y = rng.random_sample((n, q))
+    Y[:,-1] = 1 - Y[:,:-1].mean(axis = 1) + 0.3*rng.random_sample(n)
+    return Y
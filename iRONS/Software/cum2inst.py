@@ -19,15 +19,24 @@ compiler. doi:10.1145/2833157.2833162
 import numpy as np
 import numba
 
-@numba.njit # to speed-up the function
-def cum2inst(cum_data):
+def cum2inst(cum_data, dtype = np.float64):
+    """
+    This modules transforms the cumulative data contained in the cum_data 
+    array (time-steps x ensemble members) into instantaneous. The optional 
+    input dtype defines the floating point type of the output, np.float64 
+    (default) or np.float32 (single precision, which halves memory use).
+    """
+    return cum2inst_kernel(np.asarray(cum_data, dtype = dtype))
+
+@numba.njit(cache = True) # to speed-up the function
+def cum2inst_kernel(cum_data):
     """
     This modules uses two for loops to transform element by element of the 
     cumulative data contained in the cum_data array into instantaneous. For 
     every time-step and every ensemble member
     """
     num_rows,num_cols = np.shape(cum_data) # number of rows and colums
-    inst_data = np.zeros((num_rows,num_cols)) # declaration of variable
+    inst_data = np.zeros((num_rows,num_cols),cum_data.dtype) # declaration of variable
     
     for j in np.arange(num_cols):
         for i in np.arange(num_rows-1):
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the performance metrics of simulated flows with respect
+to observed flows used to calibrate rainfall-runoff models (see
+HBV_calibration). Everything that only depends on the observed flows (low and
+high flow masks, mean, variance, logarithms, sorted flows of the flow
+duration curve) is computed once, when the metrics are defined, and all the
+metrics of a simulation, or of each column of a batch of simulations, are
+computed in a single pass over the simulated flows.
+
+Metrics:
+    'rmse'      = root mean squared error (RMSE) [ML]
+    'rmse_low'  = RMSE of the low flows (observed flows below the median)
+    'rmse_high' = RMSE of the high flows (observed flows above the median)
+    'nse'       = Nash-Sutcliffe efficiency [-] (1 = perfect fit)
+    'kge'       = Kling-Gupta efficiency (Gupta et al., 2009) [-] (1 = perfect fit)
+    'log_rmse'  = RMSE of the logarithm of the flows (log(Q + eps))
+    'bias'      = percent bias of the total volume [%]
+    'fdc_high', 'fdc_mid', 'fdc_low' = RMSE of the flow duration curve (sorted
+                  flows) in the high, mid and low flow segments [ML]
+
+Example:
+    metrics = flow_metrics(Q_obs,['nse','kge','bias'])
+    nse, kge, bias = metrics(Q_sim) # Q_sim - vector (T,)
+    values = metrics(Q_sims) # Q_sims - matrix (T,K), values - matrix (K,3)
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import numpy as np
+from numba import njit, prange
+
+## Tools from the iRONs toolbox
+from irons.Software.jit_cache import serial_kernel
+
+# Metrics computed by the kernel (column of the results)
+metric_names = ['rmse','rmse_low','rmse_high','nse','kge','log_rmse','bias',
+                'fdc_high','fdc_mid','fdc_low']
+n_metrics = len(metric_names)
+# Metrics to maximise (their loss is 1 - metric)
+maximise = ('nse','kge')
+
+class flow_metrics:
+    """This class defines the performance metrics (see metric_names) of
+    simulated flows with respect to the observed flows Q_obs - vector (T,).
+
+     metrics      = name or list of names of the metrics (by default 'rmse')
+     eps          = optional, constant added to the flows before computing
+                    their logarithm (by default 1% of the mean observed flow)
+     fdc_segments = exceedance probability bounds of the high, mid and low
+                    flow segments of the flow duration curve (by default
+                    those of Yilmaz et al., 2008)
+
+    Calling the object with simulated flows Q_sim returns the values of the
+    metrics: a vector (n_metrics,) if Q_sim is a vector (T,) or a matrix
+    (K,n_metrics) if Q_sim is a matrix (T,K) of K simulations.
+    """
+    def __init__(self,Q_obs,metrics = 'rmse',eps = None,
+                 fdc_segments = ((0,0.02),(0.2,0.7),(0.7,1))):
+        if isinstance(metrics,str):
+            metrics = [metrics]
+        for metric in metrics:
+            if metric not in metric_names:
+                raise ValueError('metric must be one of '+', '.join(metric_names))
+        self.metrics = list(metrics)
+        self.columns = np.array([metric_names.index(metric) for metric in metrics])
+        self.Q_obs = np.ascontiguousarray(Q_obs, dtype = np.float64)
+        T = len(self.Q_obs)
+        # Low (-1) and high (1) flows with respect to the median
+        median = np.percentile(self.Q_obs,50)
+        self.flow_class = (np.sign(self.Q_obs - median)).astype(np.int8)
+        self.n_low = np.sum(self.flow_class == -1)
+        self.n_high = np.sum(self.flow_class == 1)
+        # Moments of the observed flows
+        self.mean_obs = self.Q_obs.mean()
+        self.var_obs = ((self.Q_obs - self.mean_obs)**2).mean()
+        # Logarithm of the observed flows
+        self.eps = 0.01*self.mean_obs if eps is None else eps
+        self.log_obs = np.log(self.Q_obs + self.eps)
+        # Flow duration curve (flows sorted in descending order) and index
+        # ranges of its segments
+        self.fdc_obs = np.sort(self.Q_obs)[::-1].copy()
+        self.fdc_segments = np.array([[int(np.floor(p0*T)),int(np.ceil(p1*T))]
+                                      for p0,p1 in fdc_segments], dtype = np.int64)
+        self.log = 'log_rmse' in self.metrics
+        self.fdc = any(metric.startswith('fdc') for metric in self.metrics)
+
+    def __call__(self,Q_sim):
+        Q_sim = np.asarray(Q_sim, dtype = np.float64)
+        if Q_sim.ndim == 1:
+            return self.values(Q_sim[:,np.newaxis])[0]
+        return self.values(Q_sim)
+
+    def values(self,Q_sim):
+        """Values of the metrics - matrix (K,n_metrics) - of the columns of
+        Q_sim - matrix (T,K)"""
+        if Q_sim.shape[0] != len(self.Q_obs):
+            raise ValueError('Q_sim and Q_obs must have the same number of time steps')
+        # Each simulation is read as a contiguous time series
+        Q_sim = np.asfortranarray(Q_sim)
+        kernel = metrics_kernel if Q_sim.shape[1] > 1 else metrics_kernel_serial
+        values = kernel(Q_sim,self.Q_obs,self.flow_class,self.n_low,self.n_high,
+                        self.mean_obs,self.var_obs,self.log_obs,self.eps,
+                        self.fdc_obs,self.fdc_segments,self.log,self.fdc)
+        return values[:,self.columns]
+
+    def loss(self,Q_sim):
+        """Values of the metrics to minimise (e.g. by NSGAII): 1 - metric
+        for the efficiencies (NSE, KGE), the absolute value of the bias and
+        the metric itself for the errors"""
+        values = self(Q_sim)
+        for i,metric in enumerate(self.metrics):
+            if metric in maximise:
+                values[...,i] = 1 - values[...,i]
+            elif metric == 'bias':
+                values[...,i] = np.abs(values[...,i])
+        return values
+
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
+def metrics_kernel(Q_sim,Q_obs,flow_class,n_low,n_high,mean_obs,var_obs,
+                   log_obs,eps,fdc_obs,fdc_segments,log,fdc):
+    T,K = Q_sim.shape
+    values = np.empty((K,n_metrics))
+    for k in prange(K):
+        se = 0.0 # squared errors
+        se_low = 0.0
+        se_high = 0.0
+        se_log = 0.0
+        d_sum = 0.0 # simulated flows minus the observed mean (less round-off)
+        d_sum2 = 0.0
+        cov = 0.0
+        for t in range(T):
+            q = Q_sim[t,k]
+            e2 = (q - Q_obs[t])**2
+            se += e2
+            if flow_class[t] < 0:
+                se_low += e2
+            elif flow_class[t] > 0:
+                se_high += e2
+            d = q - mean_obs
+            d_sum += d
+            d_sum2 += d*d
+            cov += d*(Q_obs[t] - mean_obs)
+            if log:
+                se_log += (np.log(q + eps) - log_obs[t])**2
+        mean_sim = mean_obs + d_sum/T
+        var_sim = max(d_sum2/T - (d_sum/T)**2,0.0)
+        cov = cov/T
+        # The metrics whose denominator is zero (e.g. no low flows or constant
+        # observed flows) are not defined (nan)
+        values[k,0] = np.sqrt(se/T)
+        values[k,1] = np.sqrt(se_low/n_low) if n_low > 0 else np.nan
+        values[k,2] = np.sqrt(se_high/n_high) if n_high > 0 else np.nan
+        if var_obs > 0:
+            values[k,3] = 1 - se/(T*var_obs)
+        else:
+            values[k,3] = np.nan
+        if var_obs > 0 and mean_obs != 0:
+            r = cov/np.sqrt(var_sim*var_obs) if var_sim > 0 else 0.0
+            alpha = np.sqrt(var_sim/var_obs)
+            beta = mean_sim/mean_obs
+            values[k,4] = 1 - np.sqrt((r - 1)**2 + (alpha - 1)**2 + (beta - 1)**2)
+        else:
+            values[k,4] = np.nan
+        values[k,5] = np.sqrt(se_log/T) if log else np.nan
+        values[k,6] = 100*d_sum/(T*mean_obs) if mean_obs != 0 else np.nan
+        if fdc:
+            fdc_sim = np.sort(Q_sim[:,k]) # ascending order
+            for s in range(3):
+                i0,i1 = fdc_segments[s,0],fdc_segments[s,1]
+                se_fdc = 0.0
+                for i in range(i0,i1):
+                    se_fdc += (fdc_sim[T-1-i] - fdc_obs[i])**2
+                values[k,7+s] = np.sqrt(se_fdc/max(i1-i0,1))
+        else:
+            values[k,7:] = np.nan
+    return values
+
+# Single simulation: same computations without the overhead of the threads
+metrics_kernel_serial = serial_kernel(metrics_kernel)
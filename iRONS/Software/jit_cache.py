@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the tools to cache on disk the compiled versions of the
+Numba kernels of the iRONS toolbox (cache = True), so that the compilation
+(several seconds per kernel) is only paid once, and not in every notebook
+kernel start, worker process or batch job. The cache files are written in
+the __pycache__ folders of the toolbox, or in the folder defined by the
+NUMBA_CACHE_DIR environment variable. The kernels can be compiled in
+advance for their common signatures with the precompile module.
+
+Numba identifies the cached versions of a kernel by its name and bytecode,
+but not by its compilation options (e.g. parallel), so the serial version
+of a parallel kernel must be a function with a different name (see
+serial_kernel).
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import types
+
+from numba import njit
+
+def serial_kernel(kernel):
+    """This function returns the same function as the Numba kernel compiled
+    without parallelism (prange runs as range), e.g. for a single ensemble
+    member or when several simulations already run in parallel. It is cached
+    on disk under the name of the kernel followed by '_serial'."""
+    py_func = kernel.py_func
+    func = types.FunctionType(py_func.__code__, py_func.__globals__,
+                              py_func.__name__ + '_serial',
+                              py_func.__defaults__, py_func.__closure__)
+    func.__qualname__ = py_func.__qualname__ + '_serial'
+    func.__doc__ = py_func.__doc__
+    return njit(nogil = True, cache = True)(func)
@@ -9,8 +9,17 @@ Licence: MIT
 """
 import numpy as np
 
+def storage_fractions(s_step = 0.01):
+    """ This function returns the storage fraction values from 0 (dead storage)
+    to 1 (full storage) with the step s_step, which must divide 1 (e.g. 0.01, 
+    0.02, 0.05), so that the values are a uniform grid. """
+    n = int(round(1/s_step)) # number of steps
+    if n < 1 or not np.isclose(n*s_step, 1):
+        raise ValueError('s_step must divide 1, e.g. 0.01, 0.02 or 0.05')
+    return np.linspace(0,1,n+1)
+
 ### Piece-wise linear ###
-def op_piecewiselin_1res(param,*args):
+def op_piecewiselin_1res(param,*args,s_step = 0.01):
     """ This function creates a reservoir operating curve that determines the
     reservoir releases (u) as a function of the storage fraction (s).
     s_frac is the reservoir storage scaled by the reservoir active capacity, so 
@@ -19,7 +28,7 @@ def op_piecewiselin_1res(param,*args):
     linear function of the storage defined a points, which are the parameters 
     of the function. 
     
-    Inputs = (param,*args)
+    Inputs = (param,*args,s_step)
     Outputs = u
     
     param = list coordinates of the points that define the operating policy [s,u]
@@ -32,6 +41,10 @@ def op_piecewiselin_1res(param,*args):
         the realease that corresponds to the storage value provided. Otherwise,
         the function outputs all the releases values that correspond, according
         to the operating policy, to the storage values from 0 to 1.
+    s_step = optional argument that defines the step of the storage fraction
+        values from 0 to 1 (0.01 by default, i.e. 101 values). The simulation 
+        of the reservoir system (res_sys_sim) reads the step from the number of
+        values of the operating policy.
         
     u = reservoir releases determined by the operating policy and that 
         correspond to the storage fraction values from 0 (dead storage) to 1
@@ -65,8 +78,7 @@ def op_piecewiselin_1res(param,*args):
         s = args
         policy_rel = np.interp(s, si, ui)
     else:
-        s_step = 0.01
-        s_frac = np.arange(0,1+s_step,s_step)
+        s_frac = storage_fractions(s_step)
         u = np.zeros([len(s_frac),1]) + np.nan 
         for i in np.arange(len(s_frac)):
             u[i,0] = np.interp(s_frac[i], si, ui) 
@@ -74,7 +86,7 @@ def op_piecewiselin_1res(param,*args):
     return u
 
 ### Logarithmic-Exponential by Proussevitch et al (2016) ###
-def op_logexp_1res_v1(param,*args):
+def op_logexp_1res_v1(param,*args,s_step = 0.01):
     """ This function creates a reservoir operating curve that determines the
     reservoir releases (u) as a function of the storage fraction (s_frac).
     s_frac is the reservoir storage scaled by the reservoir active capacity, so 
@@ -92,7 +104,7 @@ def op_logexp_1res_v1(param,*args):
             
             u = exp(b*(s_frac - s_frac_ref)**2) * u_ref
         
-    Inputs = (param,*args)
+    Inputs = (param,*args,s_step)
     Outputs = u
     
     param = list of the parameters that define the operating policy 
@@ -118,6 +130,10 @@ def op_logexp_1res_v1(param,*args):
         the realease that corresponds to the storage value provided. Otherwise,
         the function outputs all the releases values that correspond, according
         to the operating policy, to the storage values from 0 to 1.
+    s_step = optional argument that defines the step of the storage fraction
+        values from 0 to 1 (0.01 by default, i.e. 101 values). The simulation 
+        of the reservoir system (res_sys_sim) reads the step from the number of
+        values of the operating policy.
         
     u = reservoir releases determined by the operating policy and that 
         correspond to the storage fraction values from 0 (dead storage) to 1
@@ -155,8 +171,7 @@ def op_logexp_1res_v1(param,*args):
             # Exponential segment (s_frac < s_frac_ref)
             u = np.exp(b*(s_frac - s_frac_ref)**2) * u_ref
     else:
-        s_step = 0.01
-        s_frac = np.arange(0,1+s_step,s_step)
+        s_frac = storage_fractions(s_step)
         u = np.zeros([len(s_frac),1]) + np.nan 
         # Logarihmic segment (s_frac < s_frac_ref)
         k = 1 / (s_frac_ref**(α)) * (np.exp(1 - u_frac_min) - 1) 
@@ -167,7 +182,7 @@ def op_logexp_1res_v1(param,*args):
     return u
 
 ### Logarithmic-Exponential by Rouge et al (2021) ###
-def op_logexp_1res_v2(param,*args):
+def op_logexp_1res_v2(param,*args,s_step = 0.01):
     """ This function creates a reservoir operating curve that determines the
     reservoir releases (u) as a function of the storage fraction (s_frac).
     s_frac is the reservoir storage scaled by the reservoir active capacity, so 
@@ -185,7 +200,7 @@ def op_logexp_1res_v2(param,*args):
             u = (u_frac_ref + ((s_frac-s_frac_ref+Δs)**p_sto - Δs**p_sto)/
                 ((1-s_frac_ref+Δs)**p_sto - Δs**p_sto) * (u_frac_max-u_frac_ref)) * u_ref
         
-    Inputs = (param,*args)
+    Inputs = (param,*args,s_step)
     Outputs = u
     
     param = list of the parameters that define the operating policy 
@@ -227,6 +242,10 @@ def op_logexp_1res_v2(param,*args):
         the realease that corresponds to the storage value provided. Otherwise,
         the function outputs all the releases values that correspond, according
         to the operating policy, to the storage values from 0 to 1.
+    s_step = optional argument that defines the step of the storage fraction
+        values from 0 to 1 (0.01 by default, i.e. 101 values). The simulation 
+        of the reservoir system (res_sys_sim) reads the step from the number of
+        values of the operating policy.
         
     u = reservoir releases determined by the operating policy and that 
         correspond to the storage fraction values from 0 (dead storage) to 1
@@ -257,8 +276,7 @@ def op_logexp_1res_v2(param,*args):
             # Exponential segment (s < s_ref)
             u = (u_frac_ref + ((s_frac-s_frac_ref+Δs)**p_sto - Δs**p_sto)/((1-s_frac_ref+Δs)**p_sto - Δs**p_sto) * (u_frac_max-u_frac_ref)) * u_ref
     else:
-        s_step = 0.01
-        s_frac = np.arange(0,1+s_step,s_step)
+        s_frac = storage_fractions(s_step)
         u = np.zeros([len(s_frac),1]) + np.nan 
         # Logarihmic segment (s < s_ref)
         u[s_frac<s_frac_ref,0] = (u_frac_min + np.log(1 + p_rel*s_frac[s_frac<s_frac_ref])/np.log(1 + p_rel*s_frac_ref) * (u_frac_ref - u_frac_min)) * u_ref
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains tools to save the progress of an optimisation with the
+NSGAII algorithm (platypus) in a file (checkpoint) and to resume it later,
+e.g. after a restart of the Notebook kernel or the pre-emption of a job. A
+checkpoint contains the population (and the archive if any), the number of
+function evaluations (nfe) and the state of the random number generators, so
+that a resumed run gives the same results as an uninterrupted run.
+The tools included are:
+    NSGAII_checkpoint : saves and loads checkpoints of an algorithm
+    run_checkpointed  : runs an algorithm resuming from and saving checkpoints
+    algorithm_to_dict, algorithm_from_dict : snapshots of the state of an
+                       algorithm
+    solutions_to_dict, solutions_from_dict : snapshots of a set of solutions
+    rng_state, set_rng_state : state of the random number generators
+
+Example (reservoir operating policy optimisation, see the Notebooks):
+    algorithm = NSGAII(problem,population_size)
+    run_checkpointed(algorithm,num_iter,'Results/optimisation.json',
+                     frequency = 1000) # instead of algorithm.run(num_iter)
+If the run is interrupted, running the same lines again resumes it from the
+last checkpoint.
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import os
+import json
+import numbers
+import random
+import numpy as np
+from platypus import Solution, nondominated_sort
+
+try:
+    from platypus.config import default_variator # platypus < 1.1
+except ImportError:
+    from platypus.config import PlatypusConfig
+    default_variator = PlatypusConfig.default_variator
+
+class NSGAII_checkpoint:
+    """This class saves checkpoints of an algorithm in a JSON file and loads
+    them to resume the algorithm.
+
+     file_path   = path of the checkpoint file
+     frequency   = optional, minimum number of function evaluations between
+                   checkpoints when it is used as callback of algorithm.run
+                   (by default, a checkpoint after every generation)
+     fingerprint = optional, fingerprint of the problem (e.g. of its inputs),
+                   so that a checkpoint is not used to resume another problem
+
+    Example:
+        checkpoint = NSGAII_checkpoint('Results/optimisation.json',1000)
+        checkpoint.load(algorithm) # False if there is no checkpoint
+        algorithm.run(num_iter,callback = checkpoint)
+    """
+    def __init__(self,file_path,frequency = None,fingerprint = ''):
+        self.file_path = file_path
+        self.frequency = frequency
+        self.fingerprint = fingerprint
+        self.nfe_saved = None
+
+    def __call__(self,algorithm):
+        if (self.nfe_saved is None or self.frequency is None or
+            algorithm.nfe - self.nfe_saved >= self.frequency):
+            self.save(algorithm)
+
+    def save(self,algorithm):
+        """Saves the checkpoint of the algorithm"""
+        checkpoint = algorithm_to_dict(algorithm)
+        checkpoint['fingerprint'] = self.fingerprint
+        folder_path = os.path.dirname(self.file_path)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok = True)
+        with open(self.file_path+'.tmp','w') as f:
+            json.dump(checkpoint,f)
+        os.replace(self.file_path+'.tmp',self.file_path)
+        self.nfe_saved = algorithm.nfe
+
+    def load(self,algorithm):
+        """Restores the algorithm from the checkpoint. It returns False if the
+        checkpoint file does not exist."""
+        if not os.path.exists(self.file_path):
+            return False
+        with open(self.file_path) as f:
+            checkpoint = json.load(f)
+        problem = algorithm.problem
+        if (checkpoint['fingerprint'] != self.fingerprint or
+            checkpoint['nvars'] != problem.nvars or
+            checkpoint['nobjs'] != problem.nobjs):
+            raise ValueError('the checkpoint '+self.file_path+' was saved for a different problem')
+        algorithm_from_dict(algorithm,checkpoint)
+        self.nfe_saved = algorithm.nfe
+
+        return True
+
+def run_checkpointed(algorithm,iterations,file_path,frequency = None,fingerprint = ''):
+    """This function runs the algorithm until iterations function evaluations
+    (in total, including those of the previous runs) resuming from the
+    checkpoint file_path, if it exists, and saving checkpoints every
+    frequency evaluations (see NSGAII_checkpoint) and at the end.
+    iterations can also be a termination condition (e.g. EarlyStopping, see
+    optimisation_termination), which is checked from the resumed state."""
+    checkpoint = NSGAII_checkpoint(file_path,frequency,fingerprint)
+    checkpoint.load(algorithm)
+    if not isinstance(iterations,numbers.Integral): # e.g. int or np.int64
+        algorithm.run(iterations,callback = checkpoint)
+        checkpoint.save(algorithm)
+    elif algorithm.nfe < iterations:
+        algorithm.run(int(iterations) - algorithm.nfe,callback = checkpoint)
+        checkpoint.save(algorithm)
+
+    return algorithm
+
+def algorithm_to_dict(algorithm):
+    """Snapshot (dictionary) of the state of the algorithm: population,
+    archive (if any), number of function evaluations and state of the random
+    number generators. The algorithms with additional state (e.g. the
+    training set of SurrogateNSGAII, see optimisation_surrogate) provide it
+    with their to_dict method."""
+    archive = getattr(algorithm,'archive',None)
+    snapshot = {'nvars'      : algorithm.problem.nvars,
+                'nobjs'      : algorithm.problem.nobjs,
+                'nfe'        : algorithm.nfe,
+                'population' : solutions_to_dict(algorithm.population),
+                'archive'    : None if archive is None else solutions_to_dict(archive),
+                'rng_state'  : rng_state()}
+    if hasattr(algorithm,'to_dict'):
+        snapshot['algorithm'] = algorithm.to_dict()
+    return snapshot
+
+def algorithm_from_dict(algorithm,snapshot):
+    """Restores the state of the algorithm from a snapshot (see
+    algorithm_to_dict), so that running it continues the snapshot run"""
+    problem = algorithm.problem
+    if hasattr(algorithm,'from_dict'):
+        if 'algorithm' not in snapshot:
+            raise ValueError('the snapshot does not contain the state of the algorithm')
+        algorithm.from_dict(snapshot['algorithm'])
+    algorithm.population = solutions_from_dict(problem,snapshot['population'])
+    nondominated_sort(algorithm.population) # rank and crowding distance
+    if snapshot['archive'] is not None and getattr(algorithm,'archive',None) is not None:
+        algorithm.archive += solutions_from_dict(problem,snapshot['archive'])
+    algorithm.nfe = snapshot['nfe']
+    if getattr(algorithm,'variator',False) is None:
+        # Set by the algorithm in the first generation, which is skipped
+        algorithm.variator = default_variator(problem)
+    algorithm.result = algorithm.population
+    if getattr(algorithm,'archive',None) is not None:
+        algorithm.result = algorithm.archive
+    set_rng_state(snapshot['rng_state'])
+
+    return algorithm
+
+def solutions_to_dict(solutions):
+    """Snapshot (dictionary of lists) of the variables, objectives and
+    constraints of a set of evaluated solutions"""
+    return {'variables'  : [list(s.variables[:]) for s in solutions],
+            'objectives' : [list(s.objectives[:]) for s in solutions],
+            'constraints': [list(s.constraints[:]) for s in solutions],
+            'constraint_violation': [s.constraint_violation for s in solutions]}
+
+def solutions_from_dict(problem,snapshot):
+    """Evaluated solutions of the problem from a snapshot (see
+    solutions_to_dict)"""
+    solutions = []
+    for k in range(len(snapshot['variables'])):
+        solution = Solution(problem)
+        solution.variables[:] = snapshot['variables'][k]
+        solution.objectives[:] = snapshot['objectives'][k]
+        solution.constraints[:] = snapshot['constraints'][k]
+        solution.constraint_violation = snapshot['constraint_violation'][k]
+        solution.feasible = solution.constraint_violation == 0.0
+        solution.evaluated = True
+        solutions.append(solution)
+
+    return solutions
+
+def rng_state():
+    """State of the random number generators used by platypus (random) and
+    numpy (np.random), as lists that can be saved in a JSON file"""
+    version,internal_state,gauss_next = random.getstate()
+    name,keys,pos,has_gauss,cached_gaussian = np.random.get_state()
+    return {'random'   : [version,list(internal_state),gauss_next],
+            'np_random': [name,keys.tolist(),pos,has_gauss,cached_gaussian]}
+
+def set_rng_state(state):
+    """Restores the state of the random number generators (see rng_state)"""
+    version,internal_state,gauss_next = state['random']
+    random.setstate((version,tuple(internal_state),gauss_next))
+    name,keys,pos,has_gauss,cached_gaussian = state['np_random']
+    np.random.set_state((name,np.array(keys, dtype = np.uint32),pos,has_gauss,cached_gaussian))
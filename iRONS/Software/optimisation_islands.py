@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains an island model of the NSGAII algorithm (platypus):
+several independent populations (islands) of the same problem evolve in
+parallel processes and, every migration_interval function evaluations, the
+best solutions (elites) of each island migrate to the next island (ring
+topology). The islands explore different regions of the decision space, so
+they are less likely to get stuck in the same local optimum than a single
+population, and the migrations spread the best solutions found. At the end
+the populations of all the islands are merged into a single set of solutions.
+The tools included are:
+    run_islands = runs the island model and returns the merged solutions
+    island_run  = runs a number of function evaluations of one island
+    elites      = best solutions of a set by non-dominated sorting
+
+Example (reservoir operating policy optimisation, see the Notebooks):
+    solutions = run_islands(problem,population_size,num_iter,islands = 4,
+                            migration_interval = 1000)
+    # instead of algorithm = NSGAII(problem,population_size)
+    #            algorithm.run(num_iter)
+    #            solutions = algorithm.result
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import numba
+from platypus import NSGAII, nondominated_sort, nondominated_truncate
+
+## Tools from the iRONs toolbox
+from irons.Software.optimisation_checkpoint import (algorithm_to_dict, algorithm_from_dict,
+                                                    solutions_to_dict, solutions_from_dict)
+
+def run_islands(problem,population_size,iterations,islands = 4,migration_interval = None,
+                migration_size = 1,n_workers = None,evaluator = None,seed = None):
+    """This function optimises the problem with islands independent NSGAII
+    populations of population_size solutions that evolve in parallel
+    processes.
+
+     iterations         = number of function evaluations of each island
+     migration_interval = number of function evaluations between
+                          migrations (by default, no migrations)
+     migration_size     = number of elite solutions that migrate from each
+                          island to the next one
+     n_workers          = number of processes (by default the number of
+                          CPUs, at most islands). If n_workers = 1 the
+                          islands run one after the other in this process
+     evaluator          = optional, platypus evaluator of the solutions of
+                          each island (e.g. HBV_calibration.BatchEvaluator)
+     seed               = seed of the random number generators. For a given
+                          seed the results are the same whatever the number
+                          of workers.
+
+    It returns the population_size best solutions (see elites) of the merged
+    populations of the islands.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    # Each island has its own random numbers
+    seeds = [int(s) for s in np.random.randint(0,2**31-1,islands)]
+    # Numbers of function evaluations as int, e.g. from np.int64 (platypus
+    # only runs int budgets)
+    iterations = int(iterations)
+    if migration_interval is None:
+        migration_interval = iterations
+    migration_interval = int(migration_interval)
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    n_workers = min(n_workers,islands)
+
+    states = [None]*islands # snapshot of each island (see algorithm_to_dict)
+    migrants = [None]*islands
+    executor = None
+    if n_workers > 1:
+        # Each process runs a single Numba thread, the islands are the
+        # parallel tasks
+        executor = ProcessPoolExecutor(max_workers = n_workers,
+                                       mp_context = multiprocessing.get_context('spawn'),
+                                       initializer = numba.set_num_threads,
+                                       initargs = (1,))
+    try:
+        nfe = 0
+        while nfe < iterations:
+            evaluations = min(migration_interval,iterations - nfe)
+            args = [(problem,population_size,states[i],migrants[i],evaluations,
+                     seeds[i],evaluator) for i in range(islands)]
+            if executor is None:
+                states = [island_run(*arg) for arg in args]
+            else:
+                states = list(executor.map(island_run,*zip(*args)))
+            nfe = min(state['nfe'] for state in states)
+            # Migration of the elites of each island to the next one
+            migrants = [solutions_to_dict(elites(solutions_from_dict(problem,states[i-1]['population']),
+                                                 migration_size))
+                        for i in range(islands)]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    solutions = []
+    for state in states:
+        solutions += solutions_from_dict(problem,state['population'])
+
+    return elites(solutions,population_size)
+
+def island_run(problem,population_size,state,migrants,evaluations,seed,evaluator = None):
+    """This function runs evaluations function evaluations of an island: a
+    NSGAII algorithm that starts from the snapshot state (see
+    algorithm_to_dict), or from scratch if it is None, to which the migrants
+    (snapshot of solutions) are added. It returns the snapshot of the island
+    after the run."""
+    algorithm = NSGAII(problem,population_size,evaluator = evaluator)
+    if state is None:
+        random.seed(seed) # platypus uses the random module
+        np.random.seed(seed)
+    else:
+        algorithm_from_dict(algorithm,state)
+        if migrants is not None:
+            # The migrants replace the worst solutions of the island
+            population = algorithm.population + solutions_from_dict(problem,migrants)
+            nondominated_sort(population)
+            algorithm.population = nondominated_truncate(population,population_size)
+    algorithm.run(evaluations)
+
+    return algorithm_to_dict(algorithm)
+
+def elites(solutions,n):
+    """This function returns the n best solutions of a set (without duplicated
+    solutions) by non-dominated sorting: first the non-dominated solutions,
+    then the next front and so on, and the least crowded solutions within the
+    last front (as the NSGAII algorithm)"""
+    unique_solutions = {}
+    for solution in solutions:
+        unique_solutions.setdefault(tuple(solution.variables[:]),solution)
+    solutions = list(unique_solutions.values())
+    nondominated_sort(solutions)
+
+    return nondominated_truncate(solutions,n)
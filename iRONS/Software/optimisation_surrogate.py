@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains a surrogate-assisted version of the NSGAII algorithm
+(platypus) for problems whose function evaluations are expensive, e.g. the
+calibration of a rainfall-runoff model with a multi-decade daily record. In
+each generation many more offspring than needed are generated, their
+objective values are predicted by a cheap surrogate model (a radial basis
+function interpolation of the solutions already evaluated) and only the most
+promising ones are evaluated with the real function. The same function
+evaluations are therefore spent on better candidates, and fewer evaluations
+are needed to reach a given quality of the solutions.
+The tools included are:
+    RBF_surrogate   = radial basis function interpolation of the objectives
+    SurrogateNSGAII = NSGAII algorithm with surrogate pre-screening of the
+                      offspring
+
+Example (reservoir operating policy optimisation, see the Notebooks):
+    algorithm = SurrogateNSGAII(problem,population_size,oversampling = 5)
+    algorithm.run(num_iter) # num_iter real function evaluations
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import numpy as np
+from platypus import NSGAII, nondominated_sort, nondominated_truncate
+
+class RBF_surrogate:
+    """This class defines a radial basis function (RBF) interpolation, with
+    cubic kernel and linear polynomial tail, of the objective values F -
+    matrix (n,q) - of n vectors of decision variables X - matrix (n,d) -. The
+    decision variables are scaled to [0,1] with their lower and upper bounds
+    - vectors (d,) -.
+
+    Example:
+        surrogate = RBF_surrogate(lower,upper).fit(X,F)
+        F_pred = surrogate.predict(X_new)
+    """
+    def __init__(self,lower,upper):
+        self.lower = np.asarray(lower, dtype = float)
+        self.range = np.asarray(upper, dtype = float) - self.lower
+        self.range[self.range == 0] = 1
+
+    def fit(self,X,F):
+        """Fits the RBF interpolation to the objective values F of X"""
+        X = self.scale(X)
+        X,index = np.unique(X, axis = 0, return_index = True) # no duplicated points
+        F = np.array(F, dtype = float, ndmin = 2)[index]
+        n,d = X.shape
+        A = np.zeros((n+d+1,n+d+1))
+        A[:n,:n] = cubic(distances(X,X))
+        A[:n,n] = A[n,:n] = 1
+        A[:n,n+1:] = X
+        A[n+1:,:n] = X.T
+        b = np.zeros((n+d+1,F.shape[1]))
+        b[:n] = F
+        self.coefficients = np.linalg.lstsq(A,b,rcond = None)[0]
+        self.X = X
+        return self
+
+    def predict(self,X):
+        """Predicted objective values - matrix (m,q) - of X - matrix (m,d) -"""
+        X = self.scale(X)
+        n = len(self.X)
+        return (cubic(distances(X,self.X)) @ self.coefficients[:n] +
+                self.coefficients[n] + X @ self.coefficients[n+1:])
+
+    def scale(self,X):
+        return (np.array(X, dtype = float, ndmin = 2) - self.lower)/self.range
+
+def cubic(r):
+    return r**3
+
+def distances(X,Y):
+    """Euclidean distances between the rows of X and the rows of Y"""
+    d2 = (X**2).sum(axis = 1)[:,np.newaxis] + (Y**2).sum(axis = 1) - 2*X @ Y.T
+    return np.sqrt(np.maximum(d2,0))
+
+class SurrogateNSGAII(NSGAII):
+    """This class defines a NSGAII algorithm (platypus) whose offspring are
+    pre-screened by a surrogate model (RBF_surrogate) of the objectives:
+
+     oversampling = number of candidate offspring generated in each
+                    generation per solution evaluated
+     screened     = number of offspring evaluated with the real function in
+                    each generation (by default population_size)
+     max_points   = maximum number of evaluated solutions (the most recent
+                    ones) used to fit the surrogate model
+
+    The other arguments are those of NSGAII. The nfe of the algorithm counts
+    only the real function evaluations. The evaluated solutions used to fit
+    the surrogate model are saved in the checkpoints of the algorithm (see
+    optimisation_checkpoint) with to_dict and restored with from_dict.
+    """
+    def __init__(self,problem,population_size = 100,oversampling = 5,screened = None,
+                 max_points = 500,**kwargs):
+        super().__init__(problem,population_size,**kwargs)
+        self.oversampling = oversampling
+        self.screened = population_size if screened is None else screened
+        self.max_points = max_points
+        self.surrogate = RBF_surrogate([t.min_value for t in problem.types],
+                                       [t.max_value for t in problem.types])
+        self.X = [] # evaluated solutions (feasible) and their objective values
+        self.F = []
+
+    def to_dict(self):
+        """Snapshot (dictionary of lists) of the evaluated solutions"""
+        return {'X' : [list(x) for x in self.X],
+                'F' : [list(f) for f in self.F]}
+
+    def from_dict(self,snapshot):
+        """Restores the evaluated solutions from a snapshot (see to_dict)"""
+        self.X = [list(x) for x in snapshot['X']]
+        self.F = [list(f) for f in snapshot['F']]
+
+    def evaluate_all(self,solutions):
+        unevaluated = [s for s in solutions if not s.evaluated]
+        super().evaluate_all(solutions)
+        for s in unevaluated:
+            if s.constraint_violation == 0.0:
+                self.X.append(s.variables[:])
+                self.F.append(s.objectives[:])
+        del self.X[:-self.max_points], self.F[:-self.max_points]
+
+    def iterate(self):
+        candidates = []
+        while len(candidates) < self.oversampling*self.screened:
+            parents = self.selector.select(self.variator.arity,self.population)
+            candidates.extend(self.variator.evolve(parents))
+
+        if len(self.X) > self.problem.nvars + 1: # enough points to fit the surrogate
+            F = self.surrogate.fit(self.X,self.F).predict([s.variables[:] for s in candidates])
+            for s,f in zip(candidates,F):
+                s.objectives[:] = list(f) # predicted, evaluated = False
+            nondominated_sort(candidates)
+            offspring = nondominated_truncate(candidates,self.screened)
+        else:
+            offspring = candidates[:self.screened]
+
+        self.evaluate_all(offspring)
+
+        offspring.extend(self.population)
+        nondominated_sort(offspring)
+        self.population = nondominated_truncate(offspring,self.population_size)
+
+        if self.archive is not None:
+            self.archive.extend(self.population)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains termination conditions for the optimisations with the
+NSGAII algorithm (platypus), so that an optimisation stops as soon as it has
+converged instead of always spending the full budget of function evaluations:
+    EarlyStopping = stops the algorithm when any of these criteria is met:
+                    - maximum number of function evaluations
+                    - maximum wall-clock time
+                    - target objective values reached (e.g. a target RMSE)
+                    - stagnation of the best objective values or of the
+                      hypervolume of the population over a window of
+                      generations
+                    and reports why (reason) and when (nfe, time) it stopped.
+    hypervolume   = hypervolume of a set of objective values
+
+Example (reservoir operating policy optimisation, see the Notebooks):
+    stopping = EarlyStopping(max_evaluations = 10000,window = 20,
+                             tolerance = 1e-3,metric = 'hypervolume')
+    algorithm.run(stopping) # instead of algorithm.run(10000)
+    print(stopping.reason,stopping.nfe)
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import time
+from collections import deque
+
+import numpy as np
+from platypus import TerminationCondition
+
+class EarlyStopping(TerminationCondition):
+    """This class defines a termination condition of the NSGAII algorithm
+    (platypus) that combines several stopping criteria:
+
+     max_evaluations = optional, maximum number of function evaluations (nfe
+                       of the algorithm, including those of resumed runs, see
+                       optimisation_checkpoint)
+     max_time        = optional, maximum wall-clock time of the run [s]
+     target          = optional, target value of each objective. The run stops
+                       when a solution reaches all of them (e.g. target = [5]
+                       for a calibration with RMSE < 5 ML)
+     window          = optional, number of generations of the stagnation
+                       criterion. The run stops when the metric has not
+                       improved more than tolerance (relative) over the last
+                       window generations
+     tolerance       = relative tolerance of the stagnation criterion
+     metric          = stagnation metric: 'objectives' (best value of each
+                       objective) or 'hypervolume' (hypervolume of the
+                       population with respect to the worst objective values
+                       of the first generation)
+
+    After the run:
+     reason = criterion that stopped the run: 'max_evaluations', 'max_time',
+              'target' or 'stagnation' (None if the run did not stop)
+     nfe    = number of function evaluations of the algorithm
+     time   = wall-clock time of the run [s]
+     history = values of the stagnation metric in the last generations
+    """
+    def __init__(self,max_evaluations = None,max_time = None,target = None,
+                 window = None,tolerance = 1e-3,metric = 'objectives'):
+        super().__init__()
+        if metric not in ('objectives','hypervolume'):
+            raise ValueError("metric must be equal to 'objectives' or 'hypervolume'")
+        if max_evaluations is None and max_time is None and target is None and window is None:
+            raise ValueError('at least one stopping criterion must be defined')
+        self.max_evaluations = max_evaluations
+        self.max_time = max_time
+        self.target = target
+        self.window = window
+        self.tolerance = tolerance
+        self.metric = metric
+        self.reason = None
+        self.nfe = 0
+        self.time = 0.0
+
+    def initialize(self,algorithm):
+        self.start_time = time.time()
+        self.reason = None
+        self.nfe = algorithm.nfe
+        self.time = 0.0
+        self.history = deque(maxlen = (self.window or 0) + 1)
+        self.nfe_history = None # nfe of the last value of the history
+        self.reference = None # reference point of the hypervolume
+
+    def shouldTerminate(self,algorithm):
+        self.nfe = algorithm.nfe
+        self.time = time.time() - self.start_time
+        if self.max_evaluations is not None and algorithm.nfe >= self.max_evaluations:
+            self.reason = 'max_evaluations'
+        elif self.max_time is not None and self.time >= self.max_time:
+            self.reason = 'max_time'
+        elif algorithm.nfe > 0:
+            F = np.array([s.objectives[:] for s in algorithm.population
+                          if s.constraint_violation == 0.0], dtype = float)
+            if self.target is not None and F.size and np.any(np.all(F <= self.target,axis = 1)):
+                self.reason = 'target'
+            elif self.window is not None and self.stagnation(algorithm,F):
+                self.reason = 'stagnation'
+
+        return self.reason is not None
+
+    def stagnation(self,algorithm,F):
+        """Updates the history of the stagnation metric with the population
+        of a new generation and checks whether it has stagnated"""
+        if algorithm.nfe == self.nfe_history or F.size == 0:
+            return False
+        self.nfe_history = algorithm.nfe
+        if self.metric == 'objectives':
+            value = F.min(axis = 0)
+        else:
+            if self.reference is None:
+                self.reference = F.max(axis = 0) + np.finfo(float).eps
+            value = -hypervolume(F,self.reference) # to minimise, as the objectives
+        self.history.append(value)
+        if len(self.history) <= self.window:
+            return False
+        value_old = self.history[0]
+        improvement = value_old - value
+        return bool(np.all(improvement <= self.tolerance*np.maximum(np.abs(value_old),np.finfo(float).tiny)))
+
+def hypervolume(F,reference):
+    """This function returns the hypervolume of the objective values F - matrix
+    (n,q) of n solutions and q objectives to minimise - with respect to the
+    reference point - vector (q,) -, i.e. the volume of the objective space
+    dominated by the solutions and bounded by the reference point. The
+    solutions that do not dominate the reference point are not considered.
+    It is computed exactly by slicing the objective space along the last
+    objective (suitable for a few objectives, as in the Notebooks)."""
+    F = np.array(F, dtype = float, ndmin = 2)
+    reference = np.asarray(reference, dtype = float)
+    F = F[np.all(F < reference,axis = 1)]
+    if len(F) == 0:
+        return 0.0
+    if F.shape[1] == 1:
+        return float(reference[0] - F[:,0].min())
+    F = F[np.argsort(F[:,-1],kind = 'mergesort')]
+    volume = 0.0
+    for i in range(len(F)):
+        upper = F[i+1,-1] if i+1 < len(F) else reference[-1]
+        if upper > F[i,-1]:
+            volume += hypervolume(F[:i+1,:-1],reference[:-1])*(upper - F[i,-1])
+    return volume
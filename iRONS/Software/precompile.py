@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the warm-up (precompilation) of the Numba kernels of the
+iRONS toolbox for their common signatures: single time series (one ensemble
+member) and ensembles, in double (np.float64) and single (np.float32)
+precision. Each tool is run once with small synthetic inputs, so its kernels
+are compiled and saved in the on-disk cache (see jit_cache). Any later
+process (notebook kernel, worker of a pool of processes, batch job) loads the
+compiled kernels from the cache instead of compiling them again.
+
+It can be run once after the installation, or after updating the toolbox:
+
+    python -m irons.Software.precompile [--tools TOOL [TOOL ...]] [--float64]
+
+or at the start of a session, e.g. before starting a pool of processes:
+
+    from irons.Software.precompile import precompile
+    precompile()
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import argparse
+import time
+
+import numpy as np
+
+## Tools from the iRONs toolbox
+from irons.Software.res_sys_sim import (res_sys_sim, res_sys_sim_batch, res_sys_obj,
+                                        res_sys_obj_batch)
+from irons.Software.HBV_sim import HBV_sim, HBV_sim_batch
+from irons.Software.flow_metrics import flow_metrics
+from irons.Software.HBV_GLUE import histogram_update
+from irons.Software.cum2inst import cum2inst
+
+# Size of the synthetic inputs: time steps and ensemble members (the
+# ensembles use the parallel kernels and a single member the serial ones)
+T = 10
+members = [1, 2]
+
+def precompile(tools = None, dtypes = (np.float64, np.float32), verbose = False):
+    """This function compiles the Numba kernels of the tools (list of names
+    of warm_ups, by default all of them) for the floating point types dtypes,
+    or loads them from the on-disk cache if they were already compiled. It
+    returns the time (s) spent on each tool."""
+    if tools is None:
+        tools = list(warm_ups)
+    for tool in tools:
+        if tool not in warm_ups:
+            raise ValueError('tool must be one of '+', '.join(warm_ups))
+    times = {}
+    for tool in tools:
+        start = time.perf_counter()
+        for dtype in dtypes:
+            warm_ups[tool](dtype)
+        times[tool] = time.perf_counter() - start
+        if verbose:
+            print('%-20s %8.2f s' % (tool, times[tool]))
+    return times
+
+def Qreg_inputs(P = None):
+    """Regulated flows dictionaries (see res_sys_sim) with the types of
+    inputs of the common signatures: default releases (demand) and
+    variable operating policy (integer indices of the periods). If P is not
+    None the inputs are stacks of P candidates (see res_sys_sim_batch)."""
+    policy = np.linspace(0, 10, 101)[:, np.newaxis] + np.zeros((1, 2))
+    if P is not None:
+        policy = policy[np.newaxis] + np.zeros((P, 1, 1))
+    return [{'releases' : [],
+             'inflows'  : [],
+             'rel_inf'  : []},
+            {'releases' : {'type'  : 'variable operating policy',
+                           'input' : policy,
+                           'index' : np.arange(T) % 2},
+             'inflows'  : [],
+             'rel_inf'  : []}]
+
+def warm_res_sys_sim(dtype):
+    for M in members:
+        for Qreg in Qreg_inputs():
+            res_sys_sim(np.ones((T, M)), np.ones((T, M)), 50, 10, 100, 1, 5, Qreg,
+                        dtype = dtype)
+            res_sys_obj(np.ones((T, M)), np.ones((T, M)), 50, 10, 100, 1, 5, Qreg,
+                        'MSD', dtype = dtype)
+
+def warm_res_sys_sim_batch(dtype):
+    for M in members:
+        for Qreg in Qreg_inputs(P = 2):
+            res_sys_sim_batch(np.ones((T, M)), np.ones((T, M)), 50, 10, 100, 1, 5, Qreg,
+                              dtype = dtype)
+            res_sys_obj_batch(np.ones((T, M)), np.ones((T, M)), 50, 10, 100, 1, 5, Qreg,
+                              'MSD', dtype = dtype)
+
+def warm_HBV_sim(dtype):
+    param = [2.0, 0.7, 300.0, 2.0, 0.3, 0.1, 0.02, 20.0, 3]
+    ini = [100.0, 10.0, 20.0]
+    for M in members:
+        HBV_sim(np.ones((T, M)), np.ones((T, M)), param, 1, ini, 1, dtype = dtype)
+    HBV_sim_batch(np.ones(T), np.ones(T), [param]*2, [ini]*2, 1, 1, dtype = dtype)
+
+def warm_flow_metrics(dtype):
+    # The metrics are computed in double precision
+    metrics = flow_metrics(np.arange(1, T + 1), 'rmse')
+    for M in members:
+        metrics(np.ones((T, M), dtype = dtype))
+
+def warm_HBV_GLUE(dtype):
+    # Histograms of the behavioural flows (double precision)
+    histogram_update(np.zeros((T, 5)), np.ones((T, 2)), np.arange(2), np.ones(2), 0.0, 1.0)
+
+def warm_cum2inst(dtype):
+    for M in members:
+        cum2inst(np.ones((T, M)), dtype = dtype)
+
+# Warm-up function of each tool
+warm_ups = {'res_sys_sim'       : warm_res_sys_sim,
+            'res_sys_sim_batch' : warm_res_sys_sim_batch,
+            'HBV_sim'           : warm_HBV_sim,
+            'flow_metrics'      : warm_flow_metrics,
+            'HBV_GLUE'          : warm_HBV_GLUE,
+            'cum2inst'          : warm_cum2inst}
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Precompile the iRONS Numba kernels')
+    parser.add_argument('--tools', nargs = '+', default = None, choices = list(warm_ups),
+                        help = 'tools to precompile (by default all of them)')
+    parser.add_argument('--float64', action = 'store_true',
+                        help = 'only double precision (np.float64)')
+    args = parser.parse_args(args)
+
+    dtypes = (np.float64,) if args.float64 else (np.float64, np.float32)
+    times = precompile(args.tools, dtypes, verbose = True)
+    print('%-20s %8.2f s' % ('total', sum(times.values())))
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,10 @@ from netCDF4 import Dataset
 
 def read_csv_data(folder_path,file_name,column_name = None):
     """
-    This module extracts the data from a CSV (comma separated variables) file
+    This module extracts the data from a CSV (comma separated variables) file.
+    column_name is the name of a column (vector output), a list of names 
+    (one column of the output per name) or None (all the columns but the 
+    dates)
     """
 
     data = pd.read_csv(folder_path+"/"+file_name)
@@ -28,6 +31,8 @@ def read_csv_data(folder_path,file_name,column_name = None):
     # Each element of args is the name of weather variable
     if isinstance(column_name,(str)):
         outputs = np.array(data[column_name])
+    elif isinstance(column_name,(list,tuple)):
+        outputs = np.array(data[list(column_name)])
     else:
         outputs = np.array(data[data.columns[1:]])
         
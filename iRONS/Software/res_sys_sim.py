@@ -6,6 +6,13 @@ This makes the regulated flow data readable by the mass balance function
 (mass_bal_func). Then, mass_bal_func links all the key variables that represent 
 the reservoir dynamics (inflow, storage and outflows).
 
+The batch version (res_sys_sim_batch) simulates many candidate regulated flows
+or operating policies at once (e.g. all the solutions of a generation of an 
+optimisation algorithm), with a single compiled call instead of one call per 
+candidate. The objectives of the simulations (e.g. supply deficit, resource 
+deficit, pumping cost) can be computed during the mass balance (res_sys_obj 
+and res_sys_obj_batch), without storing the simulated time series.
+
 To speed-up the computation this module applies the just-in-time compiler Numba 
 (http://numba.pydata.org/; (Lam & Seibert, 2015; Marowka, 2018).
 
@@ -21,8 +28,94 @@ compiler. doi:10.1145/2833157.2833162
 import numpy as np
 from numba import njit,prange
 
+## Tools from the iRONs toolbox
+from irons.Software.jit_cache import serial_kernel
+
+# Objectives computed during the simulation (column of the results of 
+# mass_bal_obj), for each ensemble member
+objective_names = ['MSD','MRD','MPC','TSD','CSV','TPC']
+n_objectives = len(objective_names)
+
+### Policy function lookup ###
+@njit(nogil = True, inline = 'always', cache = True) # Numba decorator to speed-up the function below
+def policy_lookup(x, s_frac, policy, j):
+    """Value of the column j of the policy function lookup table (policy) at 
+    the storage fraction x, linearly interpolated as np.interp. If s_frac is 
+    empty, the n rows of the table correspond to a uniform grid of storage 
+    fractions from 0 to 1 (step 1/(n-1), see operating_policy), so the 
+    interval of x is computed arithmetically instead of with a binary search. 
+    Otherwise the rows correspond to the storage fractions s_frac."""
+    if len(s_frac) > 0:
+        return np.interp(x, s_frac, policy[:,j])
+    n = policy.shape[0]
+    u = x*(n-1) # position of x in the grid
+    if np.isnan(u):
+        return u
+    if u <= 0:
+        return policy[0,j]
+    if u >= n-1:
+        return policy[n-1,j]
+    i = int(u) # interval [i,i+1] of the grid
+    return policy[i,j] + (u-i)*(policy[i+1,j]-policy[i,j])
+
+### Mass balance of a time step ###
+@njit(nogil = True, inline = 'always', cache = True) # Numba decorator to speed-up the function below
+def mass_bal_step(t, k, I, e, s_min, s_max, env_min, s_frac,
+                  policy_inf, policy_inf_idx, policy_rel, policy_rel_idx,
+                  Qreg_inf, Qreg_rel, s, env, spill, E):
+    """Mass balance of the time step t of an ensemble member (see 
+    mass_bal_func), with the inflow (I), evaporation depth (e) and minimum 
+    environmental flow (env_min) of the time step: it computes the regulated 
+    flows (policy functions), evaporation, environmental flow and spillage, 
+    which are written in the element k of the output vectors of the member, 
+    and the storage s[k+1], with scalar operations only"""
+    if len(policy_inf)>1:
+
+        if policy_inf.shape[1] > 1:
+            ### Variable policy function across the year ###
+            Qreg_inf[k] = policy_lookup(s[k]/s_max, s_frac, policy_inf, int(policy_inf_idx[t]))
+        else:
+            ### Policy function ###
+            Qreg_inf[k] = policy_lookup(s[k]/s_max, s_frac, policy_inf, 0)
+    
+    if len(policy_rel)>1:
+        
+        if policy_rel.shape[1] > 1:
+            ### Rule curve ###
+            Qreg_rel[k] = policy_lookup(s[k]/s_max, s_frac, policy_rel, int(policy_rel_idx[t]))
+        else:
+            ### Policy function ###
+            Qreg_rel[k] = policy_lookup(s[k]/s_max, s_frac, policy_rel, 0)
+        
+    ### Evaporation volume ### 
+    # (E) = evaporation depth * water surface area (A)
+    # By default we assume A = 1 km2, but it should be modified according 
+    # to your reservoir charateristics and to take into account the 
+    # variation of the water surface area as a function of the water 
+    # surface elevation""" 
+    A = 1 # in km2. 
+    E[k] = e * A # in ML (= mm * km2) 
+    
+    # Water resource available for the environmental compensation
+    # (s + I - E)
+    available = s[k] - s_min + I + Qreg_inf[k] - E[k]
+    # If the required environmental compensation is higher than the water resource available
+    # then the environmental compensation is equal to the higher value between 0 and the resource available.
+    # Otherwise Qenv = env_min.
+    if env_min >= available:
+        env[k] = max(0.0,available)
+    else:
+        env[k] = env_min
+    # If the regulated release (Qreg_rel) is higher than the water resource available (s + I - E - Qenv)
+    # then the release is equal to the lower value between the resource available and the pre-defined release (Qreg_rel)
+    Qreg_rel[k] = min(Qreg_rel[k], max(0.0,available - env[k]))
+    # The spillage is equal to the higher value between 0 and the resource available exceeding the reservoir capacity
+    spill[k] = max(0.0,s[k] + I + Qreg_inf[k] - Qreg_rel[k] - env[k] - E[k] - s_max)
+    # The final storage (initial storage in the next step) is equal to the storage + inflow - outflows
+    s[k+1] = max(s_min,s[k] + I + Qreg_inf[k] - Qreg_rel[k] - env[k] - E[k] - spill[k])
+
 ### Mass balance function ###
-@njit(parallel = False) # Numba decorator to speed-up the function below
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
 def mass_bal_func(I, e, 
                   s_ini, s_min, s_max, 
                   env_min, d,
@@ -78,8 +171,11 @@ def mass_bal_func(I, e,
                   of this function
                   
     Policy related inputs: 
-    s_frac          = storage fraction, it ranges from 0 (empty) to 1 (full) with 
-                      a 0.01 step (by default) 
+    s_frac          = storage fraction, it ranges from 0 (empty) to 1 (full). It 
+                      is empty (by default) if the policy function lookups 
+                      are defined over a uniform grid of storage fractions 
+                      (as in operating_policy), whose step is derived from 
+                      their number of rows (see policy_lookup)
     policy_inf      = policy function lookup for the regulated inflows. It is
                       an array that defines the regulated inflows as a function 
                       of s_frac. In case of a variable operating policy across 
@@ -100,85 +196,186 @@ def mass_bal_func(I, e,
                       number of simulation time steps and indicates the index 
                       (column number of policy_rel) of the operating policy 
                       lookup that corresponds to each simulation date.
+    
+    The ensemble members are simulated in parallel (Numba prange). Each time 
+    step only involves scalar operations (no temporary arrays), and 
+    mass_bal_func_serial is the same function compiled without parallelism.
     """
     
     T = I.shape[0] # number of time-steps
     M = I.shape[1] # number of ensemble members
     ### Declare output variables ###
     # Reservoir storage
-    s = np.zeros((T+1,M))
+    s = np.zeros((T+1,M),I.dtype)
     
     # Environmental flow
-    env = np.zeros((T,M))
+    env = np.zeros((T,M),I.dtype)
 
     # Spillage
-    spill = np.zeros((T,M))
+    spill = np.zeros((T,M),I.dtype)
     
     # Evaporation
-    E = np.zeros((T,M))
+    E = np.zeros((T,M),I.dtype)
     
-    # Regulated flows
-    Qreg_inf = Qreg_inf + np.zeros((T,M))
-    Qreg_rel = Qreg_rel + np.zeros((T,M))
+    # Regulated flows (the inputs have one column per member or a single
+    # column for all the members)
+    Qreg_inf_in = Qreg_inf
+    Qreg_rel_in = Qreg_rel
+    Qreg_inf = np.zeros((T,M),I.dtype)
+    Qreg_rel = np.zeros((T,M),I.dtype)
     
     ### Initial conditions ###
     s[0,:] = s_ini # initial storage
     
-    for m in prange(M):
+    # A single column of scheduled flows applies to all the members
+    for t in range(T):
+        for m in range(M):
+            Qreg_inf[t,m] = Qreg_inf_in[t,min(m,Qreg_inf_in.shape[1]-1)]
+            Qreg_rel[t,m] = Qreg_rel_in[t,min(m,Qreg_rel_in.shape[1]-1)]
     
+    for m in prange(M):
+        # Outputs of the ensemble member
+        s_m, env_m, spill_m, E_m = s[:,m], env[:,m], spill[:,m], E[:,m]
+        Qreg_inf_m, Qreg_rel_m = Qreg_inf[:,m], Qreg_rel[:,m]
+        
         for t in range(T): # Loop for each time-step
+            mass_bal_step(t, t, I[t,m], e[t,m], s_min, s_max, env_min[t,m], s_frac,
+                          policy_inf, policy_inf_idx, policy_rel, policy_rel_idx,
+                          Qreg_inf_m, Qreg_rel_m, s_m, env_m, spill_m, E_m)
             
-            if len(policy_inf)>1:
+    return env, spill, Qreg_rel, Qreg_inf, s, E
 
-                if policy_rel.shape[1] > 1:
-                    ### Variable policy function across the year ###
-                    Qreg_inf[t,m] = np.interp(s[t,m]/s_max, s_frac, policy_inf[:,int(policy_rel_idx[t])])
-                else:
-                    ### Policy function ###
-                    Qreg_inf[t,m] = np.interp(s[t,m]/s_max, s_frac, policy_inf[:,0])
-            
-            if len(policy_rel)>1:
-                
-                if policy_rel.shape[1] > 1:
-                    ### Rule curve ###
-                    Qreg_rel[t,m] = np.interp(s[t,m]/s_max, s_frac, policy_rel[:,int(policy_rel_idx[t])])       
-                else:
-                    ### Policy function ###
-                    Qreg_rel[t,m] = np.interp(s[t,m]/s_max, s_frac, policy_rel[:,0])
-                
-            ### Evaporation volume ### 
-            # (E) = evaporation depth * water surface area (A)
-            # By default we assume A = 1 km2, but it should be modified according 
-            # to your reservoir charateristics and to take into account the 
-            # variation of the water surface area as a function of the water 
-            # surface elevation""" 
-            A = 1 # in km2. 
-            E[t,m] = e[t,m] * A # in ML (= mm * km2) 
+# Same mass balance function without parallelism (one ensemble member or 
+# parallel tasks outside the function)
+mass_bal_func_serial = serial_kernel(mass_bal_func)
+
+### Batch mass balance function ###
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
+def mass_bal_batch(I, e, 
+                   s_ini, s_min, s_max, 
+                   env_min,
+                   Qreg_inf, Qreg_rel, 
+                   s_frac,
+                   policy_inf, policy_inf_idx,
+                   policy_rel, policy_rel_idx):
+    """Mass balance (see mass_bal_func) of P candidate regulated flows or 
+    policy functions for each of the M ensemble members. The inputs of the 
+    candidates are stacked along their first dimension: Qreg_inf and Qreg_rel
+    - arrays (P,T,M) or (P,T,1) -, policy_inf and policy_rel - arrays 
+    (P,n,n_periods) -. A first dimension of size 1 means that all the 
+    candidates share that input. The P x M simulations run in parallel."""
+    T = I.shape[0] # number of time-steps
+    M = I.shape[1] # number of ensemble members
+    P = max(Qreg_inf.shape[0],Qreg_rel.shape[0],policy_inf.shape[0],policy_rel.shape[0])
+    ### Declare output variables ###
+    s = np.zeros((P,T+1,M),I.dtype)
+    env = np.zeros((P,T,M),I.dtype)
+    spill = np.zeros((P,T,M),I.dtype)
+    E = np.zeros((P,T,M),I.dtype)
+    Qreg_inf_out = np.zeros((P,T,M),I.dtype)
+    Qreg_rel_out = np.zeros((P,T,M),I.dtype)
+    
+    for pm in prange(P*M):
+        p = pm // M # candidate
+        m = pm % M # ensemble member
+        # Inputs of the candidate (shared inputs have a single candidate)
+        Qreg_inf_p = Qreg_inf[min(p,Qreg_inf.shape[0]-1)]
+        Qreg_rel_p = Qreg_rel[min(p,Qreg_rel.shape[0]-1)]
+        policy_inf_p = policy_inf[min(p,policy_inf.shape[0]-1)]
+        policy_rel_p = policy_rel[min(p,policy_rel.shape[0]-1)]
+        # Outputs of the candidate and ensemble member
+        s_pm, env_pm, spill_pm, E_pm = s[p,:,m], env[p,:,m], spill[p,:,m], E[p,:,m]
+        Qreg_inf_pm, Qreg_rel_pm = Qreg_inf_out[p,:,m], Qreg_rel_out[p,:,m]
+        m_inf = min(m,Qreg_inf_p.shape[1]-1)
+        m_rel = min(m,Qreg_rel_p.shape[1]-1)
+        for t in range(T):
+            Qreg_inf_pm[t] = Qreg_inf_p[t,m_inf]
+            Qreg_rel_pm[t] = Qreg_rel_p[t,m_rel]
+        
+        ### Initial conditions ###
+        s_pm[0] = s_ini # initial storage
+        
+        for t in range(T): # Loop for each time-step
+            mass_bal_step(t, t, I[t,m], e[t,m], s_min, s_max, env_min[t,m], s_frac,
+                          policy_inf_p, policy_inf_idx, policy_rel_p, policy_rel_idx,
+                          Qreg_inf_pm, Qreg_rel_pm, s_pm, env_pm, spill_pm, E_pm)
             
-            # If at week t the inflow (I) is lower than the required environmental compensation (env_min), 
-            # then the environmental compensation (Qenv) = total inflows (natural + regulated). Otherwise Qenv = env_min.
-            if env_min[t,m] >= I[t,m] + Qreg_inf[t,m] :
-                env[t,m] = I[t,m] + Qreg_inf[t,m]
-            else:
-                env[t,m] = env_min[t,m]
-            # If the required environmental compensation is higher than the water resource available (s + I - E)
-            # then the environmental compensation is equal to the higher value between 0 and the resource available  
-            if env_min[t,m] >= s[t,m] - s_min + I[t,m] + Qreg_inf[t,m] - E[t,m]:
-                env[t,m] = np.array([0,s[t,m] - s_min + I[t,m] + Qreg_inf[t,m] - E[t,m]]).max()
-            else:
-                env[t,m] = env_min[t,m]
-            # If the regulated release (Qreg_rel) is higher than the water resource available (s + I - E - Qenv)
-            # then the release is equal to the lower value between the resource available and the pre-defined release (Qreg_rel)
-            Qreg_rel[t,m] = np.array([Qreg_rel[t,m], np.array([0,s[t,m] - s_min + I[t,m] + Qreg_inf[t,m] - E[t,m] - env[t,m]]).max()]).min()
-            # The spillage is equal to the higher value between 0 and the resource available exceeding the reservoir capacity
-            spill[t,m] = np.array([0,s[t,m] + I[t,m] + Qreg_inf[t,m] - Qreg_rel[t,m] - env[t,m] - E[t,m] - s_max]).max()
-            # The final storage (initial storage in the next step) is equal to the storage + inflow - outflows
-            s[t+1,m] = np.array([s_min,s[t,m] + I[t,m] + Qreg_inf[t,m] - Qreg_rel[t,m] - env[t,m] - E[t,m] - spill[t,m]]).max()
+    return env, spill, Qreg_rel_out, Qreg_inf_out, s, E
+
+mass_bal_batch_serial = serial_kernel(mass_bal_batch)
+
+### Objectives of the mass balance ###
+@njit(parallel = True, nogil = True, cache = True) # Numba decorator to speed-up the function below
+def mass_bal_obj(I, e, 
+                 s_ini, s_min, s_max, 
+                 env_min, d,
+                 Qreg_inf, Qreg_rel, 
+                 s_frac,
+                 policy_inf, policy_inf_idx,
+                 policy_rel, policy_rel_idx,
+                 c, cs):
+    """Objectives (see objective_names) of the mass balance of P candidate 
+    regulated flows or policy functions (stacked as in mass_bal_batch) for 
+    each of the M ensemble members - array (P,M,n_objectives) -. The 
+    objectives are accumulated time step by time step, so only the state of 
+    the current time step is stored. c is the pumping cost per unit volume of 
+    regulated inflow and cs the critical storage."""
+    T = I.shape[0] # number of time-steps
+    M = I.shape[1] # number of ensemble members
+    P = max(Qreg_inf.shape[0],Qreg_rel.shape[0],policy_inf.shape[0],policy_rel.shape[0])
+    values = np.zeros((P,M,n_objectives))
+    
+    for pm in prange(P*M):
+        p = pm // M # candidate
+        m = pm % M # ensemble member
+        # Inputs of the candidate (shared inputs have a single candidate)
+        Qreg_inf_p = Qreg_inf[min(p,Qreg_inf.shape[0]-1)]
+        Qreg_rel_p = Qreg_rel[min(p,Qreg_rel.shape[0]-1)]
+        policy_inf_p = policy_inf[min(p,policy_inf.shape[0]-1)]
+        policy_rel_p = policy_rel[min(p,policy_rel.shape[0]-1)]
+        m_inf = min(m,Qreg_inf_p.shape[1]-1)
+        m_rel = min(m,Qreg_rel_p.shape[1]-1)
+        # State of the current time step (element 0 of the outputs of 
+        # mass_bal_step) and storage at the end of the time step (s[1])
+        s = np.zeros(2,I.dtype)
+        env = np.zeros(1,I.dtype)
+        spill = np.zeros(1,I.dtype)
+        E = np.zeros(1,I.dtype)
+        Qreg_inf_t = np.zeros(1,I.dtype)
+        Qreg_rel_t = np.zeros(1,I.dtype)
+        
+        ### Initial conditions ###
+        s[0] = s_ini # initial storage
+        
+        SD = 0.0 # sum of squared supply deficits
+        RD = 0.0 # sum of resource deficits
+        Q_pump = 0.0 # sum of regulated (pumped) inflows
+        SV = max(0.0,cs - s_ini) # sum of critical storage violations (from s_ini)
+        for t in range(T): # Loop for each time-step
+            Qreg_inf_t[0] = Qreg_inf_p[t,m_inf]
+            Qreg_rel_t[0] = Qreg_rel_p[t,m_rel]
+            mass_bal_step(t, 0, I[t,m], e[t,m], s_min, s_max, env_min[t,m], s_frac,
+                          policy_inf_p, policy_inf_idx, policy_rel_p, policy_rel_idx,
+                          Qreg_inf_t, Qreg_rel_t, s, env, spill, E)
+            SD += max(0.0,d[t,m] - Qreg_rel_t[0])**2
+            RD += s_max - s[1]
+            Q_pump += Qreg_inf_t[0]
+            SV += max(0.0,cs - s[1])
+            s[0] = s[1] # initial storage of the next time step
+        
+        values[p,m,0] = SD/T # MSD
+        values[p,m,1] = RD/T # MRD
+        values[p,m,2] = c*Q_pump/T # MPC
+        values[p,m,3] = SD # TSD
+        values[p,m,4] = SV # CSV
+        values[p,m,5] = c*Q_pump # TPC
             
-    return env, spill, Qreg_rel, Qreg_inf, s, E
+    return values
 
+mass_bal_obj_serial = serial_kernel(mass_bal_obj)
 
-def res_sys_sim(I, e, s_ini, s_min, s_max, env_min, d, Qreg):
+def res_sys_sim(I, e, s_ini, s_min, s_max, env_min, d, Qreg, dtype = np.float64,
+                parallel = None):
     """ 
     The function extracts both regulated inflows (Qreg_inf) and regulated 
     releases (Qreg_rel) from Qreg. Both, Qreg_inf and Qreg_rel are processed 
@@ -191,26 +388,66 @@ def res_sys_sim(I, e, s_ini, s_min, s_max, env_min, d, Qreg):
     Comment: if the release scheduling is not predefined, the model 
     automatically will assume the releases equal to the water demand (Qreg_rel 
     = d)
+
+    The policy function lookups ('input' of an operating policy) correspond
+    to a uniform grid of storage fractions from 0 to 1, with a step derived
+    from their number of rows, e.g. 101 rows for a 0.01 step (see the s_step
+    input of the operating_policy functions). A lookup over a non-uniform
+    grid requires its storage fractions in the optional key 's_frac' of the
+    Qreg input.
+
+    The optional input dtype defines the floating point type of the 
+    simulation, np.float64 (default) or np.float32. With np.float32 all the 
+    inputs are converted and the outputs are stored in single precision, which 
+    halves memory use for large ensembles (relative differences with 
+    np.float64 are below 1e-5).
+    
+    The optional input parallel defines whether the ensemble members are 
+    simulated in parallel (True) or serially (False), e.g. when several 
+    simulations already run in parallel processes. By default (None) they are 
+    simulated in parallel if there is more than one member.
     
     """
     
+    # Floating point type, required environmental compensation flow and 
+    # demand - matrices (T,M) -
+    (I, e, s_ini, s_min, s_max, 
+     env_min, d) = read_inputs(I, e, s_ini, s_min, s_max, env_min, d, dtype)
+    
     # Time length
     T = I.shape[0] # number of time-steps
     # Inflow ensemble
     M = I.shape[1] # number of ensemble members
-    # Required environmental compensation flow
-    env_min = env_min + np.zeros([T,M])
-    # Required demand
-    d = d + np.zeros([T,M])
+    # Regulated flows and policy functions
+    (Qreg_inf, Qreg_rel, s_frac, 
+     policy_inf, policy_inf_idx, policy_rel, policy_rel_idx) = read_Qreg(Qreg, T, M, d, dtype)
+    
+    ### Run mass balance function ### 
+    if parallel is None:
+        parallel = M > 1
+    kernel = mass_bal_func if parallel else mass_bal_func_serial
+    env, spill, Qreg_rel, Qreg_inf, s, E = kernel(I, e, 
+                                                  s_ini, s_min, s_max, 
+                                                  env_min, d,
+                                                  Qreg_inf, Qreg_rel, 
+                                                  s_frac,
+                                                  policy_inf, policy_inf_idx,
+                                                  policy_rel, policy_rel_idx)
+
+    return env, spill, Qreg_rel, Qreg_inf, s, E
+
+def read_Qreg(Qreg, T, M, d, dtype = np.float64):
+    """This function extracts the regulated inflows and releases (scheduling 
+    or default values) and the policy functions (lookup tables and indices) 
+    from Qreg (see res_sys_sim). d is the demand - matrix (T,M) -."""
     # Regulated flows
-    Qreg_rel = np.zeros([T,M]) # we will define it through the mass balance simulation
-    Qreg_inf = np.zeros([T,M]) # we will define it through the mass balance simulation
+    Qreg_rel = np.zeros([T,M], dtype = dtype) # we will define it through the mass balance simulation
+    Qreg_inf = np.zeros([T,M], dtype = dtype) # we will define it through the mass balance simulation
     # Policy functions
-    s_step = 0.01
-    s_frac = np.arange(0,1+s_step,s_step) # storage fraction (from 0 to 1 with a 0.01 step)
-    policy_rel = np.zeros((1,1)) + np.nan # Regulated releases policy
+    s_frac = np.zeros(0, dtype = dtype) # storage fraction (empty: uniform grid from 0 to 1, see policy_lookup)
+    policy_rel = np.zeros((1,1), dtype = dtype) + np.nan # Regulated releases policy
     policy_rel_idx = np.zeros((1)) + np.nan # Regulated releases policy indices
-    policy_inf = np.zeros((1,1)) + np.nan # Regulated inflows policy
+    policy_inf = np.zeros((1,1), dtype = dtype) + np.nan # Regulated inflows policy
     policy_inf_idx = np.zeros((1)) + np.nan # Regulated inflows policy
         
     # Regulated releases
@@ -253,13 +490,213 @@ def res_sys_sim(I, e, s_ini, s_min, s_max, env_min, d, Qreg):
         policy_rel     = Qreg['rel_inf']['input']
         policy_rel_idx = Qreg['rel_inf']['index']  
            
-    ### Run mass balance function ### 
-    env, spill, Qreg_rel, Qreg_inf, s, E = mass_bal_func(I, e, 
-                                                         s_ini, s_min, s_max, 
-                                                         env_min, d,
-                                                         Qreg_inf, Qreg_rel, 
-                                                         s_frac,
-                                                         policy_inf, policy_inf_idx,
-                                                         policy_rel, policy_rel_idx)
+    # Storage fractions of a policy function lookup over a non-uniform grid
+    for key in ('releases','inflows','rel_inf'):
+        if Qreg[key] != [] and 's_frac' in Qreg[key]:
+            s_frac = np.asarray(Qreg[key]['s_frac'], dtype = dtype)
+           
+    Qreg_rel = np.asarray(Qreg_rel, dtype = dtype)
+    Qreg_inf = np.asarray(Qreg_inf, dtype = dtype)
+    policy_rel = np.asarray(policy_rel, dtype = dtype)
+    policy_inf = np.asarray(policy_inf, dtype = dtype)
+    
+    return Qreg_inf, Qreg_rel, s_frac, policy_inf, policy_inf_idx, policy_rel, policy_rel_idx
+    
+
+def res_sys_sim_batch(I, e, s_ini, s_min, s_max, env_min, d, Qreg, dtype = np.float64,
+                      parallel = True):
+    """ 
+    This function simulates the reservoir system (see res_sys_sim) for P 
+    candidate regulated flows (schedules) or operating policies at once, e.g. 
+    all the solutions of a generation of an optimisation algorithm, for each 
+    of the M members of the inflow ensemble. The P x M simulations run in a 
+    single compiled call (in parallel if parallel = True).
+    
+    Qreg has the same structure as in res_sys_sim, but each of its inputs is a 
+    stack of the P candidates along the first dimension:
+        'scheduling'                = array (P,T), (P,T,1) or (P,T,M)
+        'operating policy'          = array (P,n) or (P,n,1), where n is the
+                                      number of storage fractions
+        'variable operating policy' = array (P,n,n_periods) (the 'index' of 
+                                      the periods is shared)
+    
+    The outputs (env, spill, Qreg_rel, Qreg_inf, s, E) are arrays (P,T,M),
+    (P,T+1,M) for s, where [p] is equal to the corresponding output of 
+    res_sys_sim for the candidate p.
+    
+    Example (optimisation of the release scheduling, vars of P solutions):
+        Qreg = {'releases' : {'type'  : 'scheduling',
+                              'input' : np.array(X)}, # matrix (P,T)
+                'inflows'  : [],
+                'rel_inf'  : []}
+        env, spill, Qreg_rel, Qreg_inf, s, E = res_sys_sim_batch(I, e, s_ini, 
+                                s_min, s_max, env_min, d, Qreg)
+        MSD = np.mean(np.maximum(d - Qreg_rel,0)**2, axis = (1,2)) # vector (P,)
+    """
+    (I, e, s_ini, s_min, s_max, 
+     env_min, d) = read_inputs(I, e, s_ini, s_min, s_max, env_min, d, dtype)
+    T = I.shape[0] # number of time-steps
+    M = I.shape[1] # number of ensemble members
+    (Qreg_inf, Qreg_rel, s_frac, 
+     policy_inf, policy_inf_idx, policy_rel, policy_rel_idx) = read_Qreg_batch(Qreg, T, M, d, dtype)
+    
+    kernel = mass_bal_batch if parallel else mass_bal_batch_serial
+    env, spill, Qreg_rel, Qreg_inf, s, E = kernel(I, e, 
+                                                  s_ini, s_min, s_max, 
+                                                  env_min,
+                                                  Qreg_inf, Qreg_rel, 
+                                                  s_frac,
+                                                  policy_inf, policy_inf_idx,
+                                                  policy_rel, policy_rel_idx)
 
     return env, spill, Qreg_rel, Qreg_inf, s, E
+
+def read_Qreg_batch(Qreg, T, M, d, dtype = np.float64):
+    """This function extracts the regulated flows and policy functions (see 
+    read_Qreg) of the stacks of P candidates of Qreg (see res_sys_sim_batch) 
+    as 3-D arrays whose first dimension is the candidate. The default values 
+    are shared by all the candidates (first dimension of size 1)."""
+    (Qreg_inf, Qreg_rel, s_frac, 
+     policy_inf, policy_inf_idx, policy_rel, policy_rel_idx) = read_Qreg(Qreg, T, M, d, dtype)
+    
+    # Stacks of candidates (3-D arrays): the inputs of Qreg are stacked, the
+    # default values are shared by all the candidates
+    P = None
+    stacks = {}
+    for key in ('releases','inflows','rel_inf'):
+        if Qreg[key] != []:
+            x = np.asarray(Qreg[key]['input'], dtype = dtype)
+            if x.ndim == 2:
+                x = x[:,:,np.newaxis]
+            if P is not None and len(x) != P:
+                raise ValueError('all the inputs of Qreg must have the same number of candidates')
+            P = len(x)
+            stacks[key] = x
+
+    def stack(x, key, policy):
+        """3-D stack of the candidates of the input x, which comes from 
+        Qreg[key] if it is a stack of candidates"""
+        if key in stacks and (Qreg[key]['type'] != 'scheduling') == policy:
+            return stacks[key]
+        return x[np.newaxis]
+    
+    Qreg_rel = stack(Qreg_rel, 'releases', False)
+    Qreg_inf = stack(Qreg_inf, 'inflows', False)
+    policy_rel = stack(policy_rel, 'rel_inf' if 'rel_inf' in stacks else 'releases', True)
+    policy_inf = stack(policy_inf, 'rel_inf' if 'rel_inf' in stacks else 'inflows', True)
+    
+    return Qreg_inf, Qreg_rel, s_frac, policy_inf, policy_inf_idx, policy_rel, policy_rel_idx
+
+def res_sys_obj(I, e, s_ini, s_min, s_max, env_min, d, Qreg, objectives, c = 1, cs = 0,
+                dtype = np.float64, parallel = None):
+    """ 
+    This function computes objectives of the reservoir system simulation (see 
+    res_sys_sim) for each of the M ensemble members. The objectives are 
+    accumulated during the simulation, so the (T,M) outputs of res_sys_sim 
+    are not stored, which saves most of the memory traffic when the 
+    simulation is repeated many times (e.g. in an optimisation).
+    
+    objectives = name or list of names of the objectives:
+        'MSD' = mean squared supply deficit: mean of max(0,d(t)-Qreg_rel(t))^2
+        'MRD' = mean resource deficit: mean of s_max-s(t+1)
+        'MPC' = mean pumping cost: mean of c*Qreg_inf(t)
+        'TSD' = total squared supply deficit: sum of max(0,d(t)-Qreg_rel(t))^2
+        'CSV' = critical storage violation: sum of max(cs-s(t),0) over the 
+                T+1 storages, including s_ini (as in the Notebooks)
+        'TPC' = total pumping cost: sum of c*Qreg_inf(t)
+    c  = pumping cost per unit volume of regulated inflow (e.g. £/ML)
+    cs = critical storage (e.g. ML)
+    
+    The other inputs are those of res_sys_sim. The output is a matrix 
+    (M,number of objectives) with the objectives of each ensemble member, 
+    equal to those computed from the outputs of res_sys_sim.
+    
+    Example (average of the ensemble members, as in the Notebooks):
+        MSD, MRD = res_sys_obj(I, e, s_ini, s_min, s_max, env_min, d, Qreg, 
+                               ['MSD','MRD']).mean(axis = 0)
+    """
+    columns = objective_columns(objectives)
+    (I, e, s_ini, s_min, s_max, 
+     env_min, d) = read_inputs(I, e, s_ini, s_min, s_max, env_min, d, dtype)
+    T = I.shape[0] # number of time-steps
+    M = I.shape[1] # number of ensemble members
+    (Qreg_inf, Qreg_rel, s_frac, 
+     policy_inf, policy_inf_idx, policy_rel, policy_rel_idx) = read_Qreg(Qreg, T, M, d, dtype)
+    
+    # Single candidate (see mass_bal_obj)
+    if parallel is None:
+        parallel = M > 1
+    kernel = mass_bal_obj if parallel else mass_bal_obj_serial
+    values = kernel(I, e, 
+                    s_ini, s_min, s_max, 
+                    env_min, d,
+                    Qreg_inf[np.newaxis], Qreg_rel[np.newaxis], 
+                    s_frac,
+                    policy_inf[np.newaxis], policy_inf_idx,
+                    policy_rel[np.newaxis], policy_rel_idx,
+                    float(c), float(cs))
+    
+    return values[0][:,columns]
+
+def res_sys_obj_batch(I, e, s_ini, s_min, s_max, env_min, d, Qreg, objectives, c = 1, 
+                      cs = 0, dtype = np.float64, parallel = True):
+    """ 
+    This function computes the objectives (see res_sys_obj) of the reservoir 
+    system simulation of P candidate regulated flows or operating policies 
+    (stacked in Qreg as in res_sys_sim_batch) for each of the M ensemble 
+    members, in a single compiled call. The output is an array 
+    (P,M,number of objectives).
+    
+    Example (objectives of P solutions of the optimisation of the release 
+    scheduling, average of the ensemble members):
+        Qreg = {'releases' : {'type'  : 'scheduling',
+                              'input' : np.array(X)}, # matrix (P,T)
+                'inflows'  : [],
+                'rel_inf'  : []}
+        F = res_sys_obj_batch(I, e, s_ini, s_min, s_max, env_min, d, Qreg, 
+                              ['MSD','MRD']).mean(axis = 1) # matrix (P,2)
+    """
+    columns = objective_columns(objectives)
+    (I, e, s_ini, s_min, s_max, 
+     env_min, d) = read_inputs(I, e, s_ini, s_min, s_max, env_min, d, dtype)
+    T = I.shape[0] # number of time-steps
+    M = I.shape[1] # number of ensemble members
+    (Qreg_inf, Qreg_rel, s_frac, 
+     policy_inf, policy_inf_idx, policy_rel, policy_rel_idx) = read_Qreg_batch(Qreg, T, M, d, dtype)
+    
+    kernel = mass_bal_obj if parallel else mass_bal_obj_serial
+    values = kernel(I, e, 
+                    s_ini, s_min, s_max, 
+                    env_min, d,
+                    Qreg_inf, Qreg_rel, 
+                    s_frac,
+                    policy_inf, policy_inf_idx,
+                    policy_rel, policy_rel_idx,
+                    float(c), float(cs))
+    
+    return values[:,:,columns]
+
+def objective_columns(objectives):
+    """Columns of the objectives (name or list of names) in the results of 
+    mass_bal_obj"""
+    if isinstance(objectives,str):
+        objectives = [objectives]
+    for objective in objectives:
+        if objective not in objective_names:
+            raise ValueError('objective must be one of '+', '.join(objective_names))
+    return np.array([objective_names.index(objective) for objective in objectives])
+
+def read_inputs(I, e, s_ini, s_min, s_max, env_min, d, dtype = np.float64):
+    """This function converts the inputs of the reservoir system simulation 
+    to the floating point type dtype, and the environmental flow and the 
+    demand to matrices (T,M)"""
+    I = np.asarray(I, dtype = dtype)
+    e = np.asarray(e, dtype = dtype)
+    to_dtype = np.dtype(dtype).type
+    s_ini, s_min, s_max = to_dtype(s_ini), to_dtype(s_min), to_dtype(s_max)
+    T = I.shape[0] # number of time-steps
+    M = I.shape[1] # number of ensemble members
+    env_min = np.asarray(env_min + np.zeros([T,M]), dtype = dtype)
+    d = np.asarray(d + np.zeros([T,M]), dtype = dtype)
+    
+    return I, e, s_ini, s_min, s_max, env_min, d
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains a bounded cache of simulation results for optimisation
+objective functions. The results are indexed by the vector of decision
+variables and a fingerprint of the inputs of the simulation (e.g. forcing
+data and observations), so that repeated evaluations of the same solution,
+e.g. duplicated individuals in NSGAII or the re-simulation of the final
+solutions after the optimisation, cost a dictionary lookup instead of a full
+simulation. When the cache is full the least recently used result is
+discarded.
+
+Example, reservoir operating policy optimisation (see the Notebooks):
+
+    cache = sim_cache(maxsize = 5000)
+    fingerprint = data_fingerprint(I,e,d) # see HBV_state
+    def simulate(x): # returns env, spill, Qreg_rel, Qreg_inf, s, E
+        Qreg = ... # operating policy defined by the decision variables x
+        return res_sys_sim(I,e,s_ini,s_min,s_max,env_min,d,Qreg)
+    simulate_cached = cache.wrap(simulate,fingerprint)
+    problem.function = lambda x: objectives(*simulate_cached(x))
+    ...
+    outputs = [simulate_cached(x) for x in solutions] # no new simulations
+    print(cache.cache_info())
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+
+Licence: MIT
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+cache_info = namedtuple('cache_info',['hits','misses','maxsize','currsize'])
+
+class sim_cache:
+    """This class defines a least recently used (LRU) cache of simulation
+    results indexed by a vector of decision variables.
+
+     maxsize  = maximum number of results stored
+     decimals = optional, number of decimals the decision variables are
+                rounded to before indexing the results, so that near-identical
+                solutions share the same result (by default None, i.e. the
+                solutions must be identical)
+
+    The stored results are returned as they are, so they must not be
+    modified. The cache can be used by several threads, and when it is sent
+    to other processes (e.g. within the objective function) the copies start
+    empty.
+    """
+    def __init__(self,maxsize = 1024,decimals = None):
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.clear()
+
+    def key(self,x,fingerprint = ''):
+        """Index of the results of the decision variables x for the inputs
+        with the fingerprint provided (see HBV_state.data_fingerprint)"""
+        x = np.array(x, dtype = float).ravel()
+        if self.decimals is not None:
+            x = np.round(x,self.decimals)
+        x += 0.0 # -0.0 and 0.0 are the same solution
+        return (fingerprint,x.tobytes())
+
+    def get(self,key,default = None):
+        """Cached result of the key (see key) or default if it is not stored"""
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                self.results.move_to_end(key)
+                return self.results[key]
+            self.misses += 1
+            return default
+
+    def put(self,key,result):
+        """Stores the result of the key (see key)"""
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.maxsize:
+                self.results.popitem(last = False) # least recently used
+
+    def lookup(self,x,func,fingerprint = ''):
+        """Cached result of func(x), which is computed and stored if needed"""
+        key = self.key(x,fingerprint)
+        result = self.get(key,_missing)
+        if result is _missing:
+            result = func(x)
+            self.put(key,result)
+        return result
+
+    def wrap(self,func,fingerprint = ''):
+        """Returns a cached version of the function func(x)"""
+        def cached_func(x):
+            return self.lookup(x,func,fingerprint)
+        return cached_func
+
+    def cache_info(self):
+        """Number of hits and misses, maximum and current size of the cache"""
+        return cache_info(self.hits,self.misses,self.maxsize,len(self.results))
+
+    def clear(self):
+        """Removes all the results and resets the counters"""
+        self.lock = threading.Lock()
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def __getstate__(self):
+        # The copies sent to other processes start empty
+        return {'maxsize' : self.maxsize, 'decimals' : self.decimals}
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.clear()
+
+_missing = object() # marker of the results not stored in the cache
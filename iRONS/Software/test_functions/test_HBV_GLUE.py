@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the HBV_GLUE function
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from HBV_GLUE import HBV_GLUE, latin_hypercube
+else:
+    ### Function to test ###
+    from irons.Software.HBV_GLUE import HBV_GLUE, latin_hypercube
+
+from irons.Software.HBV_sim import HBV_sim, HBV_sim_batch
+from irons.Software.HBV_calibration import HBV_bounds
+from irons.Software.flow_metrics import flow_metrics
+
+### Inputs ###
+N = 365
+np.random.seed(0)
+P = np.random.gamma(0.8, 6, N)
+E = np.ones(N)*2
+area = 86
+Q_obs = HBV_sim(P, E, [2, 0.7, 300, 2, 0.3, 0.1, 0.02, 20, 3], 1, [100, 10, 20], area,
+                outputs = 'flow')
+
+### Testing functions ###
+def test_latin_hypercube():
+    X = latin_hypercube(50, [0, 10], [1, 20], np.random.RandomState(0))
+    # Expected output: one sample in each of the 50 intervals of each variable
+    assert_array_equal(np.sort(np.floor(X[:,0]*50)), np.arange(50))
+    assert_array_equal(np.sort(np.floor((X[:,1] - 10)*5)), np.arange(50))
+
+def test_HBV_GLUE():
+    n_samples, chunk_size, quantiles = 5000, 1000, (0.05, 0.5, 0.95)
+    top_vars, top_values, Q_quantiles, n_behavioural = HBV_GLUE(P, E, 1, area, Q_obs, n_samples,
+                                                                 'nse', 0.5, 10, quantiles,
+                                                                 chunk_size, seed = 1)
+    # Reference: all the simulations of the same samples stored in memory
+    rng = np.random.RandomState(1)
+    lower, upper = np.array(HBV_bounds).T
+    X = np.vstack([latin_hypercube(chunk_size, lower, upper, rng)
+                   for i in range(n_samples//chunk_size)])
+    Q_sim = HBV_sim_batch(P, E, X[:,3:12], X[:,0:3], 1, area)
+    nse = flow_metrics(Q_obs, 'nse')(Q_sim)[:,0]
+    best = np.argsort(-nse)[:10]
+    assert_array_equal(top_vars, X[best])
+    assert_allclose(top_values, nse[best], rtol = 1e-12)
+    behavioural = nse >= 0.5
+    assert n_behavioural == behavioural.sum()
+    # Weighted quantiles of the behavioural flows (within the resolution of
+    # the histograms)
+    weights = nse[behavioural] - 0.5
+    for t in range(N):
+        Q_t = Q_sim[t,behavioural]
+        order = np.argsort(Q_t)
+        cumulative = np.cumsum(weights[order])
+        Q_ref = Q_t[order][np.searchsorted(cumulative, np.array(quantiles)*cumulative[-1])]
+        assert_allclose(Q_quantiles[t], Q_ref, rtol = 0.05)
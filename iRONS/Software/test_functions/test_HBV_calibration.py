@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the HBV_calibration function
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from HBV_calibration import HBV_calibration, HBV_objective
+else:
+    ### Function to test ###
+    from irons.Software.HBV_calibration import HBV_calibration, HBV_objective
+
+from irons.Software.HBV_sim import HBV_sim
+from irons.Software.optimisation_termination import EarlyStopping
+
+### Inputs ###
+N = 730
+np.random.seed(0)
+P = np.random.gamma(0.8, 6, N)
+E = np.ones(N)*2
+area = 86
+Q_obs = HBV_sim(P, E, [2, 0.7, 300, 2, 0.3, 0.1, 0.02, 20, 3], 1, [100, 10, 20], area,
+                outputs = 'flow')
+
+### Testing functions ###
+# Same results for a given seed whatever the evaluator
+def test_parallel_evaluation():
+    results_low, results_high, solution, RMSE = HBV_calibration(P, E, 1, area, Q_obs, 'double', 
+                                                                100, 10, n_workers = 1,
+                                                                evaluator = 'process', seed = 1)
+    for n_workers, evaluator in [(2,'thread'),(2,'process'),(None,'batch')]:
+        outputs = HBV_calibration(P, E, 1, area, Q_obs, 'double', 100, 10, 
+                                  n_workers = n_workers, evaluator = evaluator, seed = 1)
+        assert_array_equal(outputs[0],results_low)
+        assert_array_equal(outputs[1],results_high)
+        assert_array_equal(outputs[2],solution)
+        assert_array_equal(outputs[3],RMSE)
+
+# Batch evaluation of a generation
+def test_batch_objective():
+    np.random.seed(2)
+    X = np.random.uniform([0, 0, 0, 0, 0.3, 1, 0, 0.05, 0.01, 0, 0, 1],
+                          [400, 100, 100, 7, 1, 2000, 100, 2, 1, 0.1, 100, 6], (20, 12))
+    for objective in ['all', 'low', 'high', 'double', ['nse', 'kge', 'log_rmse', 'bias', 'fdc_low']]:
+        auto_calibration = HBV_objective(P, E, 1, area, Q_obs, objective)
+        F = auto_calibration.batch(X)
+        # Test (each row is equal to the objectives of the corresponding solution)
+        assert_array_equal(F, [auto_calibration(x) for x in X])
+
+# Resume from a checkpoint
+def test_checkpoint(tmp_path):
+    outputs = HBV_calibration(P, E, 1, area, Q_obs, 'double', 200, 10, seed = 1)
+    checkpoint_file = str(tmp_path / 'calibration.json')
+    # Interrupted run (first 100 evaluations) and resumed run
+    HBV_calibration(P, E, 1, area, Q_obs, 'double', 100, 10, seed = 1,
+                    checkpoint_file = checkpoint_file, checkpoint_frequency = 50)
+    outputs_resumed = HBV_calibration(P, E, 1, area, Q_obs, 'double', 200, 10, seed = 2,
+                                      checkpoint_file = checkpoint_file)
+    for x, x_resumed in zip(outputs, outputs_resumed):
+        assert_array_equal(x_resumed, x)
+    # A checkpoint of another problem is not used
+    with pytest.raises(ValueError):
+        HBV_calibration(P, E, 1, area, Q_obs, 'all', 200, 10, checkpoint_file = checkpoint_file)
+
+# Resume a surrogate-assisted calibration from a checkpoint (the evaluated
+# solutions of the surrogate model are restored)
+def test_checkpoint_surrogate(tmp_path):
+    outputs = HBV_calibration(P, E, 1, area, Q_obs, 'all', 300, 10, seed = 1, surrogate = 3)
+    checkpoint_file = str(tmp_path / 'calibration.json')
+    # Interrupted run (first 150 evaluations) and resumed run
+    HBV_calibration(P, E, 1, area, Q_obs, 'all', 150, 10, seed = 1, surrogate = 3,
+                    checkpoint_file = checkpoint_file)
+    outputs_resumed = HBV_calibration(P, E, 1, area, Q_obs, 'all', 300, 10, seed = 2,
+                                      surrogate = 3, checkpoint_file = checkpoint_file)
+    for x, x_resumed in zip(outputs, outputs_resumed):
+        assert_array_equal(x_resumed, x)
+    # A checkpoint of the calibration without surrogate is not used
+    with pytest.raises(ValueError):
+        HBV_calibration(P, E, 1, area, Q_obs, 'all', 300, 10, checkpoint_file = checkpoint_file)
+
+# Early stopping at a target RMSE
+def test_early_stopping():
+    stopping = EarlyStopping(max_evaluations = 5000, target = [25]) # RMSE [ML]
+    results, solution, RMSE = HBV_calibration(P, E, 1, area, Q_obs, 'all', stopping, 20, seed = 1)
+    assert stopping.reason == 'target'
+    assert stopping.nfe < 5000
+    assert min(results) <= 25
+
+# Island model: same results for a given seed whatever the number of workers
+def test_islands():
+    outputs = HBV_calibration(P, E, 1, area, Q_obs, 'double', 100, 10, seed = 1,
+                              islands = 3, migration_interval = 40, n_workers = 1)
+    assert len(outputs[0]) == 10
+    # Numpy integer number of iterations
+    outputs_parallel = HBV_calibration(P, E, 1, area, Q_obs, 'double', np.int64(100), 10,
+                                       seed = 1, islands = 3, migration_interval = 40,
+                                       n_workers = 2)
+    for x, x_parallel in zip(outputs, outputs_parallel):
+        assert_array_equal(x_parallel, x)
+
+# Surrogate-assisted calibration: better RMSE with the same simulations
+def test_surrogate():
+    results, solution, RMSE = HBV_calibration(P, E, 1, area, Q_obs, 'all', 400, 10, seed = 1)
+    results_surrogate, solution, RMSE = HBV_calibration(P, E, 1, area, Q_obs, 'all', 400, 10,
+                                                        seed = 1, surrogate = 5)
+    assert min(results_surrogate) < min(results)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the HBV_catchments function
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at 
+Bristol University (2020).
+"""
+import numpy as np
+from numpy.testing import assert_array_equal
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    from HBV_sim import HBV_sim
+    from read_data import read_csv_data
+    ### Function to test ###
+    from HBV_catchments import HBV_sim_catchments
+else:
+    from irons.Software.HBV_sim import HBV_sim
+    from irons.Software.read_data import read_csv_data
+    ### Function to test ###
+    from irons.Software.HBV_catchments import HBV_sim_catchments
+
+# Test inputs
+path_hist_data = 'iRONS/Notebooks/B - Implementation/Inputs'
+name_hist_clim_file = 'hist_clim_data.csv'
+np.random.seed(5)
+catchments = [{'name'  : 'A',
+               'param' : [1.5, 0.6, 250, 2, 0.3, 0.1, 0.02, 20, 3],
+               'Case'  : 1,
+               'ini'   : [100, 5, 10],
+               'area'  : 10,
+               'P'     : np.random.gamma(0.6,6,365),
+               'ept'   : np.random.uniform(0,4,365)},
+              {'name'  : 'B',
+               'param' : [3.0, 0.4, 600, 5, 0.1, 0.5, 0.05, 50, 5],
+               'Case'  : 2,
+               'ini'   : [300, 0, 50],
+               'area'  : 2.9,
+               'folder_path' : path_hist_data,
+               'file_name'   : name_hist_clim_file}]
+
+### Testing functions ###
+def test_HBV_sim_catchments():
+    # Run the function to test
+    results = HBV_sim_catchments(catchments,n_workers = 2)
+    # Expected output
+    Q_A = HBV_sim(catchments[0]['P'],catchments[0]['ept'],catchments[0]['param'],
+                  catchments[0]['Case'],catchments[0]['ini'],catchments[0]['area'],
+                  outputs = 'flow')
+    dates_B,P_B = read_csv_data(path_hist_data,name_hist_clim_file,'Rain')
+    dates_B,ept_B = read_csv_data(path_hist_data,name_hist_clim_file,'PET')
+    Q_B = HBV_sim(P_B,ept_B,catchments[1]['param'],catchments[1]['Case'],
+                  catchments[1]['ini'],catchments[1]['area'],outputs = 'flow')
+    # Test
+    assert results['A'][0] is None
+    assert_array_equal(results['A'][1],Q_A)
+    assert_array_equal(results['B'][0],dates_B)
+    assert_array_equal(results['B'][1],Q_B)
+    assert_array_equal(HBV_sim_catchments(catchments,n_workers = 1)['B'][1],results['B'][1])
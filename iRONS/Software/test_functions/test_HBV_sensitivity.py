@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the HBV_sensitivity functions
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import numpy as np
+from numpy.testing import assert_allclose
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from HBV_sensitivity import (HBV_EET, HBV_VBSA, EET_sampling, EET_indices,
+                                 VBSA_sampling, VBSA_indices)
+else:
+    ### Function to test ###
+    from irons.Software.HBV_sensitivity import (HBV_EET, HBV_VBSA, EET_sampling, EET_indices,
+                                                VBSA_sampling, VBSA_indices)
+
+from irons.Software.HBV_sim import HBV_sim
+
+def ishigami(X):
+    return np.sin(X[:,0]) + 7*np.sin(X[:,1])**2 + 0.1*X[:,2]**4*np.sin(X[:,0])
+
+### Testing functions ###
+def test_EET_linear():
+    rng = np.random.RandomState(0)
+    lower, upper = np.array([0, 0, -1]), np.array([1, 10, 1])
+    X = EET_sampling(20, lower, upper, rng)
+    Y = X @ [3, -1, 0]
+    mi, sigma, mi_ci, sigma_ci = EET_indices(20, lower, upper, X, Y, 200, 0.05, rng)
+    # Expected output: elementary effects equal to coefficient x range
+    assert_allclose(mi, [3, 10, 0], atol = 1e-9)
+    assert_allclose(sigma, 0, atol = 1e-9)
+    assert_allclose(mi_ci, [[3, 10, 0], [3, 10, 0]], atol = 1e-9)
+
+def test_VBSA_ishigami():
+    rng = np.random.RandomState(0)
+    N = 20000
+    X = VBSA_sampling(N, [-np.pi]*3, [np.pi]*3, rng)
+    Si, STi, Si_ci, STi_ci = VBSA_indices(N, ishigami(X), 200, 0.05, rng)
+    # Expected output: analytical indices of the Ishigami function
+    assert_allclose(Si, [0.3139, 0.4424, 0], atol = 0.03)
+    assert_allclose(STi, [0.5576, 0.4424, 0.2437], atol = 0.03)
+    assert np.all(Si_ci[0] <= Si) and np.all(Si <= Si_ci[1])
+    assert np.all(STi_ci[0] <= STi) and np.all(STi <= STi_ci[1])
+
+def test_HBV_sensitivity():
+    N = 365
+    np.random.seed(0)
+    P = np.random.gamma(0.8, 6, N)
+    E = np.ones(N)*2
+    Q_obs = HBV_sim(P, E, [2, 0.7, 300, 2, 0.3, 0.1, 0.02, 20, 3], 1, [100, 10, 20], 86,
+                    outputs = 'flow')
+    mi, sigma, mi_ci, sigma_ci = HBV_EET(P, E, 1, 86, Q_obs, 20, n_boot = 100, seed = 1)
+    Si, STi, Si_ci, STi_ci = HBV_VBSA(P, E, 1, 86, Q_obs, 200, n_boot = 100, seed = 1,
+                                      chunk_size = 500)
+    for index, ci in [(mi, mi_ci), (sigma, sigma_ci), (Si, Si_ci), (STi, STi_ci)]:
+        assert index.shape == (12,) and ci.shape == (2, 12)
+        assert np.all(ci[0] <= index + 1e-12) and np.all(index <= ci[1] + 1e-12)
+    # Expected output: the field capacity (FC) is more influential than the
+    # initial storage of the upper zone (SUZ0)
+    assert mi[5] > mi[1] and STi[5] > STi[1]
@@ -6,16 +6,16 @@ Bristol University (2020).
 """
 
 import numpy as np
-from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_almost_equal, assert_array_equal, assert_allclose
 
 if __name__ == '__main__':
     import sys
     sys.path.append("..") # Adds higher directory to python modules path.
     ### Function to test ###
-    from HBV_sim import HBV_sim
+    from HBV_sim import HBV_sim, HBV_sim_batch, HBV_routing
 else:
     ### Function to test ###
-    from irons.Software.HBV_sim import HBV_sim
+    from irons.Software.HBV_sim import HBV_sim, HBV_sim_batch, HBV_routing
     
 # Test inptus
 P = np.array([10, 20, 15])
@@ -51,3 +51,124 @@ def test_FLUXES():
                      np.array([500. , 0.   , 0.         ])]
     # Test
     assert_array_almost_equal(FLUXES,FLUXES_expect)
+
+### Parity with the original (pure Python) time loop ###
+def HBV_loop_reference(P,ept,param,Case,ini):
+    # Pure Python time loop of the HBV model as implemented before HBV_kernel
+    BETA,LP,FC,PERC,K0,K1,K2,UZL = param[0:8]
+    N = len(ept)
+    SM = np.zeros(N+1); UZ = np.zeros(N+1); LZ = np.zeros(N+1)
+    SM[0],UZ[0],LZ[0] = ini
+    EA = np.zeros(N); R = np.zeros(N); RL = np.zeros(N)
+    Q0 = np.zeros(N); Q1 = np.zeros(N)
+    for t in range(N):
+        R[t]= P[t]*(SM[t]/FC)**BETA
+        SM_dummy = max(min(SM[t]+P[t]-R[t],FC),0)
+        R[t]=R[t]+ max(SM[t]+P[t]- R[t]-FC,0)+min(SM[t]+P[t]-R[t],0)
+        EA[t]=ept[t]*min(SM_dummy/(FC*LP),1)
+        SM[t+1] = max(min(SM_dummy-EA[t],FC),0)
+        EA[t]=EA[t]+ max(SM_dummy-EA[t]-FC,0)+min(SM_dummy-EA[t],0)
+        if Case==1:
+            Q0[t] = max(min(K1*UZ[t]+K0*max(UZ[t]-UZL,0),UZ[t]),0)
+            RL[t] = max(min(UZ[t]-Q0[t],PERC),0)
+        else:
+            RL[t]= max(min(PERC,UZ[t]),0)
+            Q0[t] = max(min(K1*UZ[t]+K0*max(UZ[t]-UZL,0),UZ[t]-RL[t]),0)
+        UZ[t+1] = UZ[t]+R[t]-Q0[t]-RL[t]
+        Q1[t] = max(min(K2*LZ[t],LZ[t]),0)
+        LZ[t+1] = LZ[t]+RL[t]-Q1[t]
+    # Flow routing of the total outflow, which reads the unrouted flows only
+    # (see HBV_routing)
+    MAXBAS = int(param[8])
+    Q = Q0 + Q1
+    x = np.arange(1,MAXBAS+1)
+    c = np.where(x <= (MAXBAS+1)/2, x/((MAXBAS+1)/2), (MAXBAS+1-x)/((MAXBAS+1)/2))
+    c = c/np.sum(c)
+    Q_sim = np.array(Q)
+    for t in range(MAXBAS-1,N):
+        Q_sim[t] = c[0]*Q[t-MAXBAS+1]
+        for i in range(1,MAXBAS):
+            Q_sim[t] += c[i]*Q[t-MAXBAS+1+i]
+    return Q_sim*area,[SM,UZ,LZ],[EA,R,RL,Q0*area,Q1*area]
+
+def test_parity():
+    np.random.seed(1)
+    P_long = np.random.gamma(0.6,6,1000)
+    ept_long = np.random.uniform(0,4,1000)
+    param_long = [1.5, 0.6, 250, 2, 0.3, 0.1, 0.02, 20, 3]
+    ini_long = [100, 5, 10]
+    for Case_long in [1,2]:
+        Q,STATES,FLUXES = HBV_sim(P_long,ept_long,param_long,Case_long,ini_long,area)
+        Q_ref,STATES_ref,FLUXES_ref = HBV_loop_reference(P_long,ept_long,param_long,
+                                                         Case_long,ini_long)
+        # Test (bit-for-bit)
+        assert_array_equal(Q,Q_ref)
+        for x, x_ref in zip(STATES+FLUXES,STATES_ref+FLUXES_ref):
+            assert_array_equal(x,x_ref)
+
+def test_batch():
+    np.random.seed(2)
+    P_long = np.random.gamma(0.6,6,500)
+    ept_long = np.random.uniform(0,4,500)
+    params = np.array([[1.5, 0.6, 250, 2, 0.3, 0.1, 0.02, 20, 3],
+                       [3.0, 0.4, 600, 5, 0.1, 0.5, 0.05, 50, 5],
+                       [0.5, 0.9, 100, 1, 1.0, 0.2, 0.01, 10, 1]])
+    ini_batch = np.array([[100, 5, 10],[300, 0, 50],[50, 20, 0]])
+    for Case_batch in [1,2]:
+        Q_batch = HBV_sim_batch(P_long,ept_long,params,ini_batch,Case_batch,area)
+        # Test (each column is equal to the corresponding HBV_sim simulation)
+        for k in range(params.shape[0]):
+            Q_k = HBV_sim(P_long,ept_long,params[k],Case_batch,ini_batch[k],area)[0]
+            assert_array_equal(Q_batch[:,k],Q_k)
+
+def test_ensemble():
+    np.random.seed(3)
+    P_ens = np.random.gamma(0.6,6,(200,4))
+    ept_ens = np.random.uniform(0,4,(200,4))
+    param_ens = [1.5, 0.6, 250, 2, 0.3, 0.1, 0.02, 20, 3]
+    ini_ens = [100, 5, 10]
+    Q_ens,STATES_ens,FLUXES_ens = HBV_sim(P_ens,ept_ens,param_ens,Case,ini_ens,area)
+    # Test (each column is equal to the simulation of the corresponding member)
+    for m in range(P_ens.shape[1]):
+        Q_m,STATES_m,FLUXES_m = HBV_sim(P_ens[:,m],ept_ens[:,m],param_ens,Case,ini_ens,area)
+        assert_array_equal(Q_ens[:,m],Q_m)
+        for x_ens, x_m in zip(STATES_ens+FLUXES_ens,STATES_m+FLUXES_m):
+            assert_array_equal(x_ens[:,m],x_m)
+
+def test_routing():
+    # An impulse is spread over MAXBAS time steps with triangular weights
+    Q_impulse = np.zeros((8,2))
+    Q_impulse[3,:] = 1
+    Q_routed = HBV_routing(Q_impulse,3)
+    # Expected output
+    Q_routed_expect = np.array([0, 0, 0, 0.25, 0.5, 0.25, 0, 0])
+    # Test 
+    assert_array_almost_equal(Q_routed[:,0],Q_routed_expect)
+    assert_array_almost_equal(Q_routed[:,1],Q_routed_expect)
+    assert_array_equal(Q_impulse[:,0],[0, 0, 0, 1, 0, 0, 0, 0]) # input is not modified
+
+def test_outputs():
+    # Lean output modes return the same results as the default mode
+    Q_flow = HBV_sim(P,ept,param,Case,ini,area,outputs = 'flow')
+    Q_states,STATES_states = HBV_sim(P,ept,param,Case,ini,area,outputs = 'states')
+    # Test
+    assert_array_equal(Q_flow,Q)
+    assert_array_equal(Q_states,Q)
+    assert_array_equal(STATES_states,STATES)
+
+def test_float32():
+    # Single precision simulation: relative tolerance of 1e-5 with respect to
+    # the double precision simulation
+    np.random.seed(6)
+    P_ens = np.random.gamma(0.6,6,(3650,3))
+    ept_ens = np.random.uniform(0,4,(3650,3))
+    param_f = [1.5, 0.6, 250, 2, 0.3, 0.1, 0.02, 20, 3]
+    ini_f = [100, 5, 10]
+    Q_64,STATES_64,FLUXES_64 = HBV_sim(P_ens,ept_ens,param_f,Case,ini_f,area)
+    Q_32,STATES_32,FLUXES_32 = HBV_sim(P_ens,ept_ens,param_f,Case,ini_f,area,dtype = np.float32)
+    # Test
+    assert Q_32.dtype == np.float32
+    assert_allclose(Q_32,Q_64,rtol = 1e-5,atol = 1e-5*np.max(Q_64))
+    for x_32, x_64 in zip(STATES_32+FLUXES_32,STATES_64+FLUXES_64):
+        assert x_32.dtype == np.float32
+        assert_allclose(x_32,x_64,rtol = 1e-5,atol = 1e-5*np.max(x_64))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the HBV_state functions
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at 
+Bristol University (2020).
+"""
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.testing import assert_array_equal, assert_array_almost_equal
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from HBV_sim import HBV_sim
+    from HBV_state import HBV_state, HBV_sim_state, HBV_checkpoints, HBV_stream
+else:
+    ### Function to test ###
+    from irons.Software.HBV_sim import HBV_sim
+    from irons.Software.HBV_state import HBV_state, HBV_sim_state, HBV_checkpoints, HBV_stream
+
+# Test inputs
+np.random.seed(4)
+dates = pd.date_range(start = '2000-01-01', end = '2001-12-31', freq = 'D')
+P = np.random.gamma(0.6,6,dates.size)
+ept = np.random.uniform(0,4,dates.size)
+param = [1.5, 0.6, 250, 2, 0.3, 0.1, 0.02, 20, 4]
+Case = 1
+ini = [100, 5, 10]
+area = 10
+# Run the function to test
+Q,[SM,UZ,LZ] = HBV_sim(P,ept,param,Case,ini,area,outputs = 'states')
+
+### Testing functions ###
+def test_HBV_sim_state():
+    # Simulation of the period in two consecutive calls
+    state_0 = HBV_state(ini[0],ini[1],ini[2])
+    Q_1,state_1 = HBV_sim_state(P[:100],ept[:100],param,Case,state_0,area)
+    Q_2,state_2 = HBV_sim_state(P[100:],ept[100:],param,Case,
+                                HBV_state.from_dict(state_1.to_dict()),area)
+    # Test
+    assert_array_almost_equal(np.concatenate([Q_1,Q_2]),Q)
+    assert_array_equal(state_2.ini,[SM[-1],UZ[-1],LZ[-1]])
+
+def test_HBV_checkpoints():
+    date = pd.Timestamp('2001-06-15')
+    i = dates.searchsorted(date)
+    with tempfile.TemporaryDirectory() as folder_path:
+        checkpoints = HBV_checkpoints(folder_path)
+        state = checkpoints.warmup(dates,P,ept,param,Case,ini,area,date)
+        # A new session resumes from the checkpoints saved in the folder
+        checkpoints = HBV_checkpoints(folder_path)
+        state_resumed = checkpoints.warmup(dates,P,ept,param,Case,ini,area,date + pd.Timedelta(days = 10))
+        # Test
+        assert len(checkpoints.checkpoints[list(checkpoints.checkpoints)[0]]) == 19 # 17 months + 2 dates
+        assert_array_equal(state.ini,[SM[i],UZ[i],LZ[i]])
+        assert_array_equal(state_resumed.ini,[SM[i+10],UZ[i+10],LZ[i+10]])
+
+def test_HBV_checkpoints_period():
+    with tempfile.TemporaryDirectory() as folder_path:
+        checkpoints = HBV_checkpoints(folder_path)
+        # Dates out of the period of the forcing data: no state is simulated
+        # or saved
+        for date in [dates[0] - pd.Timedelta(days = 1), dates[-1] + pd.Timedelta(days = 2)]:
+            with pytest.raises(ValueError):
+                checkpoints.warmup(dates,P,ept,param,Case,ini,area,date)
+        assert os.listdir(folder_path) == []
+        # End of the last time step
+        state = checkpoints.warmup(dates,P,ept,param,Case,ini,area,
+                                   dates[-1] + pd.Timedelta(days = 1))
+        assert_array_equal(state.ini,[SM[-1],UZ[-1],LZ[-1]])
+
+def test_HBV_stream():
+    # Daily updates
+    model = HBV_stream(param,Case,ini,area,dates[0])
+    Q_daily = np.array([model.step(P[t],ept[t])[0] for t in range(30)])
+    # Chunks of forcing data
+    chunks = [(P[t:t+50],ept[t:t+50]) for t in range(30,dates.size,50)]
+    Q_chunks = np.concatenate(list(model.run(chunks)))
+    # Test
+    assert_array_almost_equal(np.concatenate([Q_daily,Q_chunks]),Q)
+    assert_array_equal(model.state.ini,[SM[-1],UZ[-1],LZ[-1]])
+    assert model.state.date == dates[-1] + pd.Timedelta(days = 1)
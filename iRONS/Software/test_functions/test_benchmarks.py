@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the benchmarks runner
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+from irons.Software.benchmarks.run_benchmarks import find_benchmarks, param_cases, run_benchmarks
+from irons.Software.benchmarks.bench_res_sys_sim import ResSysSim
+
+### Testing functions ###
+def test_param_cases():
+    cases = param_cases(ResSysSim)
+    # Expected output: all the combinations of Qreg types, T and M
+    assert len(cases) == 5*3*3
+    assert cases[0] == ('demand', 52, 1)
+
+def test_run_benchmarks():
+    names = [name for name, cls, method_name in find_benchmarks()]
+    # Each benchmark class has a time and a peak memory benchmark
+    assert len(names) == 2*len(set(name.rsplit('.',1)[0] for name in names))
+    results = run_benchmarks('Cum2Inst|ResSysSim', quick = True, verbose = False)
+    assert sorted(results) == ['bench_data.Cum2Inst.peakmem_cum2inst',
+                               'bench_data.Cum2Inst.time_cum2inst',
+                               'bench_res_sys_sim.ResSysSim.peakmem_res_sys_sim',
+                               'bench_res_sys_sim.ResSysSim.time_res_sys_sim']
+    for values in results.values():
+        assert len(values) == 1 # only the first case
+        assert all(value >= 0 for value in values.values())
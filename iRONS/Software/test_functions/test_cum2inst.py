@@ -26,4 +26,12 @@ def test_cum2inst():
     # Expected output
     ins_rain_expect = np.array([[10], [10], [0]])
     # Test 
-    assert_array_almost_equal(ins_rain,ins_rain_expect)
\ No newline at end of file
+    assert_array_almost_equal(ins_rain,ins_rain_expect)
+
+def test_cum2inst_float32():
+    # Expected output
+    ins_rain_expect = np.array([[10], [10], [0]])
+    # Test (single precision)
+    ins_rain_32 = cum2inst(cum_rain,dtype = np.float32)
+    assert ins_rain_32.dtype == np.float32
+    assert_array_almost_equal(ins_rain_32,ins_rain_expect)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the flow_metrics class
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from flow_metrics import flow_metrics, metric_names
+else:
+    ### Function to test ###
+    from irons.Software.flow_metrics import flow_metrics, metric_names
+
+### Inputs ###
+T = 1000
+np.random.seed(0)
+Q_obs = np.random.gamma(2, 50, T)
+Q_sims = np.abs(Q_obs[:,np.newaxis]*np.random.uniform(0.7, 1.3, (T, 5)) +
+                np.random.normal(0, 5, (T, 5)))
+
+def reference(Q_sim, Q_obs):
+    """Metrics computed with numpy, one at a time"""
+    e = Q_sim - Q_obs
+    low, high = Q_obs < np.median(Q_obs), Q_obs > np.median(Q_obs)
+    r = np.corrcoef(Q_sim, Q_obs)[0,1]
+    alpha, beta = Q_sim.std()/Q_obs.std(), Q_sim.mean()/Q_obs.mean()
+    eps = 0.01*Q_obs.mean()
+    fdc_sim, fdc_obs = np.sort(Q_sim)[::-1], np.sort(Q_obs)[::-1]
+    return [np.sqrt((e**2).mean()),
+            np.sqrt((e[low]**2).mean()),
+            np.sqrt((e[high]**2).mean()),
+            1 - (e**2).sum()/((Q_obs - Q_obs.mean())**2).sum(),
+            1 - np.sqrt((r - 1)**2 + (alpha - 1)**2 + (beta - 1)**2),
+            np.sqrt(((np.log(Q_sim + eps) - np.log(Q_obs + eps))**2).mean()),
+            100*(Q_sim.sum() - Q_obs.sum())/Q_obs.sum()] + \
+           [np.sqrt(((fdc_sim[i0:i1] - fdc_obs[i0:i1])**2).mean())
+            for i0, i1 in [(0, 20), (200, 700), (700, 1000)]]
+
+### Testing functions ###
+def test_metrics():
+    metrics = flow_metrics(Q_obs, metric_names)
+    values = metrics(Q_sims)
+    assert values.shape == (5, len(metric_names))
+    for k in range(5):
+        # Test (same values as numpy; a single simulation gives the same
+        # values as a column of the batch)
+        assert_allclose(values[k], reference(Q_sims[:,k], Q_obs), rtol = 1e-10)
+        assert_array_equal(metrics(Q_sims[:,k]), values[k])
+
+def test_selection_and_loss():
+    metrics = flow_metrics(Q_obs, ['bias', 'kge', 'rmse'])
+    values = metrics(Q_sims)
+    assert_array_equal(values, flow_metrics(Q_obs, metric_names)(Q_sims)[:,[6, 4, 0]])
+    # Test (values to minimise)
+    assert_array_equal(metrics.loss(Q_sims), np.column_stack([np.abs(values[:,0]),
+                                                              1 - values[:,1], values[:,2]]))
+    # Perfect fit
+    assert_allclose(flow_metrics(Q_obs, metric_names).loss(Q_obs), 0, atol = 1e-12)
+    with pytest.raises(ValueError):
+        flow_metrics(Q_obs, 'r2')
+
+# Observed flows with no low flows (ephemeral river) and constant
+def test_zero_denominators():
+    Q_obs_ephemeral = np.array([0,0,0,0,0,0,1,2,3,4.])
+    Q_obs_constant = 5 + np.zeros(10)
+    for Q_obs_test in [Q_obs_ephemeral, Q_obs_constant]:
+        metrics = flow_metrics(Q_obs_test, metric_names)
+        # Test (single simulation and batch, the undefined metrics are nan)
+        values = metrics(np.ones(10))
+        assert_array_equal(metrics(np.ones((10, 2))), [values, values])
+        assert_allclose(flow_metrics(Q_obs_test, 'rmse')(np.ones(10)),
+                        np.sqrt(((1 - Q_obs_test)**2).mean()))
+    assert np.isnan(values[metric_names.index('nse')])
+    assert np.isnan(flow_metrics(Q_obs_ephemeral, 'rmse_low')(np.ones(10)))
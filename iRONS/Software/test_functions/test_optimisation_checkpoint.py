@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the optimisation_checkpoint functions
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import random
+import numpy as np
+from platypus import NSGAII, Problem, Real, Archive
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from optimisation_checkpoint import run_checkpointed, rng_state
+else:
+    ### Function to test ###
+    from irons.Software.optimisation_checkpoint import run_checkpointed, rng_state
+
+def two_objectives(vars):
+    return [vars[0]**2 + vars[1], (vars[0]-2)**2 + np.random.rand()]
+
+def optimisation():
+    problem = Problem(2,2)
+    problem.types[:] = [Real(-5,5), Real(0,1)]
+    problem.function = two_objectives
+    return NSGAII(problem,20,archive = Archive())
+
+### Testing functions ###
+def test_run_checkpointed(tmp_path):
+    file_path = str(tmp_path / 'checkpoints' / 'optimisation.json')
+    random.seed(3); np.random.seed(3)
+    algorithm = optimisation()
+    algorithm.run(400)
+    state = rng_state()
+    # Interrupted and resumed run (another session: other random states)
+    random.seed(3); np.random.seed(3)
+    run_checkpointed(optimisation(),200,file_path)
+    random.seed(4); np.random.seed(4)
+    algorithm_resumed = run_checkpointed(optimisation(),400,file_path)
+    # Expected output: same population, archive and random states
+    assert algorithm_resumed.nfe == algorithm.nfe
+    for s, s_resumed in [(algorithm.population,algorithm_resumed.population),
+                         (algorithm.archive,algorithm_resumed.archive)]:
+        assert [x.variables[:] for x in s_resumed] == [x.variables[:] for x in s]
+        assert [x.objectives[:] for x in s_resumed] == [x.objectives[:] for x in s]
+    assert rng_state() == state
+    # Completed run (int or numpy integer budget): nothing else is evaluated
+    assert run_checkpointed(optimisation(),400,file_path).nfe == 400
+    assert run_checkpointed(optimisation(),np.int64(400),file_path).nfe == 400
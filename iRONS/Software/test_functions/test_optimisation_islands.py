@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the optimisation_islands functions
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import numpy as np
+from platypus import Problem, Real, Solution
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from optimisation_islands import run_islands, elites
+else:
+    ### Function to test ###
+    from irons.Software.optimisation_islands import run_islands, elites
+
+def two_objectives(vars):
+    return [vars[0]**2 + vars[1], (vars[0]-2)**2 + vars[1]]
+
+def problem():
+    problem = Problem(2,2)
+    problem.types[:] = [Real(-5,5), Real(0,1)]
+    problem.function = two_objectives
+    return problem
+
+### Testing functions ###
+def test_elites():
+    solutions = []
+    for x in [[0,0],[1,0],[2,0],[1,0.5],[1,0.5],[3,1]]:
+        solution = Solution(problem())
+        solution.variables[:] = x
+        solution.evaluate()
+        solutions.append(solution)
+    # Expected output: the non-dominated solutions and then the best of the
+    # dominated ones, without duplicates
+    best = elites(solutions,4)
+    assert sorted(s.variables[:] for s in best[:3]) == [[0,0],[1,0],[2,0]]
+    assert best[3].variables[:] == [1,0.5]
+
+def test_run_islands():
+    solutions = run_islands(problem(),20,400,islands = 3,migration_interval = 100,
+                            migration_size = 2,n_workers = 1,seed = 1)
+    assert len(solutions) == 20
+    # Expected output: Pareto front (0 <= x <= 2 and y = 0)
+    x = np.array([s.variables[:] for s in solutions])
+    assert np.all((x[:,0] > -0.1) & (x[:,0] < 2.1))
+    assert np.all(x[:,1] < 0.05)
+    # Same results for a given seed
+    solutions_seed = run_islands(problem(),20,400,islands = 3,migration_interval = 100,
+                                 migration_size = 2,n_workers = 1,seed = 1)
+    assert [s.variables[:] for s in solutions_seed] == [s.variables[:] for s in solutions]
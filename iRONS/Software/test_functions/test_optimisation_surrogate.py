@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the optimisation_surrogate functions
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import random
+import numpy as np
+from numpy.testing import assert_allclose
+from platypus import NSGAII, Problem, Real
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from optimisation_surrogate import RBF_surrogate, SurrogateNSGAII
+    from optimisation_termination import hypervolume
+else:
+    ### Function to test ###
+    from irons.Software.optimisation_surrogate import RBF_surrogate, SurrogateNSGAII
+    from irons.Software.optimisation_termination import hypervolume
+
+def zdt1(vars):
+    x = np.array(vars)
+    g = 1 + 9*x[1:].mean()
+    return [x[0], g*(1 - np.sqrt(x[0]/g))]
+
+def problem():
+    problem = Problem(6,2)
+    problem.types[:] = [Real(0,1)]*6
+    problem.function = zdt1
+    return problem
+
+### Testing functions ###
+def test_RBF_surrogate():
+    np.random.seed(0)
+    X = np.random.uniform([0, -5], [1, 5], (50, 2))
+    F = np.column_stack([np.sin(3*X[:,0]) + X[:,1]**2, 2*X[:,0] - X[:,1]])
+    surrogate = RBF_surrogate([0, -5], [1, 5]).fit(np.vstack([X, X[:5]]), np.vstack([F, F[:5]]))
+    # Expected output: interpolation of the points (duplicated points are
+    # ignored), exact linear functions and close approximation elsewhere
+    assert_allclose(surrogate.predict(X), F, atol = 1e-8)
+    X_new = np.random.uniform([0.1, -4], [0.9, 4], (20, 2))
+    F_new = surrogate.predict(X_new)
+    assert_allclose(F_new[:,1], 2*X_new[:,0] - X_new[:,1], atol = 1e-8)
+    assert_allclose(F_new[:,0], np.sin(3*X_new[:,0]) + X_new[:,1]**2, atol = 0.5)
+
+def test_SurrogateNSGAII():
+    hypervolumes = []
+    for algorithm_class in [NSGAII, SurrogateNSGAII]:
+        random.seed(0); np.random.seed(0)
+        algorithm = algorithm_class(problem(), 20)
+        algorithm.run(600)
+        assert algorithm.nfe == 600 # only real function evaluations
+        F = np.array([s.objectives[:] for s in algorithm.result])
+        hypervolumes.append(hypervolume(F, [1.1, 11]))
+    # Expected output: better Pareto front with the same function evaluations
+    assert hypervolumes[1] > hypervolumes[0]
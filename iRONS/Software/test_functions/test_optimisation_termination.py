@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the optimisation_termination functions
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import random
+import numpy as np
+import pytest
+from platypus import NSGAII, Problem, Real
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from optimisation_termination import EarlyStopping, hypervolume
+else:
+    ### Function to test ###
+    from irons.Software.optimisation_termination import EarlyStopping, hypervolume
+
+def two_objectives(vars):
+    return [vars[0]**2, (vars[0]-2)**2]
+
+def optimisation():
+    random.seed(1); np.random.seed(1)
+    problem = Problem(1,2)
+    problem.types[:] = [Real(-5,5)]
+    problem.function = two_objectives
+    return NSGAII(problem,20)
+
+### Testing functions ###
+def test_hypervolume():
+    # Expected output: area of the union of the rectangles
+    assert hypervolume([[1,3],[2,2],[3,1]],[4,4]) == 6
+    assert hypervolume([[1,3],[2,2],[3,1],[3,3],[5,0]],[4,4]) == 6 # dominated or outside
+    assert hypervolume([[1,1,1]],[2,3,4]) == 6
+    assert hypervolume([[0,1,1],[1,0,1],[1,1,0]],[2,2,2]) == 3*2 - 3*1 + 1
+    assert hypervolume([[3]],[4]) == 1
+    assert hypervolume(np.zeros((0,2)),[4,4]) == 0
+
+def test_max_evaluations():
+    stopping = EarlyStopping(max_evaluations = 200)
+    algorithm = optimisation()
+    algorithm.run(stopping)
+    assert stopping.reason == 'max_evaluations'
+    assert stopping.nfe == algorithm.nfe == 200
+
+def test_target():
+    stopping = EarlyStopping(max_evaluations = 10000,target = [1,1.5])
+    algorithm = optimisation()
+    algorithm.run(stopping)
+    assert stopping.reason == 'target'
+    assert stopping.nfe < 10000
+    assert any(s.objectives[0] <= 1 and s.objectives[1] <= 1.5 for s in algorithm.population)
+
+@pytest.mark.parametrize('metric', ['objectives', 'hypervolume'])
+def test_stagnation(metric):
+    stopping = EarlyStopping(max_evaluations = 20000,window = 5,metric = metric)
+    algorithm = optimisation()
+    algorithm.run(stopping)
+    # Expected output: the Pareto front (0 <= x <= 2) is found well before
+    # the maximum number of function evaluations
+    assert stopping.reason == 'stagnation'
+    assert stopping.nfe < 20000
+    assert len(stopping.history) == 6
+
+def test_max_time():
+    stopping = EarlyStopping(max_time = 0)
+    optimisation().run(stopping)
+    assert stopping.reason == 'max_time'
+    assert stopping.nfe == 0
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the precompile function and the on-disk cache of
+the Numba kernels
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+
+if __name__ == '__main__':
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from precompile import precompile
+    from flow_metrics import flow_metrics, metric_names, metrics_kernel_serial
+else:
+    ### Function to test ###
+    from irons.Software.precompile import precompile
+    from irons.Software.flow_metrics import flow_metrics, metric_names, metrics_kernel_serial
+
+# Script of a new process: time of the precompilation and cache statistics
+# of the kernels
+startup = '''
+import json, time
+start = time.perf_counter()
+from irons.Software.precompile import precompile
+from irons.Software.cum2inst import cum2inst_kernel
+from irons.Software.flow_metrics import metrics_kernel, metrics_kernel_serial
+import numpy as np
+precompile(['cum2inst', 'flow_metrics'], (np.float64,))
+kernels = [cum2inst_kernel, metrics_kernel, metrics_kernel_serial]
+print(json.dumps({'time'   : time.perf_counter() - start,
+                  'hits'   : [sum(k.stats.cache_hits.values()) for k in kernels],
+                  'misses' : [sum(k.stats.cache_misses.values()) for k in kernels]}))
+'''
+
+def run_startup(cache_dir):
+    env = dict(os.environ, NUMBA_CACHE_DIR = str(cache_dir))
+    output = subprocess.run([sys.executable, '-c', startup], env = env, check = True,
+                            stdout = subprocess.PIPE, universal_newlines = True).stdout
+    return json.loads(output.splitlines()[-1])
+
+### Testing functions ###
+def test_serial_kernel():
+    # The serial kernel is cached under its own name
+    assert metrics_kernel_serial.py_func.__qualname__ == 'metrics_kernel_serial'
+    # Expected output: same metrics with the serial (single simulation) and
+    # parallel kernels
+    np.random.seed(12)
+    Q_obs = np.random.uniform(1,10,50)
+    Q_sim = np.random.uniform(1,10,(50,3))
+    metrics = flow_metrics(Q_obs, metric_names)
+    values = metrics(Q_sim)
+    for k in range(3):
+        assert_allclose(metrics(Q_sim[:,k]), values[k])
+
+def test_precompile_unknown_tool():
+    with pytest.raises(ValueError):
+        precompile(['HBV_calibration'])
+
+def test_startup_time(tmp_path):
+    # First process: the kernels are compiled and saved in the cache
+    first = run_startup(tmp_path)
+    assert sum(first['misses']) > 0
+    # New process: the kernels are loaded from the cache (no compilation)
+    second = run_startup(tmp_path)
+    assert second['misses'] == [0, 0, 0]
+    assert all(hits > 0 for hits in second['hits'])
+    assert second['time'] < first['time']/2
@@ -6,16 +6,20 @@ Bristol University (2020).
 """
 import pandas as pd
 import numpy as np
-from numpy.testing import assert_array_equal
+import pytest
+from numpy.testing import assert_array_equal, assert_allclose
 
 if __name__ == '__main__':
     import sys
     sys.path.append("..") # Adds higher directory to python modules path.
     ### Function to test ###
-    from res_sys_sim import res_sys_sim
+    from res_sys_sim import res_sys_sim, res_sys_sim_batch, res_sys_obj, res_sys_obj_batch
+    from operating_policy import op_piecewiselin_1res, storage_fractions
 else:
     ### Function to test ###
-    from irons.Software.res_sys_sim import res_sys_sim
+    from irons.Software.res_sys_sim import (res_sys_sim, res_sys_sim_batch, 
+                                           res_sys_obj, res_sys_obj_batch)
+    from irons.Software.operating_policy import op_piecewiselin_1res, storage_fractions
     
 ### Inputs ###
 N = 10
@@ -60,4 +64,162 @@ def test_Qspill():
     # Expected output
     spill_expect = np.array([0.,0.,34.,38.,38.,38.,38.,38.,38.,38.]).reshape(10,1)
     # Test 
-    assert_array_equal(spill,spill_expect)
\ No newline at end of file
+    assert_array_equal(spill,spill_expect)
+# Single precision simulation
+def test_float32():
+    np.random.seed(7)
+    I_ens = np.random.uniform(0,20,(N,50))
+    e_ens = np.random.uniform(0,2,(N,50))
+    outputs_64 = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg)
+    outputs_32 = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg, 
+                             dtype = np.float32)
+    # Test (relative tolerance of 1e-5 with respect to double precision)
+    for x_32, x_64 in zip(outputs_32,outputs_64):
+        assert x_32.dtype == np.float32
+        assert_allclose(x_32,x_64,rtol = 1e-5,atol = 1e-5*s_max)
+
+# Parallel and serial simulation of the ensemble members
+def test_parallel():
+    np.random.seed(8)
+    I_ens = np.random.uniform(0,20,(N,50))
+    e_ens = np.random.uniform(0,2,(N,50))
+    policy = np.linspace(4,12,101).reshape(101,1)
+    Qreg_policy = {'releases' : {'type' : 'operating policy', 'input' : policy},
+                   'inflows'  : [],
+                   'rel_inf'  : []}
+    for Qreg_test in [Qreg, Qreg_policy]:
+        outputs = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_test,
+                              parallel = True)
+        outputs_serial = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_test,
+                                     parallel = False)
+        # Test (same results, and each member equal to its own simulation)
+        for x, x_serial in zip(outputs, outputs_serial):
+            assert_array_equal(x, x_serial)
+        outputs_member = res_sys_sim(I_ens[:,[3]], e_ens[:,[3]], s_ini, s_min, s_max, env_min,
+                                     d, Qreg_test)
+        for x, x_member in zip(outputs, outputs_member):
+            assert_array_equal(x[:,[3]], x_member)
+
+# Variable operating policy of the regulated inflows
+def test_variable_inflow_policy():
+    policy = np.column_stack([np.zeros(101), np.ones(101)*3])
+    Qreg_inf_policy = {'releases' : [],
+                       'inflows'  : {'type' : 'variable operating policy',
+                                     'input' : policy, 'index' : np.arange(N) % 2},
+                       'rel_inf'  : []}
+    env, spill, Qreg_rel, Qreg_inf, s, E = res_sys_sim(I, e, s_ini, s_min, s_max, env_min, d,
+                                                       Qreg_inf_policy)
+    # Expected output: the column of the policy of each time step
+    assert_array_equal(Qreg_inf[:,0], np.arange(N) % 2 * 3)
+
+# Release scheduling shared by all the ensemble members (single column)
+def test_scheduling_ensemble():
+    np.random.seed(9)
+    I_ens = np.random.uniform(0,20,(N,50))
+    e_ens = np.random.uniform(0,2,(N,50))
+    Qreg_sched = {'releases' : {'type' : 'scheduling', 'input' : d},
+                  'inflows'  : [],
+                  'rel_inf'  : []}
+    outputs = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_sched)
+    # Test (same results as the default releases, equal to the demand)
+    outputs_demand = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg)
+    for x, x_demand in zip(outputs, outputs_demand):
+        assert_array_equal(x, x_demand)
+
+# Batch simulation of candidate schedules and policies
+def test_batch():
+    np.random.seed(10)
+    P = 4
+    I_ens = np.random.uniform(0,20,(N,5))
+    e_ens = np.random.uniform(0,2,(N,5))
+    schedules = np.random.uniform(0,15,(P,N))
+    policies = np.random.uniform(0,15,(P,101,2))
+    Qreg_sched = {'releases' : {'type' : 'scheduling', 'input' : schedules},
+                  'inflows'  : [],
+                  'rel_inf'  : []}
+    Qreg_policy = {'releases' : {'type' : 'variable operating policy',
+                                 'input' : policies, 'index' : np.arange(N) % 2},
+                   'inflows'  : [],
+                   'rel_inf'  : []}
+    # Input of each candidate in res_sys_sim
+    for Qreg_batch, inputs in [(Qreg_sched, schedules[:,:,np.newaxis]), 
+                               (Qreg_policy, policies)]:
+        outputs = res_sys_sim_batch(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_batch)
+        outputs_serial = res_sys_sim_batch(I_ens, e_ens, s_ini, s_min, s_max, env_min, d,
+                                           Qreg_batch, parallel = False)
+        # Test (each candidate equal to its own simulation)
+        for p in range(P):
+            Qreg_p = {'releases' : dict(Qreg_batch['releases'], input = inputs[p]),
+                      'inflows'  : [],
+                      'rel_inf'  : []}
+            outputs_p = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_p)
+            for x, x_serial, x_p in zip(outputs, outputs_serial, outputs_p):
+                assert_array_equal(x[p], x_p)
+                assert_array_equal(x_serial[p], x_p)
+
+# Objectives accumulated during the simulation
+def test_objectives():
+    np.random.seed(11)
+    P = 3
+    I_ens = np.random.uniform(0,20,(N,5))
+    e_ens = np.random.uniform(0,2,(N,5))
+    pumping = np.random.uniform(0,5,(P,N))
+    Qreg_pump = {'releases' : [],
+                 'inflows'  : {'type' : 'scheduling', 'input' : pumping},
+                 'rel_inf'  : []}
+    c = 2 # pumping cost
+    cs = 30 # critical storage
+    objectives = ['MSD','MRD','MPC','TSD','CSV','TPC']
+    values = res_sys_obj_batch(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_pump,
+                               objectives, c = c, cs = cs)
+    assert values.shape == (P,5,6)
+    for p in range(P):
+        Qreg_p = {'releases' : [],
+                  'inflows'  : {'type' : 'scheduling', 'input' : pumping[p][:,np.newaxis]},
+                  'rel_inf'  : []}
+        env, spill, Qreg_rel, Qreg_inf, s, E = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, 
+                                                           env_min, d, Qreg_p)
+        # Expected output: objectives computed from the outputs of the 
+        # simulation (CSV over all the storages, including s_ini, as in the 
+        # Notebooks)
+        SD = np.maximum(d - Qreg_rel,0)**2
+        expected = np.column_stack([SD.mean(axis = 0), (s_max - s[1:]).mean(axis = 0),
+                                    (c*Qreg_inf).mean(axis = 0), SD.sum(axis = 0),
+                                    np.maximum(cs - s,0).sum(axis = 0),
+                                    (c*Qreg_inf).sum(axis = 0)])
+        assert_allclose(values[p], expected)
+        assert_allclose(res_sys_obj(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, Qreg_p,
+                                    objectives, c = c, cs = cs), expected)
+    # Unknown objective
+    with pytest.raises(ValueError):
+        res_sys_obj(I, e, s_ini, s_min, s_max, env_min, d, Qreg, 'SSD')
+
+# Operating policy over uniform grids of storage fractions of different steps
+def test_policy_grid():
+    np.random.seed(13)
+    I_ens = np.random.uniform(0,20,(N,5))
+    e_ens = np.random.uniform(0,2,(N,5))
+    param = [[0,2],[0.4,12],[1,20]]
+    outputs = {}
+    for s_step in [0.01, 0.05]:
+        policy = op_piecewiselin_1res(param, s_step = s_step)
+        assert policy.shape == (int(round(1/s_step))+1,1)
+        Qreg_policy = {'releases' : {'type' : 'operating policy', 'input' : policy},
+                       'inflows'  : [],
+                       'rel_inf'  : []}
+        outputs[s_step] = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, 
+                                      Qreg_policy)
+        # Expected output: same results as the lookup over the storage 
+        # fractions of the grid (np.interp)
+        Qreg_policy['releases']['s_frac'] = storage_fractions(s_step)
+        outputs_interp = res_sys_sim(I_ens, e_ens, s_ini, s_min, s_max, env_min, d, 
+                                     Qreg_policy)
+        for x, x_interp in zip(outputs[s_step], outputs_interp):
+            assert_allclose(x, x_interp, rtol = 1e-12)
+    # Expected output: the breakpoints of the policy are in both grids, so 
+    # both lookups define the same policy
+    for x_01, x_05 in zip(outputs[0.01], outputs[0.05]):
+        assert_allclose(x_01, x_05, rtol = 1e-12)
+    # Step that does not divide the storage fraction range
+    with pytest.raises(ValueError):
+        op_piecewiselin_1res(param, s_step = 0.03)
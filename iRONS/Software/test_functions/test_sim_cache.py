@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+This is a function to test the sim_cache class
+
+This module is part of the iRONS toolbox by A. Peñuela and F. Pianosi and at
+Bristol University (2020).
+"""
+import pickle
+import numpy as np
+from numpy.testing import assert_array_equal
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append("..") # Adds higher directory to python modules path.
+    ### Function to test ###
+    from sim_cache import sim_cache
+else:
+    ### Function to test ###
+    from irons.Software.sim_cache import sim_cache
+
+from irons.Software.HBV_sim import HBV_sim
+from irons.Software.HBV_calibration import HBV_objective
+
+### Testing functions ###
+def test_sim_cache():
+    calls = []
+    def simulate(x):
+        calls.append(x)
+        return np.sum(x)
+    cache = sim_cache(maxsize = 2)
+    simulate_cached = cache.wrap(simulate,'inputs')
+    for x in [[1,2],[1,2],[3,4],[-0.0,0],[1,2],[0,0]]:
+        assert simulate_cached(x) == np.sum(x)
+    # Expected output: [1,2] is discarded when [0,0] is stored (least recently used)
+    assert calls == [[1,2],[3,4],[-0.0,0],[1,2]]
+    assert cache.cache_info() == (2,4,2,2)
+    # Other inputs (fingerprint)
+    cache.lookup([1,2],simulate,'other inputs')
+    assert len(calls) == 5
+    # Rounded decision variables
+    cache = sim_cache(decimals = 3)
+    assert cache.key([0.1234]) == cache.key([0.12341])
+    # The copies sent to other processes start empty
+    cache.put(cache.key([1]),1)
+    cache_copy = pickle.loads(pickle.dumps(cache))
+    assert len(cache) == 1 and len(cache_copy) == 0 and cache_copy.decimals == 3
+
+def test_HBV_objective_cache():
+    N = 365
+    np.random.seed(0)
+    P = np.random.gamma(0.8, 6, N)
+    E = np.ones(N)*2
+    Q_obs = HBV_sim(P, E, [2, 0.7, 300, 2, 0.3, 0.1, 0.02, 20, 3], 1, [100, 10, 20], 86,
+                    outputs = 'flow')
+    X = np.random.uniform([0, 0, 0, 0, 0.3, 1, 0, 0.05, 0.01, 0, 0, 1],
+                          [400, 100, 100, 7, 1, 2000, 100, 2, 1, 0.1, 100, 6], (10, 12))
+    auto_calibration = HBV_objective(P, E, 1, 86, Q_obs, 'double')
+    auto_calibration_cached = HBV_objective(P, E, 1, 86, Q_obs, 'double', sim_cache())
+    F = auto_calibration.batch(X)
+    assert_array_equal(auto_calibration_cached.batch(X[:5]), F[:5])
+    assert_array_equal(auto_calibration_cached.batch(X), F)
+    assert_array_equal([auto_calibration_cached(x) for x in X], F)
+    assert_array_equal(auto_calibration_cached.RMSE(X), auto_calibration.RMSE(X))
+    # Expected output: only the first simulation of each solution is a miss
+    assert auto_calibration_cached.cache.cache_info()[:2] == (5+10+10,10)